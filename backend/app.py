@@ -1,11 +1,14 @@
-from fastapi import FastAPI
+from fastapi import FastAPI, Response
 from contextlib import asynccontextmanager
 from fastapi.middleware.cors import CORSMiddleware
 from routes.userrouter import userRoutes
 from routes.jobrouter import jobRoutes
 from routes.userVerify import verifyUser
+from routes.serverTiming import serverTiming
 # Import your dependency getters
-from services.dependencies import getEmbeddingConfig, getSupabaseClient
+from services.dependencies import getEmbeddingConfig, getSupabaseClient, getAsyncEmbeddingConfig, getAsyncSupabaseClient, queryBatchEmbedder
+from services.researchClassifier import getResearchClassifier, researchClassifierEnabled
+from services.metrics import metricsPayload
 
 
 @asynccontextmanager
@@ -16,10 +19,19 @@ async def lifespan(app: FastAPI):
     try:
         getEmbeddingConfig()  # Initialize Voyage embeddings
         getSupabaseClient()  # Initialize Supabase
+        getAsyncEmbeddingConfig()  # Async Voyage client for the answer path
+        await getAsyncSupabaseClient()  # Async Supabase client for the answer path
         print("✅ All services initialized successfully")
     except Exception as e:
         print(f"❌ Error initializing services: {e}")
         raise
+
+    if researchClassifierEnabled():
+        try:
+            await getResearchClassifier().loadBank(getAsyncEmbeddingConfig(), queryBatchEmbedder)
+        except Exception as e:
+            # Not fatal: without the bank the classifier only uses its keyword rules
+            print(f"⚠️ Research classifier bank not loaded: {e}")
     
     yield
     
@@ -50,6 +62,8 @@ app.add_middleware(
 )
 
 app.middleware("http")(verifyUser)
+# Registered last so it wraps auth as well
+app.middleware("http")(serverTiming)
 
 # Register routes
 app.include_router(userRoutes, prefix="/user", tags=["User"])
@@ -61,6 +75,13 @@ async def root():
     return {"message": "FastAPI server running"}
 
 
+@app.get("/metrics")
+async def metrics():
+    """Prometheus scrape endpoint"""
+    payload, contentType = metricsPayload()
+    return Response(content=payload, media_type=contentType)
+
+
 if __name__ == "__main__":
     import uvicorn
     uvicorn.run(app, host="0.0.0.0", port=8000)
\ No newline at end of file
@@ -0,0 +1,54 @@
+"""
+Throughput of generateAnswer on a single event loop with stubbed upstreams.
+
+Run from the backend directory:
+    python -m benchmarks.answerConcurrency
+
+With every upstream call awaited, throughput should grow roughly linearly with
+the number of in-flight requests, since each request spends its time waiting.
+Every level starts with cold caches and without the answer replay window, so
+each level runs the full pipeline rather than replaying the previous one.
+"""
+import asyncio
+import time
+import logging
+from controllers import jobController
+from services import singleflight
+from benchmarks.stubs import StubLLM, StubTavily, StubEmbedder, StubSupabase, stubJobRequest, patchAnswerClients, resetCaches
+
+TOTAL_REQUESTS = 32
+CONCURRENCY_LEVELS = [1, 2, 4, 8, 16, 32]
+
+
+def coldStart():
+    resetCaches()
+    # Requests are still coalesced while in flight, but finished answers are not replayed
+    singleflight._answerFlight = singleflight.SingleFlight("answerRequests", window=0.0, cacheable=lambda result: False)
+
+
+async def runLevel(concurrency: int) -> float:
+    coldStart()
+    semaphore = asyncio.Semaphore(concurrency)
+
+    async def one(index):
+        async with semaphore:
+            response = await jobController.generateAnswer(stubJobRequest(index))
+            assert response.status_code == 200, response.body
+
+    start = time.perf_counter()
+    await asyncio.gather(*(one(i) for i in range(TOTAL_REQUESTS)))
+    return time.perf_counter() - start
+
+
+async def main():
+    logging.disable(logging.INFO)
+    patchAnswerClients(jobController, StubLLM(), StubTavily(), StubEmbedder(), StubSupabase())
+
+    print(f"{'in-flight':>10} {'seconds':>10} {'req/s':>10}")
+    for concurrency in CONCURRENCY_LEVELS:
+        elapsed = await runLevel(concurrency)
+        print(f"{concurrency:>10} {elapsed:>10.2f} {TOTAL_REQUESTS / elapsed:>10.2f}")
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,48 @@
+"""
+Single-request latency of the answer stage graph against the old sequential
+order, with stubbed upstreams.
+
+Run from the backend directory:
+    python -m benchmarks.answerLatency
+"""
+import asyncio
+import time
+import logging
+from controllers import jobController
+from benchmarks.stubs import StubLLM, StubTavily, StubEmbedder, StubSupabase, stubJobRequest
+
+
+async def sequential(state, llm, tavily, supabase, embedder):
+    await jobController.companyResearchDecision(state, llm)
+    if state["companyResearchDecision"]:
+        await jobController.companyResearch(state, tavily, llm)
+        searchQuery = await jobController.convertJobDatatoQuery(state, llm)
+    else:
+        searchQuery = await jobController.queryoptimizer(state["question"], llm)
+    embedding = await jobController.queryEmbedder(searchQuery, embedder)
+    await jobController.searchUserProfile(embedding, state["email"], supabase, state, 4)
+    await jobController.createFinalResponse(state, llm)
+
+
+async def graph(state, llm, tavily, supabase, embedder):
+    await jobController.buildAnswerGraph(state, llm, tavily, supabase, embedder).run()
+
+
+async def timeRun(runner, researchDecision: bool) -> float:
+    llm = StubLLM(researchDecision=researchDecision)
+    start = time.perf_counter()
+    await runner(jobController.newAnswerState(stubJobRequest()), llm, StubTavily(), StubSupabase(), StubEmbedder())
+    return time.perf_counter() - start
+
+
+async def main():
+    logging.disable(logging.INFO)
+    print(f"{'research':>10} {'sequential':>12} {'graph':>8} {'speedup':>8}")
+    for researchDecision in (True, False):
+        sequentialSeconds = await timeRun(sequential, researchDecision)
+        graphSeconds = await timeRun(graph, researchDecision)
+        print(f"{str(researchDecision):>10} {sequentialSeconds:>12.2f} {graphSeconds:>8.2f} {sequentialSeconds / graphSeconds:>7.2f}x")
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
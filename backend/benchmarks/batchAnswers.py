@@ -0,0 +1,53 @@
+"""
+/job/answers against N sequential /job/answer calls for the same job, with
+stubbed upstreams. Reports wall clock and upstream call counts.
+
+Run from the backend directory:
+    python -m benchmarks.batchAnswers
+"""
+import asyncio
+import time
+import logging
+from controllers import jobController
+from benchmarks.stubs import StubLLM, StubTavily, StubEmbedder, StubSupabase, stubJobRequest, patchAnswerClients
+
+# Plus the largest batch the default Gemini quota admits
+QUESTION_COUNTS = [3, 5]
+
+
+async def sequential(questionCount: int):
+    for index in range(questionCount):
+        response = await jobController.generateAnswer(stubJobRequest(index))
+        assert response.status_code == 200, response.body
+
+
+async def batched(questionCount: int):
+    request = stubJobRequest()
+    request.pop("question")
+    request["questions"] = [stubJobRequest(index)["question"] for index in range(questionCount)]
+    response = await jobController.generateAnswers(request)
+    assert response.status_code == 200, response.body
+
+
+async def measure(runner, questionCount: int, researchDecision: bool):
+    llm, tavily, embedder, supabase = StubLLM(researchDecision=researchDecision), StubTavily(), StubEmbedder(), StubSupabase()
+    patchAnswerClients(jobController, llm, tavily, embedder, supabase)
+    start = time.perf_counter()
+    await runner(questionCount)
+    calls = f"llm={llm.calls} tavily={tavily.calls} voyage={embedder.calls} rpc={supabase.calls}"
+    return time.perf_counter() - start, calls
+
+
+async def main():
+    logging.disable(logging.INFO)
+    for researchDecision in (True, False):
+        print(f"research needed: {researchDecision}")
+        for questionCount in dict.fromkeys(QUESTION_COUNTS + [jobController.maxBatchQuestions()]):
+            sequentialSeconds, sequentialCalls = await measure(sequential, questionCount, researchDecision)
+            batchedSeconds, batchedCalls = await measure(batched, questionCount, researchDecision)
+            print(f"  {questionCount} questions  sequential {sequentialSeconds:6.2f}s ({sequentialCalls})")
+            print(f"  {questionCount} questions  batched    {batchedSeconds:6.2f}s ({batchedCalls})")
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,78 @@
+"""
+Estimated final-answer context size with and without packing, for a long job
+posting with benefits / EEO sections, a long Tavily answer and four retrieved
+chunks, at a few CONTEXT_TOKEN_BUDGET values. Token counts use the packer's
+characters-per-token estimate.
+
+Run from the backend directory:
+    python -m benchmarks.contextPacking
+"""
+import time
+from services.contextPacker import packContext
+
+BUDGETS = [4000, 2500, 1500, 800]
+ITERATIONS = 200
+
+ROLE = """Senior Backend Engineer, Payments
+
+About the role
+
+You will own the ledger and settlement services that move money for thousands of merchants. You will design
+APIs in Python and Go, run them on Kubernetes and work with product and risk teams on new payment methods.
+""" + "You will also mentor engineers, review designs and lead incident reviews for the services your team owns. " * 8 + """
+
+Requirements
+
+5+ years building distributed systems. Deep experience with Postgres, Kafka and idempotent API design.
+""" + "Experience with reconciliation, double-entry accounting or regulated environments is a plus. " * 6
+
+BOILERPLATE = """
+
+Benefits
+
+Medical, dental and vision coverage for you and your dependents. 401(k) matching up to 4%.
+
+Unlimited paid time off, a home office stipend and a yearly learning budget.
+
+Pay range
+
+The base salary for this role is $170,000 - $210,000. Pay transparency laws require us to share this range.
+
+Equal Opportunity
+
+Acme is an equal opportunity employer and considers all applicants without regard to race, color, religion,
+sex, sexual orientation, gender identity, national origin, disability or protected veteran status.
+
+We provide reasonable accommodation to applicants with disabilities. Acme participates in E-Verify.
+"""
+
+COMPANY_DATA = "Acme processes card and bank payments for mid-market merchants and raised a Series C in 2024. " * 40
+
+CHUNKS = [
+    "Led the rebuild of a double-entry ledger handling 40M transactions a day, cutting reconciliation breaks by 90%. " * 12,
+    "Designed idempotent payment APIs in Go and Python with exactly-once semantics over Kafka. " * 8,
+    "Mentored six engineers and ran the on-call rotation for the payments platform. " * 5,
+    "Migrated settlement batch jobs from cron to Kubernetes jobs with Postgres advisory locks. " * 5,
+]
+
+
+def main():
+    jobDescription = ROLE + BOILERPLATE
+    # The question prompt carries the job description, the research prompt the company data
+    for label, jobPart, companyPart in (("question prompt", jobDescription, ""), ("research prompt", "", COMPANY_DATA)):
+        print(label)
+        for budget in BUDGETS:
+            start = time.perf_counter()
+            for _ in range(ITERATIONS):
+                packed = packContext(jobPart, companyPart, CHUNKS, budget)
+            seconds = (time.perf_counter() - start) / ITERATIONS
+            stats = packed["stats"]
+            print(
+                f"  budget {budget:5d}  tokens {stats['tokensBefore']:5d} -> {stats['tokensAfter']:5d}"
+                f"  saved {stats['tokensSaved']:5d} (boilerplate {stats['boilerplateTokens']:4d})"
+                f"  dropped chunks {stats['droppedChunks']}  {seconds * 1000:.3f}ms"
+            )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,45 @@
+"""
+Identical /job/answer requests fired together (double submits) and shortly
+after the first completes (retries), with stubbed upstreams. Reports wall
+clock and upstream call counts with and without coalescing.
+
+Run from the backend directory:
+    python -m benchmarks.duplicateAnswers
+"""
+import asyncio
+import time
+import logging
+from controllers import jobController
+from services import singleflight
+from benchmarks.stubs import StubLLM, StubTavily, StubEmbedder, StubSupabase, stubJobRequest, patchAnswerClients
+
+DUPLICATES = 4
+
+
+async def measure(coalesce: bool):
+    llm, tavily, embedder, supabase = StubLLM(), StubTavily(), StubEmbedder(), StubSupabase()
+    patchAnswerClients(jobController, llm, tavily, embedder, supabase)
+    if not coalesce:
+        # Unique keys per call, so nothing is shared
+        singleflight.getAnswerFlight().do = lambda key, call: call()
+
+    start = time.perf_counter()
+    responses = await asyncio.gather(*(jobController.generateAnswer(stubJobRequest()) for _ in range(DUPLICATES)))
+    retry = await jobController.generateAnswer(stubJobRequest())
+    elapsed = time.perf_counter() - start
+
+    assert all(response.status_code == 200 for response in [*responses, retry])
+    assert len({response.body for response in [*responses, retry]}) == 1
+    return elapsed, f"llm={llm.calls} tavily={tavily.calls} voyage={embedder.calls} rpc={supabase.calls}"
+
+
+async def main():
+    logging.disable(logging.INFO)
+    for coalesce in (False, True):
+        seconds, calls = await measure(coalesce)
+        label = "coalesced" if coalesce else "independent"
+        print(f"{DUPLICATES} concurrent + 1 retry  {label:11s} {seconds:6.2f}s ({calls})")
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,63 @@
+"""
+Voyage texts and time spent embedding with the content-addressed embedding
+store: a profile ingested, ingested again after a failed attempt, updated
+with a few changed chunks, and re-ingested after the process restarted
+(a new SQLite store on the same file). Query embeddings are measured the
+same way across a restart, where the in-process LRU starts empty.
+
+Run from the backend directory:
+    python -m benchmarks.embeddingStore
+"""
+import os
+import time
+import asyncio
+import logging
+import tempfile
+from services import dependencies
+from services.embeddingStore import SqliteEmbeddingStore
+from services.userDataProcessor import ProcessUserData
+from benchmarks.stubs import StubDocsEmbedder, StubEmbedder, useEmbeddingStore
+
+PROFILE_CHUNKS = 30
+CHANGED_CHUNKS = [0, 3, 6]
+QUERIES = [f"experience with distributed systems at scale ({index})" for index in range(20)]
+
+
+def stubTexts(changed: list[int] = ()) -> list[str]:
+    return [f"Experience {index}: built services in Python" + (" and Go" if index in changed else "") for index in range(PROFILE_CHUNKS)]
+
+
+def embedProfile(label: str, texts: list[str], store):
+    useEmbeddingStore(store)
+    embedder = StubDocsEmbedder()
+    start = time.perf_counter()
+    ProcessUserData(None, embedder).DocsEmbedder(texts)
+    print(f"  {label:26s}  Voyage texts {embedder.texts:3d}  {time.perf_counter() - start:5.2f}s")
+
+
+def embedQueries(label: str, store):
+    useEmbeddingStore(store)
+    dependencies._queryEmbeddingCache.clear()
+    embedder = StubEmbedder()
+    start = time.perf_counter()
+    asyncio.run(dependencies.queryBatchEmbedder(QUERIES, embedder))
+    print(f"  {label:26s}  Voyage calls {embedder.calls:3d}  {time.perf_counter() - start:5.2f}s")
+
+
+def main():
+    logging.disable(logging.WARNING)
+    with tempfile.TemporaryDirectory() as directory:
+        path = os.path.join(directory, "embeddings.sqlite3")
+        for name, store in (("no store", lambda: None), ("sqlite store", lambda: SqliteEmbeddingStore(path, 10000))):
+            print(name)
+            current = store()
+            embedProfile("first ingest", stubTexts(), current)
+            embedProfile("retry after failed ingest", stubTexts(), current)
+            embedProfile("update, 3 chunks changed", stubTexts(CHANGED_CHUNKS), current)
+            embedProfile("re-ingest after restart", stubTexts(), store())
+            embedQueries("queries", current)
+            embedQueries("queries after restart", store())
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,44 @@
+"""
+Admission waits in the rate limit scheduler when one user fires a burst of
+calls while others make a few, all sharing this worker's Gemini rate. The
+FIFO column is what the light users would wait behind the heavy user's
+queue without round-robin.
+
+Run from the backend directory:
+    python -m benchmarks.fairScheduler
+"""
+import asyncio
+import time
+import logging
+from services.rateLimiter import FairScheduler
+
+PER_KEY_RPM = 600
+WORKER_RPM = 1200
+HEAVY_CALLS = 60
+LIGHT_USERS = 3
+LIGHT_CALLS = 3
+
+
+async def main():
+    logging.disable(logging.WARNING)
+    scheduler = FairScheduler("benchmark", ratePerMinute=PER_KEY_RPM, burst=5, workerRatePerMinute=WORKER_RPM, maxWait=60)
+    waits = {}
+
+    async def call(key: str):
+        start = time.perf_counter()
+        await scheduler.acquire(key)
+        waits.setdefault(key, []).append(time.perf_counter() - start)
+
+    heavy = [asyncio.create_task(call("heavy")) for _ in range(HEAVY_CALLS)]
+    await asyncio.sleep(0.05)
+    light = [asyncio.create_task(call(f"light{user}")) for user in range(LIGHT_USERS) for _ in range(LIGHT_CALLS)]
+    await asyncio.gather(*heavy, *light)
+
+    # In one FIFO queue the light calls would be admitted after all of the heavy user's
+    fifoWait = max(waits["heavy"])
+    for key, keyWaits in sorted(waits.items()):
+        print(f"{key:8s} calls {len(keyWaits):3d}  max wait {max(keyWaits):5.2f}s  FIFO ~{fifoWait:5.2f}s")
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
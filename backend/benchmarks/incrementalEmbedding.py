@@ -0,0 +1,62 @@
+"""
+Voyage texts, table writes and time of ProcessUserData.generateEmbeddings
+when a stored profile is updated and a few of its chunks changed. The
+rebuild row replaces rows stored without content hashes, which costs the
+Voyage texts and writes of the old full rebuild; that one deleted first,
+so the user had no rows at all until the insert.
+
+Run from the backend directory:
+    python -m benchmarks.incrementalEmbedding
+"""
+import time
+import asyncio
+import logging
+from services import userDataProcessor
+from services.userDataProcessor import ProcessUserData
+from benchmarks.stubs import StubDocsEmbedder, StubEmbeddingTable, StubStorage, useEmbeddingStore
+
+PROFILE_CHUNKS = 30
+CHANGED_CHUNKS = [0, 3, 6]
+
+
+def stubProfile(changed: list[int] = ()) -> list[dict]:
+    return [
+        {
+            "embedding_text": f"Experience {index}: built services in Python" + (" and Go" if index in changed else ""),
+            "metadata": {"company": f"Company {index}", "section_type": "Experience"},
+        }
+        for index in range(PROFILE_CHUNKS)
+    ]
+
+
+def measure(label: str, table: StubEmbeddingTable, profile: list[dict]):
+    embedder = StubDocsEmbedder()
+    processor = ProcessUserData(None, embedder)
+    table.resetCounters()
+    start = time.perf_counter()
+    asyncio.run(processor.generateEmbeddings(table, "bench@example.com", profile))
+    seconds = time.perf_counter() - start
+    print(
+        f"{label:22s}  embedded {embedder.texts:3d}  rows written {table.written:3d}"
+        f"  fewest rows stored {table.minRows:3d}  {seconds:5.2f}s"
+    )
+
+
+def main():
+    logging.disable(logging.WARNING)
+    userDataProcessor.uploadJson = StubStorage().upload
+    # Without the embedding store, so only the row diff saves Voyage calls
+    useEmbeddingStore(None)
+    table = StubEmbeddingTable()
+    measure("first ingest", table, stubProfile())
+
+    for row in table.rows:
+        row["content_hash"] = None
+    measure("rebuild (no hashes)", table, stubProfile(CHANGED_CHUNKS))
+
+    measure("incremental, 3 changed", table, stubProfile())
+    measure("incremental, unchanged", table, stubProfile())
+
+
+if __name__ == "__main__":
+    main()
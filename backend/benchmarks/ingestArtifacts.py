@@ -0,0 +1,53 @@
+"""
+Wall-clock time and storage calls of a /user/userdata ingest per
+INGEST_ARTIFACTS policy, with the uploads in the background, against the
+debug policy with every upload waited for in place (the old pipeline).
+Upstream calls are stubbed with blocking sleeps (see benchmarks.stubs).
+
+Run from the backend directory:
+    python -m benchmarks.ingestArtifacts
+"""
+import io
+import time
+import asyncio
+import logging
+from starlette.datastructures import UploadFile
+from controllers import userController
+from services import ingestArtifacts
+from services.ingestArtifacts import ArtifactWriter
+from services.ingestJobs import IngestJob
+from benchmarks.stubs import StubStorage, patchIngestClients
+
+EMAIL = "bench@example.com"
+
+
+class InlineArtifactWriter(ArtifactWriter):
+    """Waits for each upload before the pipeline goes on"""
+    def _submit(self, upload, *args):
+        super()._submit(upload, *args)
+        self.futures[-1].result()
+
+
+def measure(policy: str, writer=ArtifactWriter) -> tuple[float, int]:
+    storage = StubStorage()
+    patchIngestClients(userController, storage)
+    userController.ArtifactWriter = lambda client, email: writer(client, email, policy)
+    job = IngestJob(EMAIL, "userdata", userController.INGEST_USERDATA_STAGES)
+    resume = UploadFile(io.BytesIO(b"%PDF-1.4 stub resume"), filename="resume.pdf")
+    start = time.perf_counter()
+    asyncio.run(userController.ingestUserData(job, "Stub LinkedIn profile", resume, EMAIL, None))
+    return time.perf_counter() - start, storage.calls
+
+
+def main():
+    logging.disable(logging.WARNING)
+    seconds, calls = measure("debug", InlineArtifactWriter)
+    print(f"{'debug, inline':21s}  {seconds:5.2f}s  storage calls {calls:2d}")
+    for policy in ingestArtifacts.ARTIFACT_POLICIES:
+        seconds, calls = measure(policy)
+        print(f"{policy + ', background':21s}  {seconds:5.2f}s  storage calls {calls:2d}")
+    userController.ArtifactWriter = ArtifactWriter
+
+
+if __name__ == "__main__":
+    main()
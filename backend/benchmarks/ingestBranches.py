@@ -0,0 +1,58 @@
+"""
+Wall-clock time of the /user/userdata and /user/update ingest with the
+resume and LinkedIn branches run one after the other and side by side.
+Upstream calls are stubbed with blocking sleeps (see benchmarks.stubs).
+
+Run from the backend directory:
+    python -m benchmarks.ingestBranches
+"""
+import io
+import time
+import asyncio
+import logging
+from starlette.datastructures import UploadFile
+from controllers import userController
+from services.ingestJobs import IngestJob, runBranches
+from benchmarks.stubs import StubStorage, patchIngestClients
+
+EMAIL = "bench@example.com"
+LINKEDIN_TEXT = "Stub LinkedIn profile"
+
+
+async def runSequentially(*branches):
+    return [await branch for branch in branches]
+
+
+def stubResume() -> UploadFile:
+    return UploadFile(io.BytesIO(b"%PDF-1.4 stub resume"), filename="resume.pdf")
+
+
+def measure(kind: str, sequential: bool) -> float:
+    storage = StubStorage()
+    patchIngestClients(userController, storage)
+    userController.runBranches = runSequentially if sequential else runBranches
+    if kind == "userdata":
+        job = IngestJob(EMAIL, kind, userController.INGEST_USERDATA_STAGES)
+        run = userController.ingestUserData(job, LINKEDIN_TEXT, stubResume(), EMAIL, None)
+    else:
+        # The profile being updated was ingested before
+        asyncio.run(userController.ingestUserData(IngestJob(EMAIL, "userdata", []), LINKEDIN_TEXT, stubResume(), EMAIL, None))
+        job = IngestJob(EMAIL, kind, [])
+        run = userController.ingestProfileUpdate(job, EMAIL, True, True, LINKEDIN_TEXT, stubResume(), None)
+    start = time.perf_counter()
+    # As on an ingest worker: one event loop per job
+    asyncio.run(run)
+    return time.perf_counter() - start
+
+
+def main():
+    logging.disable(logging.WARNING)
+    for kind in ("userdata", "update"):
+        sequential = measure(kind, sequential=True)
+        concurrent = measure(kind, sequential=False)
+        print(f"{kind:8s}  sequential {sequential:5.2f}s  concurrent {concurrent:5.2f}s  saved {sequential - concurrent:5.2f}s ({1 - concurrent / sequential:.0%})")
+    userController.runBranches = runBranches
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,64 @@
+"""
+Per-question latency of /job/answer against answers that reference a job
+session, with stubbed upstreams. The session is created first and its
+precompute is awaited, so the session rows measure only the answer calls.
+Each session answer must make exactly one LLM call.
+
+Run from the backend directory:
+    python -m benchmarks.jobSessions
+"""
+import asyncio
+import time
+import logging
+from controllers import jobController
+from services.jobSessions import getJobSessionStore
+from benchmarks.stubs import StubLLM, StubTavily, StubEmbedder, StubSupabase, stubJobRequest, patchAnswerClients
+
+QUESTION_COUNT = 5
+
+
+async def plainAnswers(llm):
+    for index in range(QUESTION_COUNT):
+        response = await jobController.generateAnswer(stubJobRequest(index))
+        assert response.status_code == 200, response.body
+
+
+async def sessionAnswers(llm):
+    request = stubJobRequest()
+    request.pop("question")
+    response = await jobController.createJobSession(request)
+    assert response.status_code == 202, response.body
+    sessionId = jobController.json.loads(response.body)["sessionId"]
+    await getJobSessionStore().get(sessionId, request["email"]).wait()
+
+    setupCalls = llm.calls
+    start = time.perf_counter()
+    for index in range(QUESTION_COUNT):
+        response = await jobController.generateSessionAnswer(sessionId, {"question": stubJobRequest(index)["question"], "email": request["email"]})
+        assert response.status_code == 200, response.body
+    seconds = time.perf_counter() - start
+    assert llm.calls - setupCalls == QUESTION_COUNT, f"{llm.calls - setupCalls} LLM calls for {QUESTION_COUNT} session answers"
+    return seconds
+
+
+async def measure(runner, researchDecision: bool):
+    llm, tavily, embedder, supabase = StubLLM(researchDecision=researchDecision), StubTavily(), StubEmbedder(), StubSupabase()
+    patchAnswerClients(jobController, llm, tavily, embedder, supabase)
+    start = time.perf_counter()
+    answerSeconds = await runner(llm)
+    seconds = answerSeconds if answerSeconds is not None else time.perf_counter() - start
+    calls = f"llm={llm.calls} tavily={tavily.calls} voyage={embedder.calls} rpc={supabase.calls}"
+    return seconds / QUESTION_COUNT, calls
+
+
+async def main():
+    logging.disable(logging.INFO)
+    for researchDecision in (True, False):
+        print(f"research needed: {researchDecision}")
+        for name, runner in (("plain answers", plainAnswers), ("session answers", sessionAnswers)):
+            seconds, calls = await measure(runner, researchDecision)
+            print(f"  {name:16s} {seconds:5.2f}s per question ({calls}, {QUESTION_COUNT} questions incl. session setup)")
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
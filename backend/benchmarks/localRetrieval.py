@@ -0,0 +1,83 @@
+"""
+Parity and latency of the in-process MMR index against a reference
+implementation of the search_user_profiles_mmr RPC.
+
+Run from the backend directory:
+    python -m benchmarks.localRetrieval
+
+The reference follows the RPC step by step with plain Python loops: filter by
+match_threshold, keep the fetch_count most similar rows, then greedily pick
+match_count rows by lambda_mult * relevance - (1 - lambda_mult) * max
+similarity to the rows already picked. Every query must select the same rows
+in the same order.
+"""
+import math
+import time
+import numpy as np
+from services.localVectorIndex import UserVectorIndex
+
+DIMENSION = 1024
+PROFILE_SIZES = [10, 20, 40]
+QUERIES_PER_PROFILE = 200
+MATCH_COUNT, FETCH_COUNT, LAMBDA_MULT, MATCH_THRESHOLD = 4, 15, 0.8, 0.45
+
+
+def cosine(a, b):
+    dot = sum(x * y for x, y in zip(a, b))
+    return dot / (math.sqrt(sum(x * x for x in a)) * math.sqrt(sum(y * y for y in b)))
+
+
+def referenceMmr(texts, embeddings, query, matchCount, fetchCount, lambdaMult, matchThreshold):
+    scored = [(cosine(query, embedding), position) for position, embedding in enumerate(embeddings)]
+    scored = [item for item in scored if item[0] >= matchThreshold]
+    scored.sort(key=lambda item: -item[0])
+    candidates = scored[:fetchCount]
+
+    selected = []
+    while candidates and len(selected) < matchCount:
+        best, bestScore = None, -math.inf
+        for similarity, position in candidates:
+            if selected:
+                redundancy = max(cosine(embeddings[position], embeddings[chosen]) for chosen in selected)
+                score = lambdaMult * similarity - (1 - lambdaMult) * redundancy
+            else:
+                score = similarity
+            if score > bestScore:
+                best, bestScore = (similarity, position), score
+        selected.append(best[1])
+        candidates.remove(best)
+    return [texts[position] for position in selected]
+
+
+def clusteredProfile(size: int, rng: np.random.Generator):
+    # A few topics with noisy members, so the threshold and MMR both matter
+    topics = rng.standard_normal((4, DIMENSION))
+    embeddings = topics[rng.integers(0, 4, size)] + 0.6 * rng.standard_normal((size, DIMENSION))
+    return [f"chunk {position}" for position in range(size)], embeddings.tolist(), topics
+
+
+def main():
+    rng = np.random.default_rng(7)
+    print(f"{'chunks':>7} {'parity':>10} {'reference us':>13} {'local us':>9}")
+    for size in PROFILE_SIZES:
+        texts, embeddings, topics = clusteredProfile(size, rng)
+        index = UserVectorIndex(texts, embeddings)
+        queries = [(topics[rng.integers(0, 4)] + 0.8 * rng.standard_normal(DIMENSION)).tolist() for _ in range(QUERIES_PER_PROFILE)]
+
+        matches, referenceSeconds, localSeconds = 0, 0.0, 0.0
+        for query in queries:
+            start = time.perf_counter()
+            expected = referenceMmr(texts, embeddings, query, MATCH_COUNT, FETCH_COUNT, LAMBDA_MULT, MATCH_THRESHOLD)
+            referenceSeconds += time.perf_counter() - start
+
+            start = time.perf_counter()
+            actual = [row["embedding_text"] for row in index.search(query, MATCH_COUNT, FETCH_COUNT, LAMBDA_MULT, MATCH_THRESHOLD)]
+            localSeconds += time.perf_counter() - start
+            matches += expected == actual
+
+        print(f"{size:>7} {matches:>5}/{QUERIES_PER_PROFILE:<4} {referenceSeconds / len(queries) * 1e6:>13.0f} {localSeconds / len(queries) * 1e6:>9.0f}")
+        assert matches == QUERIES_PER_PROFILE, "local index diverged from the RPC reference"
+
+
+if __name__ == "__main__":
+    main()
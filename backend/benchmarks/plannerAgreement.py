@@ -0,0 +1,93 @@
+"""
+Latency and agreement of the planner pipeline mode against the multi-call mode,
+on live Gemini (and Voyage, for query similarity).
+
+Needs GEMINI_KEY and VOYAGE_KEY in the environment. Run from the backend directory:
+    python -m benchmarks.plannerAgreement
+
+For each question both modes produce a research decision and a retrieval query.
+Reported: per-mode latency up to retrieval, decision agreement, and cosine
+similarity between the two retrieval queries.
+"""
+import os
+import sys
+import asyncio
+import time
+import logging
+import numpy as np
+from langchain_google_genai import ChatGoogleGenerativeAI
+from voyageai import AsyncClient as AsyncVoyageClient
+from controllers import jobController
+from services.dependencies import queryBatchEmbedder
+
+JOB = {
+    "jobTitle": "Backend Software Engineer",
+    "companyName": "Stripe",
+    "jobDescription": (
+        "Design, build and operate high-throughput payment APIs in Ruby and Go. Own services end to end, "
+        "from schema design in PostgreSQL to on-call. Experience with distributed systems, Kafka, and "
+        "Kubernetes is a plus. You will partner with product to ship features used by millions of businesses."
+    ),
+    "email": "bench@example.com",
+}
+
+QUESTIONS = [
+    "Why do you want to work at Stripe?",
+    "Tell me about a challenging project you worked on.",
+    "What interests you about this role?",
+    "Describe a time you debugged a production incident.",
+    "How do you align with our company values?",
+    "What experience do you have with distributed systems?",
+    "What would you contribute to our payments platform in your first year?",
+    "Tell me about a time you disagreed with a teammate.",
+]
+
+
+async def multiCall(state, llm):
+    decision = await jobController.companyResearchDecision(state, llm)
+    if decision:
+        query = await jobController.convertJobDatatoQuery(state, llm)
+    else:
+        query = await jobController.queryoptimizer(state["question"], llm)
+    return decision, query
+
+
+async def planner(state, llm):
+    plan = await jobController.planAnswer(state, llm)
+    return plan.companyResearchDecision, plan.retrieval_query
+
+
+async def timed(runner, question, llm):
+    state = jobController.newAnswerState({**JOB, "question": question})
+    start = time.perf_counter()
+    decision, query = await runner(state, llm)
+    return time.perf_counter() - start, decision, query
+
+
+async def main():
+    logging.disable(logging.INFO)
+    llm = ChatGoogleGenerativeAI(model="gemini-2.5-flash-lite", google_api_key=os.getenv("GEMINI_KEY"), temperature=0.0)
+    embedder = AsyncVoyageClient(api_key=os.getenv("VOYAGE_KEY"))
+
+    rows = []
+    for question in QUESTIONS:
+        multiSeconds, multiDecision, multiQuery = await timed(multiCall, question, llm)
+        planSeconds, planDecision, planQuery = await timed(planner, question, llm)
+        multiVector, planVector = (np.asarray(vector) for vector in await queryBatchEmbedder([multiQuery, planQuery], embedder))
+        similarity = float(multiVector @ planVector / (np.linalg.norm(multiVector) * np.linalg.norm(planVector)))
+        rows.append((multiSeconds, planSeconds, multiDecision == planDecision, similarity))
+        print(f"{question[:50]:<52} multicall {multiSeconds:5.2f}s  planner {planSeconds:5.2f}s  "
+              f"decision {'agree' if multiDecision == planDecision else 'DIFFER'}  query cosine {similarity:.3f}")
+
+    multiTimes, planTimes, agreements, similarities = zip(*rows)
+    print()
+    print(f"mean latency   multicall {np.mean(multiTimes):.2f}s  planner {np.mean(planTimes):.2f}s")
+    print(f"decision agreement {sum(agreements)}/{len(agreements)}  mean query cosine {np.mean(similarities):.3f}")
+
+
+if __name__ == "__main__":
+    # Agreement is only meaningful against the real models, there is no stubbed mode
+    missing = [name for name in ("GEMINI_KEY", "VOYAGE_KEY") if not os.getenv(name)]
+    if missing:
+        sys.exit(f"plannerAgreement requires {' and '.join(missing)} in the environment")
+    asyncio.run(main())
@@ -0,0 +1,92 @@
+"""
+Per-request construction overhead with and without the prompt constants and
+the runnable registry. "rebuilt" reproduces what each request used to do:
+parse every prompt template, call with_structured_output for every schema
+and construct new chunkers and a TextExtractor. No network calls are made,
+the model and Gemini clients are only constructed.
+
+Run from the backend directory:
+    python -m benchmarks.promptRegistry
+"""
+import os
+import time
+import logging
+from langchain_core.prompts import ChatPromptTemplate, SystemMessagePromptTemplate
+from langchain_google_genai import ChatGoogleGenerativeAI
+
+os.environ.setdefault("GEMINI_KEY", "benchmark-placeholder")
+
+from controllers import jobController
+from services import userDataProcessor
+from services.outputSchemas import CompanyResearchDecision, SearchQuery, OptimalQuery, ResponseOutput, DeduplicationResult
+from services.runnableRegistry import RunnableRegistry, structuredModel, sharedInstance
+from services.resumeChunker import ResumeChunker
+from services.linkedinChunker import LinkedinChunker
+from services.textExtractor import TextExtractor
+
+ITERATIONS = 200
+CHUNKER_ITERATIONS = 20
+
+# Prompts and schemas one multicall answer plus one ingest touch
+PROMPTS = [
+    jobController.FINAL_RESPONSE_RESEARCH_PROMPT,
+    jobController.QUERY_OPTIMIZER_PROMPT,
+    jobController.COMPANY_SEARCH_QUERY_PROMPT,
+    jobController.RESEARCH_DECISION_PROMPT,
+    jobController.JOB_QUERY_PROMPT,
+    userDataProcessor.SORTING_PROMPT,
+]
+SCHEMAS = [ResponseOutput, OptimalQuery, SearchQuery, CompanyResearchDecision, OptimalQuery, DeduplicationResult]
+
+
+def rebuildPrompt(prompt: ChatPromptTemplate) -> ChatPromptTemplate:
+    """Builds the prompt from its raw template strings, as the old per-call code did"""
+    return ChatPromptTemplate.from_messages([
+        ("system" if isinstance(message, SystemMessagePromptTemplate) else "user", message.prompt.template)
+        for message in prompt.messages
+    ])
+
+
+def perCall(run, iterations: int) -> float:
+    run()  # first call fills the registry
+    start = time.perf_counter()
+    for _ in range(iterations):
+        run()
+    return (time.perf_counter() - start) / iterations
+
+
+def main():
+    logging.disable(logging.INFO)
+    llm = ChatGoogleGenerativeAI(model="gemini-2.5-flash-lite", api_key="benchmark-placeholder")
+    # Kept alive for the run, as UserClients keeps the registry of a user's LLM
+    runnables = RunnableRegistry(llm)
+
+    def rebuilt():
+        for prompt, schema in zip(PROMPTS, SCHEMAS):
+            rebuildPrompt(prompt)
+            llm.with_structured_output(schema)
+
+    def registry():
+        for prompt, schema in zip(PROMPTS, SCHEMAS):
+            structuredModel(llm, schema)
+
+    def rebuiltChunkers():
+        ResumeChunker(llm)
+        LinkedinChunker(llm)
+        TextExtractor("gemini-2.5-flash-lite")
+
+    def sharedChunkers():
+        sharedInstance(ResumeChunker, llm)
+        sharedInstance(LinkedinChunker, llm)
+        sharedInstance(TextExtractor, "gemini-2.5-flash-lite")
+
+    rows = [
+        ("prompts + structured runnables", perCall(rebuilt, ITERATIONS), perCall(registry, ITERATIONS)),
+        ("chunkers + text extractor", perCall(rebuiltChunkers, CHUNKER_ITERATIONS), perCall(sharedChunkers, CHUNKER_ITERATIONS)),
+    ]
+    for name, rebuiltSeconds, sharedSeconds in rows:
+        print(f"{name:32s} rebuilt {rebuiltSeconds * 1000:8.3f}ms  registry {sharedSeconds * 1000:8.3f}ms  per request")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,328 @@
+import time
+import asyncio
+import hashlib
+import numpy as np
+from services import researchCache, semanticCache, dependencies, singleflight, jobSessions, ingestArtifacts, embeddingStore
+from services.outputSchemas import CompanyResearchDecision, SearchQuery, OptimalQuery, OptimalQueries, ResponseOutput, AnswerPlan, JobRequirements
+
+# Upstream latencies (seconds) used by the stubbed clients
+LLM_LATENCY = 0.8
+TAVILY_LATENCY = 1.5
+EMBED_LATENCY = 0.15
+RPC_LATENCY = 0.1
+STORAGE_LATENCY = 0.1
+
+
+def stubOutput(schema, researchDecision: bool):
+    if schema is CompanyResearchDecision:
+        return CompanyResearchDecision(companyResearchDecision=researchDecision)
+    if schema is SearchQuery:
+        return SearchQuery(search_query="stub company product news 2025")
+    if schema is OptimalQuery:
+        return OptimalQuery(optimized_query="stub optimized query", Keyadditions=["stub"])
+    if schema is OptimalQueries:
+        return OptimalQueries(optimized_queries=["stub skills query", "stub leadership query", "stub motivation query"], Keyadditions=["stub"])
+    if schema is AnswerPlan:
+        return AnswerPlan(companyResearchDecision=researchDecision, retrieval_query="stub retrieval query", search_query="stub company product news 2025" if researchDecision else "")
+    if schema is JobRequirements:
+        return JobRequirements(summary="Stub backend role.", responsibilities=["Build backend services"], required_qualifications=["Python", "Kubernetes"])
+    if schema is ResponseOutput:
+        return ResponseOutput(response="Stub answer.")
+    raise ValueError(f"No stub output for {schema.__name__}")
+
+
+class StubStructuredModel:
+    def __init__(self, schema, stubModel):
+        self.schema = schema
+        self.stubModel = stubModel
+
+    async def ainvoke(self, *args, **kwargs):
+        self.stubModel.calls += 1
+        await asyncio.sleep(self.stubModel.latency)
+        return stubOutput(self.schema, self.stubModel.researchDecision)
+
+
+class StubChunk:
+    def __init__(self, content):
+        self.content = content
+
+
+class StubLLM:
+    """Stands in for ChatGoogleGenerativeAI, each call just sleeps"""
+    def __init__(self, latency: float = LLM_LATENCY, researchDecision: bool = True):
+        self.latency = latency
+        self.researchDecision = researchDecision
+        self.calls = 0
+
+    def with_structured_output(self, schema, **kwargs):
+        return StubStructuredModel(schema, self)
+
+    async def astream(self, *args, **kwargs):
+        self.calls += 1
+        for token in ["Stub ", "streamed ", "answer."]:
+            await asyncio.sleep(self.latency / 3)
+            yield StubChunk(token)
+
+
+class StubTavily:
+    def __init__(self, latency: float = TAVILY_LATENCY):
+        self.latency = latency
+        self.calls = 0
+
+    async def ainvoke(self, query):
+        self.calls += 1
+        await asyncio.sleep(self.latency)
+        return {"answer": f"Stub research for {query}"}
+
+
+class StubEmbedResult:
+    def __init__(self, embeddings):
+        self.embeddings = embeddings
+
+
+def textVector(text: str, dimension: int) -> list[float]:
+    """Deterministic pseudo-embedding, distinct texts come out nearly orthogonal"""
+    seed = int.from_bytes(hashlib.sha256(text.encode("utf-8")).digest()[:8], "big")
+    return np.random.default_rng(seed).standard_normal(dimension).astype(np.float32).tolist()
+
+
+class StubEmbedder:
+    def __init__(self, latency: float = EMBED_LATENCY, dimension: int = 1024):
+        self.latency = latency
+        self.dimension = dimension
+        self.calls = 0
+
+    async def embed(self, texts, **kwargs):
+        self.calls += 1
+        await asyncio.sleep(self.latency)
+        return StubEmbedResult([textVector(text, self.dimension) for text in texts])
+
+
+class StubDocsEmbedder:
+    """The sync Voyage client used at ingest, counts the texts it is billed for"""
+    def __init__(self, latency: float = EMBED_LATENCY, dimension: int = 1024):
+        self.latency = latency
+        self.dimension = dimension
+        self.calls = 0
+        self.texts = 0
+
+    def embed(self, texts, **kwargs):
+        self.calls += 1
+        self.texts += len(texts)
+        time.sleep(self.latency)
+        return StubEmbedResult([textVector(text, self.dimension) for text in texts])
+
+
+class StubResponse:
+    def __init__(self, data):
+        self.data = data
+
+
+class StubRPC:
+    def __init__(self, supabase):
+        self.supabase = supabase
+
+    async def execute(self):
+        self.supabase.calls += 1
+        await asyncio.sleep(self.supabase.latency)
+        return StubResponse([{"embedding_text": "Stub profile chunk"}])
+
+
+class StubSupabase:
+    def __init__(self, latency: float = RPC_LATENCY):
+        self.latency = latency
+        self.calls = 0
+
+    def rpc(self, name, params):
+        return StubRPC(self)
+
+
+class StubStorage:
+    """Supabase Storage helpers of userController, each call blocks like the sync client"""
+    def __init__(self, latency: float = STORAGE_LATENCY):
+        self.latency = latency
+        self.calls = 0
+        self.files = {}
+
+    async def upload(self, client, data, filePath):
+        self.calls += 1
+        time.sleep(self.latency)
+        self.files[filePath] = data
+
+    async def delete(self, client, filePath, *args):
+        self.calls += 1
+        time.sleep(self.latency)
+        self.files.pop(filePath, None)
+
+    async def deleteMany(self, client, filePaths):
+        if filePaths:
+            await self.delete(client, None)
+            for filePath in filePaths:
+                self.files.pop(filePath, None)
+
+    async def download(self, client, filePath):
+        self.calls += 1
+        time.sleep(self.latency)
+        return self.files[filePath]
+
+
+def stubChunks(source: str, count: int = 4) -> dict:
+    return {
+        "chunks": [{"entry": f"{source} entry {index}"} for index in range(count)],
+        "semanticChunks": {"chunks": [
+            {"embedding_text": f"{source} experience {index}", "metadata": {"company": f"Company {index}"}}
+            for index in range(count)
+        ]},
+    }
+
+
+class StubUserDataProcessor:
+    """
+    Stands in for ProcessUserData with blocking sleeps, as the real ingest
+    calls block. Extraction is a file upload plus a generation, each chunker
+    two chained LLM calls.
+    """
+    def __init__(self, llm=None, embedder=None, latency: float = LLM_LATENCY):
+        self.latency = latency
+        self.resumeExtractor = self.resumeChunker = self.linkedinChunker = None
+
+    async def extractResume(self, resume):
+        await resume.read()
+        time.sleep(2 * self.latency)
+        return "Stub resume text"
+
+    async def chunkResume(self, resumeText):
+        time.sleep(2 * self.latency)
+        return stubChunks("resume")
+
+    async def chunkLinkedin(self, linkedinText):
+        time.sleep(2 * self.latency)
+        return stubChunks("linkedin")
+
+    def filterChunks(self, chunks):
+        return {"validChunks": {"similar": [], "unsimilar": chunks}, "naCompanyChunks": {"similar": [], "unsimilar": []}}
+
+    async def generateEmbeddings(self, supabaseClient, email, chunks):
+        time.sleep(EMBED_LATENCY)
+
+
+def patchIngestClients(userController, storage: StubStorage, processor=StubUserDataProcessor):
+    """Points the ingest pipeline's storage helpers and processor at the stubs"""
+    userController.getSupabaseClient = lambda: None
+    userController.getEmbeddingConfig = lambda: None
+    userController.ProcessUserData = processor
+    userController.deleteResume = storage.delete
+    userController.downloadJson = storage.download
+    for name in ("uploadResume", "uploadText", "uploadJson"):
+        setattr(ingestArtifacts, name, storage.upload)
+    ingestArtifacts.deleteFiles = storage.deleteMany
+
+
+class StubTableQuery:
+    def __init__(self, table):
+        self.table = table
+        self.action = None
+        self.filters = []
+
+    def select(self, columns):
+        self.action = ("select", [column.strip() for column in columns.split(",")])
+        return self
+
+    def insert(self, rows):
+        self.action = ("insert", rows)
+        return self
+
+    def delete(self):
+        self.action = ("delete", None)
+        return self
+
+    def eq(self, column, value):
+        self.filters.append(lambda row: row.get(column) == value)
+        return self
+
+    def in_(self, column, values):
+        values = set(values)
+        self.filters.append(lambda row: row.get(column) in values)
+        return self
+
+    def execute(self):
+        table = self.table
+        table.calls += 1
+        time.sleep(table.latency)
+        kind, argument = self.action
+        matches = [row for row in table.rows if all(check(row) for check in self.filters)]
+        if kind == "select":
+            return StubResponse([{column: row.get(column) for column in argument} for row in matches])
+        if kind == "insert":
+            for row in argument:
+                table.nextId += 1
+                table.rows.append({"id": table.nextId, **row})
+            table.written += len(argument)
+        else:
+            table.rows = [row for row in table.rows if row not in matches]
+            table.written += len(matches)
+        table.minRows = min(table.minRows, len(table.rows))
+        return StubResponse(matches if kind == "delete" else argument)
+
+
+class StubEmbeddingTable:
+    """user_profile_embeddings behind the sync Supabase client, tracks rows written and the fewest rows ever stored"""
+    def __init__(self, latency: float = RPC_LATENCY):
+        self.latency = latency
+        self.rows = []
+        self.nextId = 0
+        self.calls = 0
+        self.written = 0
+        self.minRows = 0
+
+    def table(self, name):
+        return StubTableQuery(self)
+
+    def resetCounters(self):
+        self.calls = self.written = 0
+        self.minRows = len(self.rows)
+
+
+def stubJobRequest(index: int = 0) -> dict:
+    return {
+        "jobTitle": "Software Engineer",
+        "companyName": "Stub Corp",
+        # Phrased so the local research classifier defers to the (stubbed) LLM
+        "question": f"What interests you about this role? ({index})",
+        "jobDescription": "Build backend services in Python and Kubernetes.",
+        "email": "bench@example.com",
+    }
+
+
+def patchAnswerClients(jobController, llm, tavily, embedder, supabase):
+    """Points the controller's dependency getters at the stubs"""
+    async def getAsyncSupabaseClient():
+        return supabase
+
+    async def getLLM(email):
+        return llm
+
+    async def getTavilyClient(email):
+        return tavily
+
+    jobController.getLLM = getLLM
+    jobController.getTavilyClient = getTavilyClient
+    jobController.getAsyncEmbeddingConfig = lambda: embedder
+    jobController.getAsyncSupabaseClient = getAsyncSupabaseClient
+    resetCaches()
+
+
+def resetCaches():
+    """Drops cached upstream results so each measured run starts cold"""
+    researchCache._researchCache = None
+    semanticCache._semanticCaches.clear()
+    dependencies._queryEmbeddingCache.clear()
+    singleflight._answerFlight = None
+    jobSessions._jobSessionStore = None
+    useEmbeddingStore(embeddingStore.MemoryEmbeddingStore(maxEntries=10000))
+
+
+def useEmbeddingStore(store):
+    """Replaces the embedding store, None disables it"""
+    embeddingStore._embeddingStore = store
+    embeddingStore._embeddingStoreLoaded = True
@@ -1,470 +1,1009 @@
-from services.dependencies import getLLM, getSupabaseClient, getEmbeddingConfig, getTavilyClient, queryEmbedder
-from fastapi.responses import JSONResponse
+from services.dependencies import getLLM, getAsyncSupabaseClient, getAsyncEmbeddingConfig, getTavilyClient, queryEmbedder, queryBatchEmbedder
+from fastapi.responses import JSONResponse, StreamingResponse
 import requests.exceptions
+import os
 import logging
-from services.outputSchemas import JobApplicationState, CompanyResearchDecision, SearchQuery, OptimalQuery, ResponseOutput
+import asyncio
+import json
+import hashlib
+import math
+from services.outputSchemas import JobApplicationState, CompanyResearchDecision, SearchQuery, OptimalQuery, OptimalQueries, ResponseOutput, AnswerPlan, JobRequirements
 from langchain_core.prompts import ChatPromptTemplate
+from services.stageGraph import StageGraph, LatencyBudget
+from services.researchCache import getResearchCache, researchCacheKey
+from services.semanticCache import getSemanticCache, semanticCacheEnabled
+from services.researchClassifier import getResearchClassifier, researchClassifierEnabled
+from services.localVectorIndex import getLocalVectorStore, localRetrievalEnabled
+from services.runnableRegistry import structuredModel
+from services.metrics import timed
+from services.singleflight import getAnswerFlight
+from services.contextPacker import packContext, CONTEXT_TOKEN_BUDGET
+from services.metrics import recordContextTokens
+from services.jobSessions import JobSession, getJobSessionStore
+from services.rateLimiter import getScheduler, isRateLimitError, RateLimitedError, RATE_LIMIT_BACKOFF_SECONDS
 from dotenv import load_dotenv
 
 load_dotenv()
 
 logger = logging.getLogger(__name__)
 
-async def createFinalResponse(state: JobApplicationState, model) -> JobApplicationState:
-    prompt = None
-    if state["companyResearchDecision"]:
-        prompt = ChatPromptTemplate.from_messages([
-    ("system",
+# Upper bound on questions accepted by /job/answers, lowered to what the
+# user's Gemini quota admits (see maxBatchQuestions)
+MAX_BATCH_QUESTIONS = 10
+
+# Worst-case LLM calls of a batch: the company search query and job query once,
+# then each question's decision, query rewrite and answer
+BATCH_SHARED_LLM_CALLS = 2
+BATCH_LLM_CALLS_PER_QUESTION = 3
+
+# MMR retrieval settings, shared by the Supabase RPC and the local index
+MMR_FETCH_COUNT = 15
+MMR_LAMBDA_MULT = 0.8
+MMR_MATCH_THRESHOLD = 0.45
+
+# "vector" ranks chunks by embedding similarity only, "hybrid" fuses in BM25
+# matches on the search query. Requests can override it with retrievalMode.
+RETRIEVAL_MODE = os.getenv("RETRIEVAL_MODE", "vector")
+
+# "multicall" runs the decision and query rewrites as separate LLM calls,
+# "planner" asks for all of them in one structured call
+ANSWER_PIPELINE_MODE = os.getenv("ANSWER_PIPELINE_MODE", "multicall").lower()
+
+# "single" retrieves with one rewritten query, "multi" has the rewriters return
+# 2-4 sub-queries that are embedded in one batch and retrieved concurrently.
+# Either way the answer gets the same number of chunks.
+QUERY_MODE = os.getenv("QUERY_MODE", "single").lower()
+MAX_SUB_QUERIES = 4
+
+# Deadline for one answer (0 disables it). Optional stages stop at their own cap
+# and must leave ANSWER_RESERVE_SECONDS for retrieval and the final answer; when
+# they run out they fall back and the response lists the degradation.
+ANSWER_BUDGET_SECONDS = float(os.getenv("ANSWER_BUDGET_SECONDS", "30"))
+ANSWER_RESERVE_SECONDS = float(os.getenv("ANSWER_RESERVE_SECONDS", "10"))
+OPTIONAL_STAGE_TIMEOUTS = {
+    "questionEmbedding": 2.0,
+    "decision": 5.0,
+    "researchQuery": 8.0,
+    "research": 12.0,
+    "jobQuery": 8.0,
+    "questionQuery": 8.0,
+    "plan": 10.0,
+}
+
+# Reported in the response when the stage fell back
+DEGRADATIONS = {
+    "questionEmbedding": "skippedSemanticCache",
+    "decision": "defaultedResearchDecision",
+    "researchQuery": "rawCompanySearchQuery",
+    "research": "skippedCompanyResearch",
+    "jobQuery": "rawJobDescriptionQuery",
+    "questionQuery": "rawQuestionQuery",
+    "plan": "skippedPlanner",
+}
+
+# Tavily searches retried after a 429, each after the key's backoff
+TAVILY_RATE_LIMIT_RETRIES = 1
+
+# Cap on the job description used as a query when its rewrite is skipped
+RAW_QUERY_MAX_CHARS = 2000
+
+MULTI_QUERY_INSTRUCTION = """
+    Return 2-4 search queries instead of one. Each query must cover a different aspect of the
+    information need (e.g. technical skills, leadership, domain experience, motivation), be
+    self-contained, and follow all the rules above. Do not return the same query with minor
+    wording changes; if the need has only one aspect, return 2 queries phrased around different
+    resume sections.
+"""
+
+FINAL_RESPONSE_RESEARCH_PROMPT = ChatPromptTemplate.from_messages([
+("system",
+"""
+Write 3 sentences (60-75 words) explaining why they're interested in this company/role.
+
+Sentence 1: One specific thing they learned from their work
+Sentence 2: How the company's specific product/feature reflects that
+Sentence 3: What aspect of the work interests them
+
+Banned words: your, you're, eager, passionate, excited, innovative, cutting-edge, resonates, aligns, opportunity, impactful, solutions, benefit
+
+Keep it conversational. Reference actual product names. Focus on the work, not career growth.
+Under 75 words.
+"""
+),            
+("user",
+"""
+Question: {question}
+Company: {company_data}
+Background: {user_data}
+Job: {job_title}
+
+Write 3 short sentences (60-75 words). Conversational tone. Specific products. No banned words.
+"""
+)
+])
+
+FINAL_RESPONSE_PROMPT = ChatPromptTemplate.from_messages([
+    ("system", 
         """
-        Write 3 sentences (60-75 words) explaining why they're interested in this company/role.
-        
-        Sentence 1: One specific thing they learned from their work
-        Sentence 2: How the company's specific product/feature reflects that
-        Sentence 3: What aspect of the work interests them
-        
-        Banned words: your, you're, eager, passionate, excited, innovative, cutting-edge, resonates, aligns, opportunity, impactful, solutions, benefit
-        
-        Keep it conversational. Reference actual product names. Focus on the work, not career growth.
-        Under 75 words.
+           You are a career coach helping candidates sound authentic in interviews. Your job is to help them connect their genuine interests and past work to a role they're excited about—without sounding rehearsed or like they're reading from a resume.
+
+            ## Your Approach:
+            This is about showing the hiring manager: "Here's who I am, here's what I've learned matters to me, here's why this specific role excites me."
+
+            ## The Response (3-4 sentences):
+            This should feel like a natural answer—it reads like they're explaining their thinking to a colleague, not pitching themselves.
+
+            ### Structure Pattern:
+            ✅ "I realized through [type of work] that I really enjoy [what they discovered]. This role's focus on [specific responsibility from job description] appeals to me for exactly that reason. I'm drawn to the opportunity to [concrete thing they'd do], and I'm particularly interested in learning how [aspect of role or company approach] works."
+
+            ✅ "What I've learned matters to me is [genuine insight from their background]. When I looked at this role, I saw that [specific job responsibility] is a core part of the work, which aligns perfectly with where I want to take my career. I want to keep building [type of work], especially in environments where [what appeals to them about the role or company]."
+
+            ### What NOT to do:
+            ❌ "I have skills in X, Y, and Z. I've done projects with A and B. I think I'd be a good fit." (Just listing skills and tech)
+
+            ❌ "I'm passionate about software engineering and excited about this opportunity." (Generic, says nothing real)
+
+            ❌ List specific metrics or achievements - only mention them if they explain why the role matters to them
+
+            ## Critical Rules:
+            1. **Tell the story behind the interest** - Why do they actually want this role, not just what they can do
+            2. **Use ONE concrete example from their work** - Make it real and specific, grounded in actual experience
+            3. **Connect it naturally to the job** - Don't force the connection, let it flow logically
+            4. **Avoid listing technologies or achievements** - Mention them only if they explain why the role matters
+            5. **Sound like yourself** - Conversational, genuine, natural pacing
+            6. **Focus on what excites them about THIS role** - Not the company, but the actual work they'd do
+            7. **Express authentic curiosity or growth interest** - What do they want to learn? What problem appeals to them?
+            8. **Never sound rehearsed** - Write like they're explaining their thinking, not delivering a speech
+            9. **Show thoughtfulness about the job itself** - Demonstrate you understand what the role actually involves
         """
-    ),            
-    ("user",
+    ),
+    ("user", 
         """
-        Question: {question}
-        Company: {company_data}
-        Background: {user_data}
-        Job: {job_title}
-        
-        Write 3 short sentences (60-75 words). Conversational tone. Specific products. No banned words.
+
+            Here's the context:
+
+            ## Question:
+            {question}
+
+            ## Job Title & Description:
+            {job_title}
+            {job_description}
+
+            ## Their relevant background (resume + LinkedIn):
+            {user_data}
+
+            ---
+
+            ## Your task:
+            Craft 3-4 sentences that sound like a genuine explanation of why this role appeals to them.
+
+            ### Think through this BEFORE writing:
+            1. What's ONE responsibility or aspect of this role that genuinely fits their interests or strengths?
+            2. What's ONE real experience from their background that shows why that matters to them?
+            3. How do those naturally connect?
+            4. What do they want to learn or explore in this role?
+
+            ### Then write (in this order):
+            - Sentence 1: Start with what they've discovered matters to them from their background
+            - Sentence 2: Connect that to a specific responsibility from the job description
+            - Sentence 3: Explain why that combination excites them
+            - Sentence 4 (optional): End with what they hope to learn or contribute
+            - Keep it conversational throughout—like explaining their thinking
+
+            Remember: They're explaining their thinking to someone, not selling themselves. Focus on why the role matters to them, not why they're perfect for it.
         """
     )
 ])
-    else:
-        prompt = ChatPromptTemplate.from_messages([
-            ("system", 
-                """
-                   You are a career coach helping candidates sound authentic in interviews. Your job is to help them connect their genuine interests and past work to a role they're excited about—without sounding rehearsed or like they're reading from a resume.
-
-                    ## Your Approach:
-                    This is about showing the hiring manager: "Here's who I am, here's what I've learned matters to me, here's why this specific role excites me."
-
-                    ## The Response (3-4 sentences):
-                    This should feel like a natural answer—it reads like they're explaining their thinking to a colleague, not pitching themselves.
-
-                    ### Structure Pattern:
-                    ✅ "I realized through [type of work] that I really enjoy [what they discovered]. This role's focus on [specific responsibility from job description] appeals to me for exactly that reason. I'm drawn to the opportunity to [concrete thing they'd do], and I'm particularly interested in learning how [aspect of role or company approach] works."
-
-                    ✅ "What I've learned matters to me is [genuine insight from their background]. When I looked at this role, I saw that [specific job responsibility] is a core part of the work, which aligns perfectly with where I want to take my career. I want to keep building [type of work], especially in environments where [what appeals to them about the role or company]."
-
-                    ### What NOT to do:
-                    ❌ "I have skills in X, Y, and Z. I've done projects with A and B. I think I'd be a good fit." (Just listing skills and tech)
-
-                    ❌ "I'm passionate about software engineering and excited about this opportunity." (Generic, says nothing real)
-
-                    ❌ List specific metrics or achievements - only mention them if they explain why the role matters to them
-
-                    ## Critical Rules:
-                    1. **Tell the story behind the interest** - Why do they actually want this role, not just what they can do
-                    2. **Use ONE concrete example from their work** - Make it real and specific, grounded in actual experience
-                    3. **Connect it naturally to the job** - Don't force the connection, let it flow logically
-                    4. **Avoid listing technologies or achievements** - Mention them only if they explain why the role matters
-                    5. **Sound like yourself** - Conversational, genuine, natural pacing
-                    6. **Focus on what excites them about THIS role** - Not the company, but the actual work they'd do
-                    7. **Express authentic curiosity or growth interest** - What do they want to learn? What problem appeals to them?
-                    8. **Never sound rehearsed** - Write like they're explaining their thinking, not delivering a speech
-                    9. **Show thoughtfulness about the job itself** - Demonstrate you understand what the role actually involves
-                """
-            ),
-            ("user", 
-                """
-
-                    Here's the context:
-
-                    ## Question:
-                    {question}
-
-                    ## Job Title & Description:
-                    {job_title}
-                    {job_description}
-
-                    ## Their relevant background (resume + LinkedIn):
-                    {user_data}
-
-                    ---
-
-                    ## Your task:
-                    Craft 3-4 sentences that sound like a genuine explanation of why this role appeals to them.
-
-                    ### Think through this BEFORE writing:
-                    1. What's ONE responsibility or aspect of this role that genuinely fits their interests or strengths?
-                    2. What's ONE real experience from their background that shows why that matters to them?
-                    3. How do those naturally connect?
-                    4. What do they want to learn or explore in this role?
-
-                    ### Then write (in this order):
-                    - Sentence 1: Start with what they've discovered matters to them from their background
-                    - Sentence 2: Connect that to a specific responsibility from the job description
-                    - Sentence 3: Explain why that combination excites them
-                    - Sentence 4 (optional): End with what they hope to learn or contribute
-                    - Keep it conversational throughout—like explaining their thinking
-
-                    Remember: They're explaining their thinking to someone, not selling themselves. Focus on why the role matters to them, not why they're perfect for it.
-                """
-            )
-        ])
-    
-    structured_model = model.with_structured_output(ResponseOutput)
 
+def packAnswerContext(state: JobApplicationState) -> JobApplicationState:
+    """Fits the job description, company data and retrieved chunks into CONTEXT_TOKEN_BUDGET"""
+    if CONTEXT_TOKEN_BUDGET <= 0:
+        return state
+    # The research prompt carries company data instead of the job description
+    research = state["companyResearchDecision"]
+    packed = packContext(
+        "" if research else state["jobdescriptionData"],
+        state["collectedCompanyData"] if research else "",
+        state["retrievedUserData"],
+    )
+    state["packedContext"] = packed
+    recordContextTokens(packed["stats"])
+    logger.info(f"Packed answer context: {packed['stats']}")
+    return state
+
+def finalResponsePrompt(state: JobApplicationState):
+    """Formatted prompt for the final answer, shared by the blocking and streaming paths"""
+    packed = state.get("packedContext") or {
+        "jobDescription": state["jobdescriptionData"],
+        "companyData": state["collectedCompanyData"],
+        "userData": state["retrievedUserData"],
+    }
     if state["companyResearchDecision"]:
-        result = structured_model.invoke(prompt.invoke({
+        return FINAL_RESPONSE_RESEARCH_PROMPT.invoke({
             "question": state["question"],
             "job_title": state["jobTitle"],
-            "job_description": state["jobdescriptionData"],
-            "company_data": state["collectedCompanyData"] or "No company data available.",
-            "user_data": state["retrievedUserData"] or "No user data available."
-        }))
-    else:
-        result = structured_model.invoke(prompt.invoke({
-            "question": state["question"],
-            "job_title": state["jobTitle"],
-            "job_description": state["jobDescription"],
-            "user_data": state["retrievedUserData"] or "No user data available."
-        }))
+            "job_description": packed["jobDescription"],
+            "company_data": packed["companyData"] or "No company data available.",
+            "user_data": packed["userData"] or "No user data available."
+        })
+    return FINAL_RESPONSE_PROMPT.invoke({
+        "question": state["question"],
+        "job_title": state["jobTitle"],
+        "job_description": packed["jobDescription"],
+        "user_data": packed["userData"] or "No user data available."
+    })
+
+async def createFinalResponse(state: JobApplicationState, model) -> JobApplicationState:
+    structured_model = structuredModel(model, ResponseOutput)
+    with timed("llm.finalResponse"):
+        result = await structured_model.ainvoke(finalResponsePrompt(state))
     state["finalResponse"] = result.response
     logger.info(f"Final Response:{result.response}")
     return 
 
+async def streamFinalResponse(state: JobApplicationState, model):
+    """Yields the final answer as the model produces it. Plain text, not structured output, so tokens arrive incrementally"""
+    tokens = []
+    with timed("llm.finalResponseStream"):
+        async for chunk in model.astream(finalResponsePrompt(state)):
+            if chunk.content:
+                tokens.append(chunk.content)
+                yield chunk.content
+    state["finalResponse"] = "".join(tokens).strip()
+    logger.info(f"Final Response:{state['finalResponse']}")
+
 
-async def searchUserProfile(queryEmbeddings: list, email: str, client, state, match_count: int = 4):
+async def searchUserProfile(queryEmbeddings: list, email: str, client, state, match_count: int = 4, queryText: str = None, mode: str = None) -> list[str]:
     try:
-        logger.info(f"Searching embeddings for {email} with MMR")
-        
-        # Call the Supabase RPC function
-        response = client.rpc(
-            'search_user_profiles_mmr',
-            {
-                'query_embedding': queryEmbeddings,  # Your 1024-dim vector
-                'filter_user_email': email,      # User email
-                'match_count': match_count,           # How many results (k)
-                'fetch_count': 15,                    # Initial candidates (fetch_k)
-                'lambda_mult': 0.8,                   # Diversity vs relevance
-                'match_threshold': 0.45                # Minimum similarity threshold
-            }
-        ).execute()
-        
-        logger.info(f"Found {len(response.data)} matching chunks")
-        for res in response.data:
-            state["retrievedUserData"].append(res['embedding_text'])
-        return 
+        mode = (mode or RETRIEVAL_MODE).lower()
+        logger.info(f"Searching embeddings for {email} with MMR ({mode})")
+
+        if mode == "hybrid" and queryText:
+            # Lexical matching needs the chunk texts, so hybrid always searches the local index
+            index = await getLocalVectorStore().getIndex(email, client)
+            with timed("local.hybridSearch"):
+                rows = index.hybridSearch(queryEmbeddings, queryText, match_count, MMR_FETCH_COUNT, MMR_LAMBDA_MULT, MMR_MATCH_THRESHOLD)
+        elif localRetrievalEnabled():
+            # Same MMR semantics as the RPC, on the user's vectors held in memory
+            index = await getLocalVectorStore().getIndex(email, client)
+            with timed("local.search"):
+                rows = index.search(queryEmbeddings, match_count, MMR_FETCH_COUNT, MMR_LAMBDA_MULT, MMR_MATCH_THRESHOLD)
+        else:
+            # Call the Supabase RPC function
+            with timed("supabase.searchProfiles"):
+                response = await client.rpc(
+                    'search_user_profiles_mmr',
+                    {
+                        'query_embedding': queryEmbeddings,  # Your 1024-dim vector
+                        'filter_user_email': email,      # User email
+                        'match_count': match_count,           # How many results (k)
+                        'fetch_count': MMR_FETCH_COUNT,       # Initial candidates (fetch_k)
+                        'lambda_mult': MMR_LAMBDA_MULT,       # Diversity vs relevance
+                        'match_threshold': MMR_MATCH_THRESHOLD  # Minimum similarity threshold
+                    }
+                ).execute()
+            rows = response.data
+
+        logger.info(f"Found {len(rows)} matching chunks")
+        matches = [res['embedding_text'] for res in rows]
+        if state is not None:
+            state["retrievedUserData"].extend(matches)
+        return matches
         
     except Exception as e:
         logger.error(f"Error searching embeddings: {e}", exc_info=True)
         raise
 
-async def queryoptimizer(query: str, model) -> str:
-    structuredModel = model.with_structured_output(OptimalQuery)
-    prompt = ChatPromptTemplate.from_messages([
-        ("system", 
-            """
-
-                You are a **Query Optimization Specialist** in a Retrieval-Augmented Generation (RAG) system.
-
-                Purpose in the Pipeline:
-                - Your optimized query will be used to search a **LinkedIn+Resume profile dataset** (structured resume-style chunks including work experience, projects, education, skills, and achievements etc.).
-                - The retriever uses your optimized query to fetch the most relevant profile documents.
-                - These documents will then be passed to another LLM, which answers the user’s question.
-                - Therefore: your job is not to answer the user, but to create the best possible **search query** for the data.
-
-                Core Responsibilities:
-                - Always interpret queries in the context of **personal/professional history** (roles, projects, internships, education, skills, certifications, achievements).
-                - Expand vague terms like "experience" into retrievable resume-related concepts (roles, projects, internships, responsibilities, achievements, skills).
-                - Rephrase, expand, and clarify the query without changing the fundamental meaning.
-                - Add synonyms and variations likely to appear in LinkedIn profile text (e.g., “job”, “role”, “responsibilities”, “accomplishments”).
-                - Incorporate temporal cues like “most recent”, “latest”, “current” when relevant to timelines.
-                - Decompose multi-part queries into clearer sub-queries if needed.
-                - Remove filler, politeness, and irrelevant words.
-
-                Ambiguity Handling:
-                - If the query is vague but still has **enough retrievable meaning**, assume the most likely **resume/LinkedIn interpretation**.
-                - Do **not** default to general industry trends, methods, or research papers unless explicitly stated by the user (e.g., “industry trends”, “state of the art”).
-
-                Important Guardrails:
-                - Do **not** answer the query.
-                - Do **not** add novel facts or make up experiences.
-                - Preserve the user’s intent exactly while improving clarity and retrievability.
-                - Match the phrasing and terminology likely used in LinkedIn documents.
-                - Maintain neutrality and avoid injecting opinion or bias.
-
-                Output Requirements:
-                - Always return in the specified structured format
-
-            """
-        ),
-        ("user", 
-            """
-                User Query: {user_query}
-                Rules:  
-                - Identify the core information need.  
-                - Expand ambiguous terms into LinkedIn/resume-related concepts (roles, skills, projects, achievements, education).  
-                - Add synonyms and related terminology for resume phrasing.  
-                - Rephrase into an optimized search query suitable for semantic retrieval over LinkedIn + Resume data.  
-
-                Final Output Format (must follow exactly): 
-            """
-        )
-    ])
-    response = structuredModel.invoke(prompt.invoke({
-        "user_query": query,
-    }))
-    logger.info(f"Optimized Query: {response.optimized_query}")
-
-    return response.optimized_query
-
-async def companyResearch(state: JobApplicationState, tavily, model) -> JobApplicationState:
-    prompt = ChatPromptTemplate.from_messages([
-    ("system","""
-        You are an expert at crafting search queries that retrieve rich, specific company information.
-        
-        Your goal: Generate ONE search query that will return substantive, recent information about what a company is actually doing—NOT generic company descriptions or careers pages.
-        
-        ## What Makes a Good Search Query:
-        
-        **Include these elements:**
-        1. Company name (exact)
-        2. 2-3 specific focus areas from the job description
-        3. Time indicator ("2024" or "recent") to get fresh information
-        4. Action-oriented terms that surface real initiatives
-        
-        **Search for substance, not fluff:**
-        - Product launches, feature updates, or service expansions
-        - Strategic initiatives, new programs, or business directions
-        - Specific projects, partnerships, or organizational changes
-        - Technical directions, methodologies, or approaches (if relevant)
-        - Market positioning, customer focus, or business model
-        
-        **Prioritize specificity:**
-        - Extract concrete nouns from job description: product names, technologies, methodologies, business areas
-        - Use terms that appear in press releases, blog posts, and company announcements
-        - Include industry-specific language that professionals in that field would use
-        
-        ## Query Construction Strategy:
-        
-        **Pattern:** [Company] + [Specific Focus Areas] + [Action/Update Terms] + [Time]
-         **Examples across industries:**
-        
-        Tech company, engineering role:
-        Job mentions: "machine learning models, recommendation systems"
-        Query: "Netflix recommendation algorithms ML features 2024"
-        
-        Retail company, marketing role:
-        Job mentions: "omnichannel customer experience, brand campaigns"
-        Query: "Target omnichannel strategy brand campaigns customer experience 2024"
-        
-        Finance company, analyst role:
-        Job mentions: "risk modeling, regulatory compliance"
-        Query: "JPMorgan risk modeling compliance initiatives recent updates"
-        
-        Healthcare company, operations role:
-        Job mentions: "patient care workflows, EHR systems"
-        Query: "Kaiser patient care EHR workflow improvements 2024"
-        
-        Consulting firm, strategy role:
-        Job mentions: "digital transformation, client solutions"
-        Query: "McKinsey digital transformation solutions client approach recent"
-        
-        E-commerce company, product role:
-        Job mentions: "checkout experience, payment processing"
-        Query: "Shopify checkout payment infrastructure updates 2024"
-        
-        ## What to AVOID:
-        
-        ❌ Generic terms that return careers/HR pages:
-        - "culture", "values", "mission", "working at", "careers", "jobs"
-        - "overview", "about us", "company profile"
-        - "internship", "hiring", "team", "employees"
-        
-        ❌ Terms too vague to be useful:
-        - "innovative", "leading", "top", "best"
-        - Just the company name alone
-        - Just the job title
-        
-        ❌ Geographic specifics unless critical:
-        - "Canada office", "Toronto location" (unless role is region-specific)
-        
-        ✅ Terms that surface real content:
-        - Product/service names
-        - Technologies, methodologies, frameworks
-        - Business functions (not culture)
-        - Strategic directions
-        - Industry-specific terminology
-        
-        ## Query Length:
-        - Aim for 6-10 words
-        - Balance between specific enough to be useful and broad enough to return results
-        - Include "2024", "recent", or "new" to get fresh information
-        
-        ## Quality Check:
-        Before finalizing, ask:
-        - Would this query return a press release, blog post, or product page? ✅
-        - Would this query return a careers/jobs page? ❌
-        - Does this include specific terms from the job description? ✅
-        - Could this query work for 10 different companies? ❌
-        
-        Return ONLY the search query string, nothing else.
-        
-        """
-        
-        ),
-        ("user",
-            """
-               Generate a single, focused search query to find specific, recent information about this company.
-        
-        Company Name: {company_name}
-        
-        Job Title: {job_title}
-        
-        Job Description: {job_description}
-        
-        ---
-        
-        Instructions:
-        1. Identify 2-3 most important focus areas from the job description (products, technologies, business areas, methodologies)
-        2. Construct query: [Company] + [Focus Areas] + time indicator
-        3. Ensure query will return substantive content, not careers pages
-        4. Keep to 6-10 words
-        
-        Return only the search query string.
-            """
-        )
-    ])
-    structuredModel = model.with_structured_output(SearchQuery)
-    queryResult = structuredModel.invoke(prompt.invoke({
-        "company_name": state["companyName"],
-        "job_title": state["jobTitle"],
-        "job_description": state["jobdescriptionData"],
-    }))
-    logger.info(f"Generated Search Query: {queryResult.search_query}")
-    logger.info(f"Research required for {state['companyName']} — running Tavily search...")
+def multiQueryEnabled() -> bool:
+    return QUERY_MODE == "multi"
 
+def subQueries(queries: list[str], fallback: str) -> list[str]:
+    """Strips and dedupes the rewriter's sub-queries, capped at MAX_SUB_QUERIES"""
+    queries = list(dict.fromkeys(query.strip() for query in queries if query and query.strip()))
+    return queries[:MAX_SUB_QUERIES] or [fallback]
 
-    # ONE API CALL - Tavily handles the rest
-    results = tavily.invoke(queryResult.search_query)
-    state["collectedCompanyData"] = results.get("answer", str(results))
-    return 
+def mergeRankings(rankings: list[list[str]], budget: int) -> list[str]:
+    """Interleaves best-first result lists rank by rank, skipping duplicates, until `budget` chunks are picked"""
+    merged = []
+    for rank in range(max(map(len, rankings), default=0)):
+        for ranking in rankings:
+            if rank < len(ranking) and ranking[rank] not in merged:
+                merged.append(ranking[rank])
+                if len(merged) == budget:
+                    return merged
+    return merged
 
-async def companyResearchDecision(state: JobApplicationState, model) -> JobApplicationState:
-
-    prompt = ChatPromptTemplate.from_messages([
-        ("system", 
-            """
-                You are an expert at analyzing job application questions.
-
-                Determine if company-specific information (mission, values, culture, products, news, recent initiatives) 
-                is needed to answer this question effectively.
-
-                **Guidelines:**
-                - Questions like "Why do you want to work here?", "What interests you about our company?", 
-                "How do you align with our values?" ALWAYS need company research
-                - Questions about the company's products, culture, or recent news need research
-                - Questions about past experiences, technical skills, or hypothetical scenarios 
-                usually DON'T need company info
-                - Questions about "this role" might need company context if they ask about 
-                contributing to company goals
-
-                Be conservative: if company info would significantly improve the answer, mark as needed.
-            """
-        ),
-        ("user", 
-            """
-                **Open-Ended Question:**
-                {question}
-                Does answering this question require researching company information?
-            """
-        )
-    ])
+async def searchUserProfileMulti(queryEmbeddings: list[list], queries: list[str], email: str, client, state, match_count: int = 4, mode: str = None) -> list[str]:
+    """Searches once per sub-query concurrently and merges the results within the same match_count budget"""
+    rankings = await asyncio.gather(*(
+        searchUserProfile(embedding, email, client, None, match_count, query, mode)
+        for embedding, query in zip(queryEmbeddings, queries)
+    ))
+    matches = mergeRankings(rankings, match_count)
+    logger.info(f"Merged {sum(map(len, rankings))} chunks from {len(queries)} sub-queries into {len(matches)}")
+    if state is not None:
+        state["retrievedUserData"].extend(matches)
+    return matches
 
-    structured_model = model.with_structured_output(CompanyResearchDecision)
-    result = structured_model.invoke(prompt.invoke({
-        "question": state["question"],
-    }))
-    logger.info(f"Company Research Decision: {result.companyResearchDecision}")
-    state["companyResearchDecision"] = result.companyResearchDecision
-    
-    return
+QUERY_OPTIMIZER_PROMPT = ChatPromptTemplate.from_messages([
+    ("system", 
+        """
 
-async def convertJobDatatoQuery( state, model) -> str:
-    prompt = ChatPromptTemplate.from_messages([
-        ("system", 
-            """
             You are a **Query Optimization Specialist** in a Retrieval-Augmented Generation (RAG) system.
 
             Purpose in the Pipeline:
-            - Your optimized query will be used to search a **LinkedIn+Resume profile dataset** (structured resume-style chunks including work experience, projects, education, skills, and achievements).
-            - The retriever uses your optimized query to fetch the most relevant profile documents that match the job requirements.
-            - These documents will then be passed to another LLM, which determines if the candidate is qualified for the job.
-            - Therefore: your job is not to evaluate the candidate, but to create the best possible **search query** to find relevant experiences in their profile.
+            - Your optimized query will be used to search a **LinkedIn+Resume profile dataset** (structured resume-style chunks including work experience, projects, education, skills, and achievements etc.).
+            - The retriever uses your optimized query to fetch the most relevant profile documents.
+            - These documents will then be passed to another LLM, which answers the user’s question.
+            - Therefore: your job is not to answer the user, but to create the best possible **search query** for the data.
 
             Core Responsibilities:
-            - Analyze the job description and extract the most important qualifications, skills, and experiences required.
-            - Transform these requirements into a search query that will match against **personal/professional history** (roles, projects, responsibilities, achievements, skills, certifications, education).
-            - Expand technical acronyms and abbreviations (e.g., "ML" → "Machine Learning", "CI/CD" → "continuous integration continuous deployment").
-            - Include both specific technical terms AND broader role-related concepts (e.g., "React developer" → "React JavaScript frontend development web applications").
-            - Add synonyms and variations likely to appear in LinkedIn/Resume text (e.g., "built", "developed", "implemented", "created").
-            - Capture implicit requirements from the job level (e.g., "Senior" → include leadership, mentoring, architecture).
-
-            Query Construction Guidelines:
-            - Create a natural language query (20-60 words) that combines:
-            * Technical skills and tools mentioned in the job
-            * Key responsibilities and job functions
-            * Domain expertise and industry context
-            * Experience level indicators (junior/mid/senior/lead)
-            - Use phrasing that mirrors how people write about their experience in resumes
-            - Prioritize high-signal terms that differentiate qualified candidates
-            - Remove generic requirements that don't help retrieval (e.g., "good communication", "team player")
+            - Always interpret queries in the context of **personal/professional history** (roles, projects, internships, education, skills, certifications, achievements).
+            - Expand vague terms like "experience" into retrievable resume-related concepts (roles, projects, internships, responsibilities, achievements, skills).
+            - Rephrase, expand, and clarify the query without changing the fundamental meaning.
+            - Add synonyms and variations likely to appear in LinkedIn profile text (e.g., “job”, “role”, “responsibilities”, “accomplishments”).
+            - Incorporate temporal cues like “most recent”, “latest”, “current” when relevant to timelines.
+            - Decompose multi-part queries into clearer sub-queries if needed.
+            - Remove filler, politeness, and irrelevant words.
+
+            Ambiguity Handling:
+            - If the query is vague but still has **enough retrievable meaning**, assume the most likely **resume/LinkedIn interpretation**.
+            - Do **not** default to general industry trends, methods, or research papers unless explicitly stated by the user (e.g., “industry trends”, “state of the art”).
 
             Important Guardrails:
-            - Do **not** answer questions about the job
-            - Do **not** make up experiences or add information not in the job description
-            - Focus solely on creating an optimized search query
-            - Preserve the job's actual requirements while optimizing for retrieval
-
-            What to Avoid:
-            - Generic soft skills ("team player", "good communication", "fast learner")
-            - Common filler words that don't add semantic value
-            - Company-specific jargon or internal role names
-            - Extremely niche terms that may be described differently
-            - Redundant or overlapping phrases
+            - Do **not** answer the query.
+            - Do **not** add novel facts or make up experiences.
+            - Preserve the user’s intent exactly while improving clarity and retrievability.
+            - Match the phrasing and terminology likely used in LinkedIn documents.
+            - Maintain neutrality and avoid injecting opinion or bias.
 
             Output Requirements:
             - Always return in the specified structured format
-            """
-        ),
-        ("user", 
-            """
-            Job Title: {job_title}
-            
-            Job Description: {job_description}
-            
+
+        """
+    ),
+    ("user", 
+        """
+            User Query: {user_query}
             Rules:  
-            - Identify the core skills, technologies, and experiences required for this role
-            - Extract key responsibilities and job functions
-            - Determine the experience level and implied qualifications
-            - Transform these into an optimized search query that will retrieve relevant experiences from a LinkedIn/Resume database
-            - Include technical terms, action verbs, and domain-specific language that would appear in matching profile sections
-            - Expand abbreviations and add related terminology for broader matching
-            """
-        )
-    ])
-    structured_model = model.with_structured_output(OptimalQuery)
-    result = structured_model.invoke(prompt.invoke({
-        "job_title": state["jobTitle"],
-        "job_description": state["jobdescriptionData"],
-    }))
+            - Identify the core information need.  
+            - Expand ambiguous terms into LinkedIn/resume-related concepts (roles, skills, projects, achievements, education).  
+            - Add synonyms and related terminology for resume phrasing.  
+            - Rephrase into an optimized search query suitable for semantic retrieval over LinkedIn + Resume data.  
+
+            Final Output Format (must follow exactly): 
+        """
+    )
+])
+QUERY_OPTIMIZER_MULTI_PROMPT = QUERY_OPTIMIZER_PROMPT + [("user", MULTI_QUERY_INSTRUCTION)]
+
+async def queryoptimizer(query: str, model, queryEmbedding: list = None, multiQuery: bool = False):
+    """Optimized retrieval query for the question, or a list of sub-queries when multiQuery is set"""
+    cacheName = "optimizedQueries" if multiQuery else "optimizedQuery"
+    if queryEmbedding is not None:
+        cachedQuery = getSemanticCache(cacheName).lookup(queryEmbedding, query)
+        if cachedQuery is not None:
+            logger.info(f"Optimized Query (cached): {cachedQuery}")
+            return cachedQuery
+
+    prompt = QUERY_OPTIMIZER_MULTI_PROMPT if multiQuery else QUERY_OPTIMIZER_PROMPT
+    with timed("llm.queryOptimizer"):
+        response = await structuredModel(model, OptimalQueries if multiQuery else OptimalQuery).ainvoke(prompt.invoke({
+            "user_query": query,
+        }))
+    optimizedQuery = subQueries(response.optimized_queries, query) if multiQuery else response.optimized_query
+    logger.info(f"Optimized Query: {optimizedQuery}")
+    if queryEmbedding is not None:
+        getSemanticCache(cacheName).store(queryEmbedding, query, optimizedQuery)
+
+    return optimizedQuery
+
+COMPANY_SEARCH_QUERY_PROMPT = ChatPromptTemplate.from_messages([
+("system","""
+    You are an expert at crafting search queries that retrieve rich, specific company information.
+    
+    Your goal: Generate ONE search query that will return substantive, recent information about what a company is actually doing—NOT generic company descriptions or careers pages.
+    
+    ## What Makes a Good Search Query:
+    
+    **Include these elements:**
+    1. Company name (exact)
+    2. 2-3 specific focus areas from the job description
+    3. Time indicator ("2024" or "recent") to get fresh information
+    4. Action-oriented terms that surface real initiatives
+    
+    **Search for substance, not fluff:**
+    - Product launches, feature updates, or service expansions
+    - Strategic initiatives, new programs, or business directions
+    - Specific projects, partnerships, or organizational changes
+    - Technical directions, methodologies, or approaches (if relevant)
+    - Market positioning, customer focus, or business model
+    
+    **Prioritize specificity:**
+    - Extract concrete nouns from job description: product names, technologies, methodologies, business areas
+    - Use terms that appear in press releases, blog posts, and company announcements
+    - Include industry-specific language that professionals in that field would use
+    
+    ## Query Construction Strategy:
+    
+    **Pattern:** [Company] + [Specific Focus Areas] + [Action/Update Terms] + [Time]
+     **Examples across industries:**
+    
+    Tech company, engineering role:
+    Job mentions: "machine learning models, recommendation systems"
+    Query: "Netflix recommendation algorithms ML features 2024"
+    
+    Retail company, marketing role:
+    Job mentions: "omnichannel customer experience, brand campaigns"
+    Query: "Target omnichannel strategy brand campaigns customer experience 2024"
+    
+    Finance company, analyst role:
+    Job mentions: "risk modeling, regulatory compliance"
+    Query: "JPMorgan risk modeling compliance initiatives recent updates"
+    
+    Healthcare company, operations role:
+    Job mentions: "patient care workflows, EHR systems"
+    Query: "Kaiser patient care EHR workflow improvements 2024"
+    
+    Consulting firm, strategy role:
+    Job mentions: "digital transformation, client solutions"
+    Query: "McKinsey digital transformation solutions client approach recent"
+    
+    E-commerce company, product role:
+    Job mentions: "checkout experience, payment processing"
+    Query: "Shopify checkout payment infrastructure updates 2024"
+    
+    ## What to AVOID:
+    
+    ❌ Generic terms that return careers/HR pages:
+    - "culture", "values", "mission", "working at", "careers", "jobs"
+    - "overview", "about us", "company profile"
+    - "internship", "hiring", "team", "employees"
+    
+    ❌ Terms too vague to be useful:
+    - "innovative", "leading", "top", "best"
+    - Just the company name alone
+    - Just the job title
+    
+    ❌ Geographic specifics unless critical:
+    - "Canada office", "Toronto location" (unless role is region-specific)
+    
+    ✅ Terms that surface real content:
+    - Product/service names
+    - Technologies, methodologies, frameworks
+    - Business functions (not culture)
+    - Strategic directions
+    - Industry-specific terminology
+    
+    ## Query Length:
+    - Aim for 6-10 words
+    - Balance between specific enough to be useful and broad enough to return results
+    - Include "2024", "recent", or "new" to get fresh information
+    
+    ## Quality Check:
+    Before finalizing, ask:
+    - Would this query return a press release, blog post, or product page? ✅
+    - Would this query return a careers/jobs page? ❌
+    - Does this include specific terms from the job description? ✅
+    - Could this query work for 10 different companies? ❌
+    
+    Return ONLY the search query string, nothing else.
+    
+    """
+    
+    ),
+    ("user",
+        """
+           Generate a single, focused search query to find specific, recent information about this company.
+    
+    Company Name: {company_name}
+    
+    Job Title: {job_title}
+    
+    Job Description: {job_description}
+    
+    ---
+    
+    Instructions:
+    1. Identify 2-3 most important focus areas from the job description (products, technologies, business areas, methodologies)
+    2. Construct query: [Company] + [Focus Areas] + time indicator
+    3. Ensure query will return substantive content, not careers pages
+    4. Keep to 6-10 words
+    
+    Return only the search query string.
+        """
+    )
+])
+
+async def companySearchQuery(state: JobApplicationState, model) -> str:
+    with timed("llm.companySearchQuery"):
+        queryResult = await structuredModel(model, SearchQuery).ainvoke(COMPANY_SEARCH_QUERY_PROMPT.invoke({
+            "company_name": state["companyName"],
+            "job_title": state["jobTitle"],
+            "job_description": state["jobdescriptionData"],
+        }))
+    logger.info(f"Generated Search Query: {queryResult.search_query}")
+    return queryResult.search_query
+
+def rawCompanySearchQuery(state: JobApplicationState) -> str:
+    """Search query used when its rewrite is skipped"""
+    return f"{state['companyName']} {state['jobTitle']}"
+
+async def prepareCompanyResearch(state: JobApplicationState, model, searchQuery: str = None) -> tuple:
+    """
+    (cached research, None) when the company was researched recently, else
+    (None, search query). Makes no Tavily call, so it is safe to run before
+    research is known to be needed.
+    """
+    researchCache = getResearchCache()
+    cachedResearch = await researchCache.get(researchCacheKey(state["companyName"], state["jobTitle"], state["jobdescriptionData"]))
+    if cachedResearch is not None:
+        logger.info(f"Company research cache hit for {state['companyName']} ({researchCache.stats()})")
+        return cachedResearch, None
+    return None, searchQuery or await companySearchQuery(state, model)
+
+async def searchCompany(state: JobApplicationState, tavily, searchQuery: str) -> str:
+    logger.info(f"Research required for {state['companyName']} — running Tavily search...")
+
+    # ONE API CALL - Tavily handles the rest
+    scheduler = getScheduler("tavily")
+    for attempt in range(TAVILY_RATE_LIMIT_RETRIES + 1):
+        await scheduler.acquire(state["email"])
+        with timed("tavily.search"):
+            results = await tavily.ainvoke(searchQuery)
+        # TavilySearch returns request errors instead of raising them
+        if not (isinstance(results, dict) and "error" in results and isRateLimitError(results["error"])):
+            break
+        scheduler.backoff(state["email"])
+    else:
+        raise RateLimitedError("tavily", RATE_LIMIT_BACKOFF_SECONDS)
+    answer = results.get("answer") if isinstance(results, dict) else None
+    if not answer:
+        # Request errors (bad key, quota, outage) and empty searches come back as values; the
+        # cache is shared by every user, so only real research is kept and the answer goes without
+        error = results.get("error") if isinstance(results, dict) else results
+        logger.warning(f"Company research for {state['companyName']} returned no answer: {error}")
+        return None
+    state["collectedCompanyData"] = answer
+    await getResearchCache().set(researchCacheKey(state["companyName"], state["jobTitle"], state["jobdescriptionData"]), answer)
+    return answer
+
+async def companyResearch(state: JobApplicationState, tavily, model, searchQuery: str = None) -> JobApplicationState:
+    cachedResearch, searchQuery = await prepareCompanyResearch(state, model, searchQuery)
+    if cachedResearch is not None:
+        state["collectedCompanyData"] = cachedResearch
+        return cachedResearch
+    return await searchCompany(state, tavily, searchQuery)
+
+RESEARCH_DECISION_PROMPT = ChatPromptTemplate.from_messages([
+    ("system", 
+        """
+            You are an expert at analyzing job application questions.
+
+            Determine if company-specific information (mission, values, culture, products, news, recent initiatives) 
+            is needed to answer this question effectively.
+
+            **Guidelines:**
+            - Questions like "Why do you want to work here?", "What interests you about our company?", 
+            "How do you align with our values?" ALWAYS need company research
+            - Questions about the company's products, culture, or recent news need research
+            - Questions about past experiences, technical skills, or hypothetical scenarios 
+            usually DON'T need company info
+            - Questions about "this role" might need company context if they ask about 
+            contributing to company goals
+
+            Be conservative: if company info would significantly improve the answer, mark as needed.
+        """
+    ),
+    ("user", 
+        """
+            **Open-Ended Question:**
+            {question}
+            Does answering this question require researching company information?
+        """
+    )
+])
+
+def localResearchDecision(state: JobApplicationState, questionEmbedding: list = None):
+    """The research decision from the local classifier or the semantic cache, None when the LLM has to make it"""
+    if researchClassifierEnabled():
+        classifier = getResearchClassifier()
+        decision, confidence, source = classifier.classify(state["question"], questionEmbedding)
+        if decision is not None:
+            logger.info(f"Company Research Decision: {decision} (source={source}, confidence={confidence:.2f}, {classifier.stats()})")
+            state["companyResearchDecision"] = decision
+            return decision
+
+    if questionEmbedding is not None:
+        cachedDecision = getSemanticCache("researchDecision").lookup(questionEmbedding, state["question"])
+        if cachedDecision is not None:
+            logger.info(f"Company Research Decision: {cachedDecision} (source=semanticCache)")
+            state["companyResearchDecision"] = cachedDecision
+            return cachedDecision
+    return None
+
+async def companyResearchDecision(state: JobApplicationState, model, questionEmbedding: list = None, checkLocal: bool = True) -> JobApplicationState:
+    if checkLocal:
+        decision = localResearchDecision(state, questionEmbedding)
+        if decision is not None:
+            return decision
+
+    structured_model = structuredModel(model, CompanyResearchDecision)
+    with timed("llm.researchDecision"):
+        result = await structured_model.ainvoke(RESEARCH_DECISION_PROMPT.invoke({
+            "question": state["question"],
+        }))
+    logger.info(f"Company Research Decision: {result.companyResearchDecision} (source=llm)")
+    state["companyResearchDecision"] = result.companyResearchDecision
+    if questionEmbedding is not None:
+        getSemanticCache("researchDecision").store(questionEmbedding, state["question"], result.companyResearchDecision)
+    
+    return result.companyResearchDecision
+
+JOB_QUERY_PROMPT = ChatPromptTemplate.from_messages([
+    ("system", 
+        """
+        You are a **Query Optimization Specialist** in a Retrieval-Augmented Generation (RAG) system.
+
+        Purpose in the Pipeline:
+        - Your optimized query will be used to search a **LinkedIn+Resume profile dataset** (structured resume-style chunks including work experience, projects, education, skills, and achievements).
+        - The retriever uses your optimized query to fetch the most relevant profile documents that match the job requirements.
+        - These documents will then be passed to another LLM, which determines if the candidate is qualified for the job.
+        - Therefore: your job is not to evaluate the candidate, but to create the best possible **search query** to find relevant experiences in their profile.
+
+        Core Responsibilities:
+        - Analyze the job description and extract the most important qualifications, skills, and experiences required.
+        - Transform these requirements into a search query that will match against **personal/professional history** (roles, projects, responsibilities, achievements, skills, certifications, education).
+        - Expand technical acronyms and abbreviations (e.g., "ML" → "Machine Learning", "CI/CD" → "continuous integration continuous deployment").
+        - Include both specific technical terms AND broader role-related concepts (e.g., "React developer" → "React JavaScript frontend development web applications").
+        - Add synonyms and variations likely to appear in LinkedIn/Resume text (e.g., "built", "developed", "implemented", "created").
+        - Capture implicit requirements from the job level (e.g., "Senior" → include leadership, mentoring, architecture).
+
+        Query Construction Guidelines:
+        - Create a natural language query (20-60 words) that combines:
+        * Technical skills and tools mentioned in the job
+        * Key responsibilities and job functions
+        * Domain expertise and industry context
+        * Experience level indicators (junior/mid/senior/lead)
+        - Use phrasing that mirrors how people write about their experience in resumes
+        - Prioritize high-signal terms that differentiate qualified candidates
+        - Remove generic requirements that don't help retrieval (e.g., "good communication", "team player")
+
+        Important Guardrails:
+        - Do **not** answer questions about the job
+        - Do **not** make up experiences or add information not in the job description
+        - Focus solely on creating an optimized search query
+        - Preserve the job's actual requirements while optimizing for retrieval
+
+        What to Avoid:
+        - Generic soft skills ("team player", "good communication", "fast learner")
+        - Common filler words that don't add semantic value
+        - Company-specific jargon or internal role names
+        - Extremely niche terms that may be described differently
+        - Redundant or overlapping phrases
+
+        Output Requirements:
+        - Always return in the specified structured format
+        """
+    ),
+    ("user", 
+        """
+        Job Title: {job_title}
+        
+        Job Description: {job_description}
+        
+        Rules:  
+        - Identify the core skills, technologies, and experiences required for this role
+        - Extract key responsibilities and job functions
+        - Determine the experience level and implied qualifications
+        - Transform these into an optimized search query that will retrieve relevant experiences from a LinkedIn/Resume database
+        - Include technical terms, action verbs, and domain-specific language that would appear in matching profile sections
+        - Expand abbreviations and add related terminology for broader matching
+        """
+    )
+])
+JOB_QUERY_MULTI_PROMPT = JOB_QUERY_PROMPT + [("user", MULTI_QUERY_INSTRUCTION)]
+
+async def convertJobDatatoQuery( state, model, multiQuery: bool = False):
+    prompt = JOB_QUERY_MULTI_PROMPT if multiQuery else JOB_QUERY_PROMPT
+    structured_model = structuredModel(model, OptimalQueries if multiQuery else OptimalQuery)
+    with timed("llm.jobQuery"):
+        result = await structured_model.ainvoke(prompt.invoke({
+            "job_title": state["jobTitle"],
+            "job_description": state["jobdescriptionData"],
+        }))
+    if multiQuery:
+        queries = subQueries(result.optimized_queries, state["jobTitle"])
+        logger.info(f"Converted Job Description to Search Queries: {queries}")
+        return queries
     logger.info(f"Converted Job Description to Search Query: {result.optimized_query}")
     return result.optimized_query
 
-async def generateAnswer(data):
-    state: JobApplicationState = {
+ANSWER_PLAN_PROMPT = ChatPromptTemplate.from_messages([
+    ("system",
+        """
+            You plan how to answer an open-ended job application question using the candidate's
+            resume + LinkedIn profile and, when needed, web research about the company.
+
+            **1. companyResearchDecision**
+            Decide if company-specific information (mission, values, culture, products, news, recent
+            initiatives) is needed to answer the question effectively.
+            - "Why do you want to work here?", "What interests you about our company?",
+            "How do you align with our values?" ALWAYS need company research
+            - Questions about the company's products, culture, or recent news need research
+            - Questions about past experiences, technical skills, or hypothetical scenarios usually DON'T
+            - Be conservative: if company info would significantly improve the answer, mark as needed
+
+            **2. retrieval_query**
+            A search query over the candidate's profile chunks (roles, projects, education, skills, achievements).
+            - If research is needed: build it from the job description. Extract the key skills, technologies,
+            responsibilities and seniority, expand acronyms, and phrase it the way people describe their
+            experience in resumes (20-60 words)
+            - Otherwise: rephrase and expand the question into resume/LinkedIn terms, with synonyms for roles,
+            projects, responsibilities and accomplishments
+            - Never answer the question and never invent experiences
+            - Leave out generic soft skills ("team player", "good communication")
+
+            **3. search_query**
+            Only when research is needed, otherwise an empty string.
+            - [Company] + 2-3 focus areas from the job description (products, technologies, business areas) + time indicator
+            - 6-10 words, aimed at press releases, engineering blogs and product pages, not careers pages
+        """
+    ),
+    ("user",
+        """
+            Question: {question}
+
+            Company Name: {company_name}
+
+            Job Title: {job_title}
+
+            Job Description: {job_description}
+        """
+    )
+])
+
+async def planAnswer(state: JobApplicationState, model) -> AnswerPlan:
+    """Research decision, retrieval query and company search query in a single structured call"""
+    with timed("llm.plan"):
+        plan = await structuredModel(model, AnswerPlan).ainvoke(ANSWER_PLAN_PROMPT.invoke({
+            "question": state["question"],
+            "company_name": state["companyName"],
+            "job_title": state["jobTitle"],
+            "job_description": state["jobdescriptionData"],
+        }))
+    logger.info(f"Answer Plan: {plan}")
+    state["companyResearchDecision"] = plan.companyResearchDecision
+    return plan
+
+def buildPlannerAnswerGraph(state: JobApplicationState, llm, tavily, supabase, embeddingConfig, answerStage=None, onStageComplete=None, budget: LatencyBudget = None) -> StageGraph:
+    """Planner mode: one LLM call replaces the decision and query rewrite stages"""
+    async def research(results):
+        return await companyResearch(state, tavily, llm, results["plan"].search_query)
+
+    async def embedQuery(results):
+        return await queryEmbedder(results["plan"].retrieval_query, embeddingConfig)
+
+    async def retrieve(results):
+        await searchUserProfile(results["queryEmbedding"], state["email"], supabase, state, 4, results["plan"].retrieval_query, state.get("retrievalMode"))
+        logger.info(state["retrievedUserData"])
+
+    async def answer(results):
+        logger.info(state["collectedCompanyData"])
+        await createFinalResponse(state, llm)
+
+    async def packStage(results):
+        return packAnswerContext(state)["packedContext"]
+
+    def skippedPlan(results):
+        return AnswerPlan(companyResearchDecision=False, retrieval_query=state["question"], search_query="")
+
+    graph = StageGraph("answerPlanner", onStageComplete)
+    graph.addStage("plan", lambda results: planAnswer(state, llm), timeout=optionalTimeout(budget, "plan"), fallback=skippedPlan)
+    graph.addStage("research", research, deps=["plan"], gate="plan", when=lambda plan: plan.companyResearchDecision, timeout=optionalTimeout(budget, "research"), fallback=lambda results: None)
+    graph.addStage("queryEmbedding", embedQuery, deps=["plan"], timeout=requiredTimeout(budget))
+    graph.addStage("retrieval", retrieve, deps=["queryEmbedding"], timeout=requiredTimeout(budget))
+    graph.addStage("contextPacking", packStage, deps=["retrieval", "research"])
+    graph.addStage("answer", answerStage or answer, deps=["contextPacking"], timeout=requiredTimeout(budget))
+    return graph
+
+def newLatencyBudget() -> LatencyBudget:
+    if ANSWER_BUDGET_SECONDS <= 0:
+        return None
+    return LatencyBudget(ANSWER_BUDGET_SECONDS, ANSWER_RESERVE_SECONDS)
+
+def optionalTimeout(budget: LatencyBudget, stage: str):
+    return budget.optional(OPTIONAL_STAGE_TIMEOUTS[stage]) if budget else None
+
+def requiredTimeout(budget: LatencyBudget):
+    return budget.required() if budget else None
+
+def answerDegradations(graph: StageGraph) -> list[str]:
+    return [DEGRADATIONS[name] for name in graph.degraded if name in DEGRADATIONS]
+
+def rawQuery(text: str, multiQuery: bool):
+    """Unrewritten text in the shape the query stages return"""
+    return [text] if multiQuery else text
+
+def rawJobQuery(state: JobApplicationState, multiQuery: bool):
+    return rawQuery(f"{state['jobTitle']} {state['jobdescriptionData']}"[:RAW_QUERY_MAX_CHARS], multiQuery)
+
+def buildAnswerGraph(state: JobApplicationState, llm, tavily, supabase, embeddingConfig, answerStage=None, onStageComplete=None, mode: str = None, budget: LatencyBudget = None, session: JobSession = None) -> StageGraph:
+    """
+    Stage graph for the configured pipeline mode (ANSWER_PIPELINE_MODE). Job
+    session answers use the session graph, whatever the mode.
+    """
+    if session is not None:
+        return buildSessionAnswerGraph(state, llm, supabase, embeddingConfig, session, answerStage, onStageComplete, budget)
+    if (mode or ANSWER_PIPELINE_MODE) == "planner":
+        return buildPlannerAnswerGraph(state, llm, tavily, supabase, embeddingConfig, answerStage, onStageComplete, budget)
+    return buildMultiCallAnswerGraph(state, llm, tavily, supabase, embeddingConfig, answerStage, onStageComplete, budget)
+
+def buildSessionAnswerGraph(state: JobApplicationState, llm, supabase, embeddingConfig, session: JobSession, answerStage=None, onStageComplete=None, budget: LatencyBudget = None) -> StageGraph:
+    """
+    Stage graph for an answer in a job session, where the answer is the only
+    LLM call. Research, the job query and its embedding come from the
+    session's precompute. The research decision comes from the local
+    classifier or semantic cache, otherwise research is used whenever the
+    session has it. Questions without research retrieve with the question
+    itself instead of a rewrite. A job query the precompute could not build
+    is replaced by the raw job description; missing research is left out.
+    """
+    multiQuery = multiQueryEnabled()
+
+    async def waitForSession(results):
+        await session.wait()
+
+    async def embedQuestion(results):
+        return await queryEmbedder(state["question"], embeddingConfig)
+
+    async def decide(results):
+        decision = localResearchDecision(state, results["questionEmbedding"])
+        state["companyResearchDecision"] = session.companyData is not None if decision is None else decision
+        return state["companyResearchDecision"]
+
+    async def research(results):
+        if session.companyData is not None:
+            state["collectedCompanyData"] = session.companyData
+        return session.companyData
+
+    async def jobQuery(results):
+        if session.jobQuery is not None and session.jobQueryEmbedding is not None:
+            return session.jobQuery, session.jobQueryEmbedding
+        query = rawJobQuery(state, multiQuery)
+        return query, await (queryBatchEmbedder if multiQuery else queryEmbedder)(query, embeddingConfig)
+
+    async def retrieve(results):
+        if not results["decision"]:
+            await searchUserProfile(results["questionEmbedding"], state["email"], supabase, state, 4, state["question"], state.get("retrievalMode"))
+        elif multiQuery:
+            query, embedding = results["jobQuery"]
+            await searchUserProfileMulti(embedding, query, state["email"], supabase, state, 4, state.get("retrievalMode"))
+        else:
+            query, embedding = results["jobQuery"]
+            await searchUserProfile(embedding, state["email"], supabase, state, 4, query, state.get("retrievalMode"))
+        logger.info(state["retrievedUserData"])
+
+    async def packStage(results):
+        if session.requirements is not None:
+            # The extracted requirements stand in for the full posting
+            state["jobdescriptionData"] = renderRequirements(session.requirements)
+        return packAnswerContext(state)["packedContext"]
+
+    async def answer(results):
+        logger.info(state["collectedCompanyData"])
+        await createFinalResponse(state, llm)
+
+    researchNeeded = lambda decision: decision
+
+    graph = StageGraph("sessionAnswer", onStageComplete)
+    graph.addStage("session", waitForSession, timeout=requiredTimeout(budget))
+    graph.addStage("questionEmbedding", embedQuestion, timeout=requiredTimeout(budget))
+    graph.addStage("decision", decide, deps=["session", "questionEmbedding"])
+    graph.addStage("research", research, deps=["session"], gate="decision", when=researchNeeded)
+    graph.addStage("jobQuery", jobQuery, deps=["session"], gate="decision", when=researchNeeded, timeout=requiredTimeout(budget))
+    graph.addStage("retrieval", retrieve, deps=["decision", "jobQuery"], timeout=requiredTimeout(budget))
+    graph.addStage("contextPacking", packStage, deps=["retrieval", "research"])
+    graph.addStage("answer", answerStage or answer, deps=["contextPacking"], timeout=requiredTimeout(budget))
+    return graph
+
+def buildMultiCallAnswerGraph(state: JobApplicationState, llm, tavily, supabase, embeddingConfig, answerStage=None, onStageComplete=None, budget: LatencyBudget = None) -> StageGraph:
+    """
+    Stage graph for one answer. The company search query and both retrieval
+    query variants start speculatively next to the research decision, the
+    losing branch is cancelled once the decision is known. The Tavily search
+    itself waits for the decision, and nothing is speculated when the local
+    classifier or semantic cache already said research is not needed.
+    `answerStage` replaces the final LLM call (used by the streaming
+    endpoint). With a `budget`, the decision, research and query rewrites fall
+    back to no research and the raw text when they run out of time.
+    """
+    researchNeeded = lambda decision: decision
+    researchNotNeeded = lambda decision: not decision
+    multiQuery = multiQueryEnabled()
+
+    async def embedQuestion(results):
+        # Lets the classifier and semantic caches answer the decision and query rewrite without an LLM call
+        if not (semanticCacheEnabled() or researchClassifierEnabled()):
+            return None
+        try:
+            return await queryEmbedder(state["question"], embeddingConfig)
+        except Exception as e:
+            # Only the caches need it, without it the decision and rewrite go to the LLM
+            logger.warning(f"Question embedding failed, skipping semantic cache: {type(e).__name__}: {e}")
+            return None
+
+    def searchQuery(results):
+        return results["jobQuery"] if results["decision"] else results["questionQuery"]
+
+    async def decideLocally(results):
+        return localResearchDecision(state, results["questionEmbedding"])
+
+    async def decide(results):
+        if results["localDecision"] is not None:
+            return results["localDecision"]
+        return await companyResearchDecision(state, llm, results["questionEmbedding"], checkLocal=False)
+
+    async def researchQuery(results):
+        # The speculative part of research: the cache lookup and the LLM search query, never the paid search
+        if results["localDecision"] is False:
+            return None
+        return await prepareCompanyResearch(state, llm)
+
+    async def research(results):
+        cachedResearch, companyQuery = results["researchQuery"]
+        if cachedResearch is not None:
+            state["collectedCompanyData"] = cachedResearch
+            return cachedResearch
+        return await searchCompany(state, tavily, companyQuery)
+
+    async def jobQuery(results):
+        if results["localDecision"] is False:
+            return None
+        return await convertJobDatatoQuery(state, llm, multiQuery)
+
+    async def questionQuery(results):
+        if results["localDecision"] is True:
+            return None
+        return await queryoptimizer(state["question"], llm, results["questionEmbedding"], multiQuery)
+
+    async def embedQuery(results):
+        if multiQuery:
+            # All sub-queries go to Voyage in one call
+            return await queryBatchEmbedder(searchQuery(results), embeddingConfig)
+        return await queryEmbedder(searchQuery(results), embeddingConfig)
+
+    async def retrieve(results):
+        if multiQuery:
+            await searchUserProfileMulti(results["queryEmbedding"], searchQuery(results), state["email"], supabase, state, 4, state.get("retrievalMode"))
+        else:
+            await searchUserProfile(results["queryEmbedding"], state["email"], supabase, state, 4, searchQuery(results), state.get("retrievalMode"))
+        logger.info(state["retrievedUserData"])
+
+    async def answer(results):
+        logger.info(state["collectedCompanyData"])
+        await createFinalResponse(state, llm)
+
+    async def packStage(results):
+        return packAnswerContext(state)["packedContext"]
+
+    graph = StageGraph("answer", onStageComplete)
+    graph.addStage("questionEmbedding", embedQuestion, timeout=optionalTimeout(budget, "questionEmbedding"), fallback=lambda results: None)
+    graph.addStage("localDecision", decideLocally, deps=["questionEmbedding"])
+    graph.addStage("decision", decide, deps=["localDecision"], timeout=optionalTimeout(budget, "decision"), fallback=lambda results: results["localDecision"] or False)
+    graph.addStage("researchQuery", researchQuery, deps=["localDecision"], gate="decision", when=researchNeeded, timeout=optionalTimeout(budget, "researchQuery"), fallback=lambda results: (None, rawCompanySearchQuery(state)))
+    # Depends on the decision as well as gating on it, so the search never starts speculatively
+    graph.addStage("research", research, deps=["decision", "researchQuery"], gate="decision", when=researchNeeded, timeout=optionalTimeout(budget, "research"), fallback=lambda results: None)
+    graph.addStage("jobQuery", jobQuery, deps=["localDecision"], gate="decision", when=researchNeeded, timeout=optionalTimeout(budget, "jobQuery"), fallback=lambda results: rawJobQuery(state, multiQuery))
+    graph.addStage("questionQuery", questionQuery, deps=["localDecision"], gate="decision", when=researchNotNeeded, timeout=optionalTimeout(budget, "questionQuery"), fallback=lambda results: rawQuery(state["question"], multiQuery))
+    graph.addStage("queryEmbedding", embedQuery, deps=["decision", "jobQuery", "questionQuery"], timeout=requiredTimeout(budget))
+    graph.addStage("retrieval", retrieve, deps=["queryEmbedding"], timeout=requiredTimeout(budget))
+    graph.addStage("contextPacking", packStage, deps=["retrieval", "research"])
+    graph.addStage("answer", answerStage or answer, deps=["contextPacking"], timeout=requiredTimeout(budget))
+    return graph
+
+def newAnswerState(data) -> JobApplicationState:
+    return {
         "jobTitle": data.get("jobTitle"),
         "companyName": data.get("companyName"),
         "question": data.get("question"),
@@ -473,50 +1012,287 @@ async def generateAnswer(data):
         "jobdescriptionData": data.get("jobDescription"),
         "companyResearchDecision": False,
         "retrievedUserData": [],
-        "finalResponse": ""
+        "packedContext": None,
+        "finalResponse": "",
+        "retrievalMode": data.get("retrievalMode"),
     }
 
-    if not all([state["email"], state["jobTitle"], state["companyName"], state["question"], state["jobdescriptionData"]]):
+def hasRequiredFields(state: JobApplicationState) -> bool:
+    return all([state["email"], state["jobTitle"], state["companyName"], state["question"], state["jobdescriptionData"]])
+
+# Request fields that identify a duplicate /job/answer call
+ANSWER_REQUEST_FIELDS = ["email", "jobTitle", "companyName", "question", "jobDescription", "retrievalMode"]
+
+def answerRequestKey(data) -> str:
+    fields = {field: data.get(field) for field in ANSWER_REQUEST_FIELDS}
+    return hashlib.sha256(json.dumps(fields, sort_keys=True).encode("utf-8")).hexdigest()
+
+async def generateAnswer(data, session: JobSession = None):
+    state = newAnswerState(data)
+
+    if not hasRequiredFields(state):
         logger.error("Missing required field")
         return JSONResponse(
             content={"error": "Missing required field(s)"},
             status_code=400
         )
 
+    # Double submits and retries of a running request share its pipeline run
+    content, status = await getAnswerFlight().do(answerRequestKey(data), lambda: runAnswer(state, session))
+    headers = {"Retry-After": str(content["retryAfter"])} if status == 429 else None
+    return JSONResponse(content=content, status_code=status, headers=headers)
+
+async def runAnswer(state: JobApplicationState, session: JobSession = None) -> tuple[dict, int]:
+    """Runs the answer pipeline, returning the response body and status code"""
     try:
-        llm = getLLM(state["email"])
-        tavily = getTavilyClient(state["email"])
-        supabase = getSupabaseClient()
-        embeddingConfig = getEmbeddingConfig()
-        # Step 1: Determine if company research is needed
-        await companyResearchDecision(state, llm)
-        print(state)
-        searchQuery = ""
-        if state["companyResearchDecision"]:
-            await companyResearch(state, tavily, llm)
-            searchQuery = await convertJobDatatoQuery(state, llm)
-        else:
-            searchQuery = await queryoptimizer(state["question"], llm)
-
-        searchQueryEmbedding = await queryEmbedder(searchQuery, embeddingConfig)
-        await searchUserProfile(
-            searchQueryEmbedding,
-            state["email"],  # or wherever you get the email
-            supabase,
-            state,
-            4  
+        llm = await getLLM(state["email"])
+        tavily = await getTavilyClient(state["email"])
+        supabase = await getAsyncSupabaseClient()
+        embeddingConfig = getAsyncEmbeddingConfig()
+        graph = buildAnswerGraph(state, llm, tavily, supabase, embeddingConfig, budget=newLatencyBudget(), session=session)
+        await graph.run()
+
+        return {
+            "message": "Answer generation pipeline executed successfully.",
+            "finalResponse": state["finalResponse"],
+            "degradations": answerDegradations(graph)}, 200
+    except asyncio.TimeoutError as e:
+        logger.error(f"Answer generation ran past its latency budget: {e}")
+        return {"error": "Answer generation timed out."}, 504
+    except Exception as e:
+        if isRateLimitError(e):
+            return rateLimitedAnswer(state, e)
+        logger.error(f"Unexpected error during answer generation: {e}", exc_info=True)
+        return {"error": "An unexpected error occurred while processing your request."}, 500
+
+def rateLimitedAnswer(state: JobApplicationState, error: Exception) -> tuple[dict, int]:
+    """429 body for an answer that ran into the user's provider quota"""
+    if not isinstance(error, RateLimitedError):
+        # Gemini still answered 429 after its client's own retries
+        getScheduler("gemini").backoff(state["email"])
+        error = RateLimitedError("gemini", RATE_LIMIT_BACKOFF_SECONDS)
+    logger.warning(f"Answer generation rate limited for {state['email']}: {error}")
+    return {"error": "Rate limit reached for your API key, retry later.", "retryAfter": math.ceil(error.retryAfter)}, 429
+
+def serverSentEvent(event: str, data: dict) -> str:
+    return f"event: {event}\ndata: {json.dumps(data)}\n\n"
+
+def stageEvent(name: str, result, skipped: bool, degraded: bool = False) -> dict:
+    event = {"stage": name, "status": "skipped" if skipped else "degraded" if degraded else "completed"}
+    if name == "decision" and not skipped:
+        event["companyResearchDecision"] = result
+    if name == "plan" and not skipped:
+        event["companyResearchDecision"] = result.companyResearchDecision
+    return event
+
+async def generateAnswerStream(data, session: JobSession = None):
+    """
+    Same pipeline as generateAnswer, reported as Server-Sent Events: a `stage`
+    event as each stage settles, `token` events for the final answer, then
+    `done` with the full response (or `error`).
+    """
+    state = newAnswerState(data)
+
+    if not hasRequiredFields(state):
+        logger.error("Missing required field")
+        return JSONResponse(
+            content={"error": "Missing required field(s)"},
+            status_code=400
         )
-        logger.info(state["retrievedUserData"])
-        logger.info(state["collectedCompanyData"])
-        await createFinalResponse(state, llm)
+
+    try:
+        llm = await getLLM(state["email"])
+        tavily = await getTavilyClient(state["email"])
+        supabase = await getAsyncSupabaseClient()
+        embeddingConfig = getAsyncEmbeddingConfig()
+    except Exception as e:
+        logger.error(f"Unexpected error during answer generation: {e}", exc_info=True)
+        return JSONResponse(
+            content={
+                "error": "An unexpected error occurred while processing your request.",
+            },
+            status_code=500
+        )
+
+    events = asyncio.Queue()
+
+    async def streamAnswer(results):
+        async for token in streamFinalResponse(state, llm):
+            events.put_nowait(serverSentEvent("token", {"text": token}))
+
+    def onStageComplete(name, result, skipped):
+        if name != "answer":
+            events.put_nowait(serverSentEvent("stage", stageEvent(name, result, skipped, name in graph.degraded)))
+
+    graph = buildAnswerGraph(state, llm, tavily, supabase, embeddingConfig, streamAnswer, onStageComplete, budget=newLatencyBudget(), session=session)
+
+    async def eventStream():
+        pipeline = asyncio.create_task(graph.run())
+        pipeline.add_done_callback(lambda task: events.put_nowait(None))
+        try:
+            while True:
+                event = await events.get()
+                if event is None:
+                    break
+                yield event
+
+            if isinstance(pipeline.exception(), asyncio.TimeoutError):
+                logger.error(f"Answer generation ran past its latency budget: {pipeline.exception()}")
+                yield serverSentEvent("error", {"error": "Answer generation timed out."})
+            elif pipeline.exception() is not None and isRateLimitError(pipeline.exception()):
+                yield serverSentEvent("error", rateLimitedAnswer(state, pipeline.exception())[0])
+            elif pipeline.exception() is not None:
+                logger.error(f"Unexpected error during answer generation: {pipeline.exception()}", exc_info=pipeline.exception())
+                yield serverSentEvent("error", {"error": "An unexpected error occurred while processing your request."})
+            else:
+                yield serverSentEvent("done", {"finalResponse": state["finalResponse"], "degradations": answerDegradations(graph)})
+        finally:
+            # Client went away mid-stream, stop paying for upstream calls
+            if not pipeline.done():
+                pipeline.cancel()
+
+    return StreamingResponse(eventStream(), media_type="text/event-stream", headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"})
+
+def buildBatchAnswerGraph(states: list[JobApplicationState], llm, tavily, supabase, embeddingConfig) -> StageGraph:
+    """
+    Stage graph for several questions about one job. Company research and the
+    job-description query run once and are shared, all retrieval queries are
+    embedded in a single Voyage call and the answers are generated concurrently.
+    As for a single answer, only the company search query is speculated, the
+    Tavily search waits until some question needs research.
+    """
+    shared = states[0]
+    anyResearchNeeded = lambda decisions: any(decisions)
+    multiQuery = multiQueryEnabled()
+
+    async def embedQuestions(results):
+        if not (semanticCacheEnabled() or researchClassifierEnabled()):
+            return [None] * len(states)
+        try:
+            return await queryBatchEmbedder([state["question"] for state in states], embeddingConfig)
+        except Exception as e:
+            logger.warning(f"Question embeddings failed, skipping semantic cache: {type(e).__name__}: {e}")
+            return [None] * len(states)
+
+    async def decideLocally(results):
+        return [localResearchDecision(state, embedding) for state, embedding in zip(states, results["questionEmbeddings"])]
+
+    async def decide(results):
+        async def decisionFor(state, localDecision, embedding):
+            if localDecision is not None:
+                return localDecision
+            return await companyResearchDecision(state, llm, embedding, checkLocal=False)
+        return await asyncio.gather(*(decisionFor(state, localDecision, embedding) for state, localDecision, embedding in zip(states, results["localDecisions"], results["questionEmbeddings"])))
+
+    def noResearchKnown(results):
+        # Every question was already decided locally against research, nothing to speculate on
+        return not any(decision is not False for decision in results["localDecisions"])
+
+    async def researchQuery(results):
+        if noResearchKnown(results):
+            return None
+        return await prepareCompanyResearch(shared, llm)
+
+    async def research(results):
+        cachedResearch, companyQuery = results["researchQuery"]
+        if cachedResearch is not None:
+            return cachedResearch
+        return await searchCompany(shared, tavily, companyQuery)
+
+    async def jobQuery(results):
+        if noResearchKnown(results):
+            return None
+        return await convertJobDatatoQuery(shared, llm, multiQuery)
+
+    async def questionQueries(results):
+        # Research questions reuse the shared job-description query
+        async def queryFor(state, decision, embedding):
+            if decision:
+                return None
+            return await queryoptimizer(state["question"], llm, embedding, multiQuery)
+        return await asyncio.gather(*(queryFor(state, decision, embedding) for state, decision, embedding in zip(states, results["decisions"], results["questionEmbeddings"])))
+
+    async def embedQueries(results):
+        # One list of (sub-)queries per question, every distinct query embedded in one Voyage call
+        queries = [results["jobQuery"] if decision else query for decision, query in zip(results["decisions"], results["questionQueries"])]
+        queries = [query if multiQuery else [query] for query in queries]
+        uniqueQueries = list(dict.fromkeys(query for questionQueries in queries for query in questionQueries))
+        embeddings = await queryBatchEmbedder(uniqueQueries, embeddingConfig)
+        return queries, dict(zip(uniqueQueries, embeddings))
+
+    async def retrieve(results):
+        queries, embeddingsByQuery = results["queryEmbeddings"]
+        uniqueQueries = list(embeddingsByQuery)
+        matches = await asyncio.gather(*(searchUserProfile(embeddingsByQuery[query], shared["email"], supabase, None, 4, query, shared.get("retrievalMode")) for query in uniqueQueries))
+        matchesByQuery = dict(zip(uniqueQueries, matches))
+        for state, questionQueries in zip(states, queries):
+            state["retrievedUserData"] = mergeRankings([matchesByQuery[query] for query in questionQueries], 4)
+
+    async def answer(results):
+        for state in states:
+            state["collectedCompanyData"] = results["research"] or ""
+            packAnswerContext(state)
+        await asyncio.gather(*(createFinalResponse(state, llm) for state in states))
+
+    graph = StageGraph("answerBatch")
+    graph.addStage("questionEmbeddings", embedQuestions)
+    graph.addStage("localDecisions", decideLocally, deps=["questionEmbeddings"])
+    graph.addStage("decisions", decide, deps=["localDecisions"])
+    graph.addStage("researchQuery", researchQuery, deps=["localDecisions"], gate="decisions", when=anyResearchNeeded)
+    graph.addStage("research", research, deps=["decisions", "researchQuery"], gate="decisions", when=anyResearchNeeded)
+    graph.addStage("jobQuery", jobQuery, deps=["localDecisions"], gate="decisions", when=anyResearchNeeded)
+    graph.addStage("questionQueries", questionQueries, deps=["decisions"])
+    graph.addStage("queryEmbeddings", embedQueries, deps=["jobQuery", "questionQueries"])
+    graph.addStage("retrieval", retrieve, deps=["queryEmbeddings"])
+    graph.addStage("answer", answer, deps=["retrieval", "research"])
+    return graph
+
+def maxBatchQuestions() -> int:
+    """
+    Most questions per /job/answers whose worst-case LLM calls a user with an
+    unused Gemini quota can make without the scheduler refusing any of them.
+    """
+    capacity = getScheduler("gemini").capacity()
+    return max(1, min(MAX_BATCH_QUESTIONS, (capacity - BATCH_SHARED_LLM_CALLS) // BATCH_LLM_CALLS_PER_QUESTION))
+
+async def generateAnswers(data):
+    questions = [question for question in (data.get("questions") or []) if question and question.strip()]
+    states = [newAnswerState({**data, "question": question}) for question in questions]
+
+    if not states or not all(hasRequiredFields(state) for state in states):
+        logger.error("Missing required field")
+        return JSONResponse(
+            content={"error": "Missing required field(s)"},
+            status_code=400
+        )
+    maxQuestions = maxBatchQuestions()
+    if len(states) > maxQuestions:
+        return JSONResponse(
+            content={"error": f"At most {maxQuestions} questions per request", "maxQuestions": maxQuestions},
+            status_code=400
+        )
+
+    try:
+        email = states[0]["email"]
+        llm = await getLLM(email)
+        tavily = await getTavilyClient(email)
+        supabase = await getAsyncSupabaseClient()
+        embeddingConfig = getAsyncEmbeddingConfig()
+        await buildBatchAnswerGraph(states, llm, tavily, supabase, embeddingConfig).run()
 
         return JSONResponse(
             content={
                 "message": "Answer generation pipeline executed successfully.",
-                "finalResponse": state["finalResponse"]}, 
+                "answers": [
+                    {"question": state["question"], "finalResponse": state["finalResponse"]}
+                    for state in states
+                ]},
             status_code=200)
     except Exception as e:
-        logger.error(f"Unexpected error during answer generation: {e}", exc_info=True)
+        if isRateLimitError(e):
+            content, status = rateLimitedAnswer(states[0], e)
+            return JSONResponse(content=content, status_code=status, headers={"Retry-After": str(content["retryAfter"])})
+        logger.error(f"Unexpected error during batch answer generation: {e}", exc_info=True)
         return JSONResponse(
             content={
                 "error": "An unexpected error occurred while processing your request.",
@@ -524,8 +1300,132 @@ async def generateAnswer(data):
             status_code=500
         )
 
+JOB_REQUIREMENTS_PROMPT = ChatPromptTemplate.from_messages([
+    ("system",
+        """
+            You extract what a job posting asks for, so it can be reused for every application question
+            about the job without re-reading the whole posting.
+
+            Rules:
+            - Keep the posting's own terminology for technologies, tools, domains and methodologies
+            - One short phrase per list item, no duplicates across lists
+            - Leave out benefits, perks, compensation, equal-opportunity and legal text
+            - Only include what the posting states, never infer or invent requirements
+        """
+    ),
+    ("user",
+        """
+            Job Title: {job_title}
+
+            Company Name: {company_name}
+
+            Job Description: {job_description}
+        """
+    )
+])
+
+def renderRequirements(requirements: JobRequirements) -> str:
+    """Extracted requirements as compact text for the final answer prompt"""
+    sections = [requirements.summary]
+    for title, items in [
+        ("Responsibilities", requirements.responsibilities),
+        ("Required qualifications", requirements.required_qualifications),
+        ("Preferred qualifications", requirements.preferred_qualifications),
+        ("Values", requirements.values),
+    ]:
+        if items:
+            sections.append(f"{title}:\n" + "\n".join(f"- {item}" for item in items))
+    return "\n\n".join(sections)
+
+async def extractJobRequirements(state: JobApplicationState, model) -> JobRequirements:
+    with timed("llm.jobRequirements"):
+        return await structuredModel(model, JobRequirements).ainvoke(JOB_REQUIREMENTS_PROMPT.invoke({
+            "job_title": state["jobTitle"],
+            "company_name": state["companyName"],
+            "job_description": state["jobdescriptionData"],
+        }))
+
+async def precomputeJobSession(session: JobSession, llm, tavily, embeddingConfig):
+    """
+    Runs the per-posting work once: requirement extraction, company research
+    and the job-derived retrieval query with its embedding. The parts run
+    concurrently and fail independently.
+    """
+    state = newAnswerState({**session.jobData(), "question": ""})
+    multiQuery = multiQueryEnabled()
+
+    async def requirements():
+        session.requirements = await extractJobRequirements(state, llm)
+
+    async def research():
+        session.companyData = await companyResearch(state, tavily, llm)
+        if session.companyData is None:
+            session.errors["research"] = "Company research returned no answer"
+
+    async def jobQuery():
+        query = await convertJobDatatoQuery(state, llm, multiQuery)
+        embedder = queryBatchEmbedder if multiQuery else queryEmbedder
+        session.jobQueryEmbedding = await embedder(query, embeddingConfig)
+        session.jobQuery = query
+
+    parts = {"requirements": requirements(), "research": research(), "jobQuery": jobQuery()}
+    results = await asyncio.gather(*parts.values(), return_exceptions=True)
+    for name, result in zip(parts, results):
+        if isinstance(result, Exception):
+            session.errors[name] = str(result)
+            logger.error(f"Job session {session.sessionId} could not precompute {name}: {result}")
+
+def sessionNotFound() -> JSONResponse:
+    return JSONResponse(
+        content={"error": "Job session not found or expired"},
+        status_code=404
+    )
+
+async def createJobSession(data):
+    if not all([data.get("email"), data.get("jobTitle"), data.get("companyName"), data.get("jobDescription")]):
+        logger.error("Missing required field")
+        return JSONResponse(
+            content={"error": "Missing required field(s)"},
+            status_code=400
+        )
 
+    try:
+        llm = await getLLM(data["email"])
+        tavily = await getTavilyClient(data["email"])
+        embeddingConfig = getAsyncEmbeddingConfig()
+    except Exception as e:
+        logger.error(f"Unexpected error while creating job session: {e}", exc_info=True)
+        return JSONResponse(
+            content={
+                "error": "An unexpected error occurred while processing your request.",
+            },
+            status_code=500
+        )
 
+    session = JobSession(data["email"], data["jobTitle"], data["companyName"], data["jobDescription"], data.get("retrievalMode"))
+    getJobSessionStore().create(session, lambda session: precomputeJobSession(session, llm, tavily, embeddingConfig))
+    return JSONResponse(
+        content={
+            "message": "Job session created, the posting is being analyzed.",
+            "sessionId": session.sessionId,
+            "status": "pending"},
+        status_code=202
+    )
 
+async def getJobSessionStatus(sessionId: str, email: str):
+    session = getJobSessionStore().get(sessionId, email)
+    if session is None:
+        return sessionNotFound()
+    return JSONResponse(content=session.status(), status_code=200)
 
+async def generateSessionAnswer(sessionId: str, data):
+    session = getJobSessionStore().get(sessionId, data.get("email"))
+    if session is None:
+        return sessionNotFound()
+    return await generateAnswer({**session.jobData(), "question": data.get("question")}, session)
 
+async def generateSessionAnswerStream(sessionId: str, data):
+    session = getJobSessionStore().get(sessionId, data.get("email"))
+    if session is None:
+        return sessionNotFound()
+    return await generateAnswerStream({**session.jobData(), "question": data.get("question")}, session)
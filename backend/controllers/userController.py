@@ -1,18 +1,26 @@
 import os
+import io
 import logging
 from langchain_google_genai import ChatGoogleGenerativeAI    
 from langchain_tavily import TavilySearch
+from fastapi import UploadFile
 from fastapi.responses import JSONResponse
 import requests.exceptions
-from services.dependencies import getLLM, getSupabaseClient, uploadResume, uploadText, uploadJson, getEmbeddingConfig, getResume, getLinkedInText, deleteFile, deleteResume, downloadJson
+from services.dependencies import getLLM, invalidateUserClients, getSupabaseClient, getEmbeddingConfig, getResume, getLinkedInText, deleteResume, downloadJson
 from services.encryption import encryptKey
 from services.userDataProcessor import ProcessUserData
+from services.metrics import timed
+from services.ingestJobs import IngestJob, IngestFull, getIngestJobPool, runBranches
+from services.ingestArtifacts import ArtifactWriter, ARTIFACTS, RESUME_ARTIFACTS, LINKEDIN_ARTIFACTS, MERGED_ARTIFACTS, artifactPath
 from dotenv import load_dotenv
 
 load_dotenv()
 
 logger = logging.getLogger(__name__)
 
+# Steps of a /user/userdata ingest, reported by GET /user/jobs/{jobId}
+INGEST_USERDATA_STAGES = ["extractResume", "chunkResume", "chunkLinkedin", "filterChunks", "mergeDuplicates", "embed", "saveArtifacts"]
+
 
 
 
@@ -27,7 +35,8 @@ async def initializeAPIkeys(data):
     # Validate Gemini API key
     try:
         llm = ChatGoogleGenerativeAI(model="gemini-2.5-flash-lite", api_key=gemini_key)
-        response = llm.invoke("Hello Gemini!")
+        with timed("llm.validateKey"):
+            response = llm.invoke("Hello Gemini!")
     except (requests.exceptions.ConnectionError, requests.exceptions.Timeout) as e:
         print(f"There was an error connecting to Gemini API: {e}")
         return JSONResponse(
@@ -44,7 +53,8 @@ async def initializeAPIkeys(data):
     # Validate Tavily API key
     try:
         tavily_client = TavilySearch(tavily_api_key=tavily_key)
-        result = tavily_client.invoke("test")
+        with timed("tavily.validateKey"):
+            result = tavily_client.invoke("test")
     except (requests.exceptions.ConnectionError, requests.exceptions.Timeout) as e:
         print(f"There was an error connecting to Tavily API: {e}")
         return JSONResponse(
@@ -74,7 +84,10 @@ async def initializeAPIkeys(data):
         }
         
         # Upsert (insert or update if exists)
-        result = client.table("user_api_keys").upsert(data, on_conflict="user_email").execute()
+        with timed("supabase.saveApiKeys"):
+            result = client.table("user_api_keys").upsert(data, on_conflict="user_email").execute()
+        # Later requests must use the new keys, not the cached clients
+        await invalidateUserClients(email)
         
         return JSONResponse(
             status_code=200,
@@ -89,6 +102,36 @@ async def initializeAPIkeys(data):
     
 
 
+async def bufferedUpload(upload: UploadFile) -> UploadFile:
+    """In-memory copy of an upload, the request's own file is closed once the response is sent"""
+    return UploadFile(io.BytesIO(await upload.read()), filename=upload.filename, headers=upload.headers)
+
+def submitIngest(email: str, kind: str, stages: list[str], run) -> JSONResponse:
+    """Queues an ingest job and answers 202 with its id, see GET /user/jobs/{jobId}"""
+    pool = getIngestJobPool()
+    activeJob = pool.active(email)
+    if activeJob is not None:
+        return JSONResponse(
+            status_code=409,
+            content={"error": "Your profile is already being processed", "jobId": activeJob.jobId}
+        )
+    try:
+        job = pool.submit(IngestJob(email, kind, stages), run)
+    except IngestFull as e:
+        logger.warning(f"Rejected {kind} ingest for {email}: {e}")
+        return JSONResponse(
+            status_code=503,
+            content={"error": "Too many profiles are being processed, try again shortly"}
+        )
+    return JSONResponse(
+        status_code=202,
+        content={
+            "message": "User data accepted for processing",
+            "jobId": job.jobId,
+            "status": job.status,
+        }
+    )
+
 async def processUserData(linkedinText, resume, email):
     if not linkedinText or not linkedinText.strip() or not resume or not email:
         return JSONResponse(
@@ -105,57 +148,91 @@ async def processUserData(linkedinText, resume, email):
     
     
     try:
-        llm = getLLM(email)
+        llm = await getLLM(email)
+        resume = await bufferedUpload(resume)
+    except ValueError as ve:
+        logger.error(f"Validation error processing user data: {ve}", exc_info=True)
+        return JSONResponse(
+            status_code=400,
+            content={
+                "error": "Validation error processing user data"
+            }
+        )
+    except Exception as e:
+        logger.error(f"Error processing user data for {email}: {type(e).__name__}: {e}", exc_info=True)
+        return JSONResponse(
+            status_code=500,
+            content={
+                "error": "Failed to process user data",
+            }
+        )
+
+    return submitIngest(email, "userdata", INGEST_USERDATA_STAGES, lambda job: ingestUserData(job, linkedinText, resume, email, llm))
+
+async def resumeBranch(job: IngestJob, userDataProcessor, artifacts: ArtifactWriter, resume):
+    """Resume half of /user/userdata: extract, chunk"""
+    job.start("extractResume")
+    resumeText = await userDataProcessor.extractResume(resume)
+    await resume.seek(0)
+    artifacts.resume(resume)
+    artifacts.text("resumeText", resumeText)
+    job.finish("extractResume")
+
+    job.start("chunkResume")
+    resumeChunks = await userDataProcessor.chunkResume(resumeText)
+    artifacts.json("resumeChunks", resumeChunks["chunks"])
+    artifacts.json("resumeSemanticChunks", resumeChunks["semanticChunks"])
+    job.finish("chunkResume")
+    return resumeChunks
+
+async def linkedinBranch(job: IngestJob, userDataProcessor, artifacts: ArtifactWriter, linkedinText):
+    """LinkedIn half of /user/userdata, independent of the resume until filterChunks"""
+    job.start("chunkLinkedin")
+    artifacts.text("linkedinText", linkedinText)
+    linkedinChunks = await userDataProcessor.chunkLinkedin(linkedinText)
+    artifacts.json("linkedinChunks", linkedinChunks["chunks"])
+    artifacts.json("linkedinSemanticChunks", linkedinChunks["semanticChunks"])
+    job.finish("chunkLinkedin")
+    return linkedinChunks
+
+async def ingestUserData(job: IngestJob, linkedinText, resume, email, llm):
+    """Background part of /user/userdata, runs on an ingest worker"""
+    try:
         supabaseClient = getSupabaseClient()
         embeddingConfig = getEmbeddingConfig()
 
 
         userDataProcessor = ProcessUserData(llm, embeddingConfig)
+        # Built here, before the branches' threads read them
         userDataProcessor.resumeExtractor
-        resumeText = await userDataProcessor.extractResume(resume)
-
-        await resume.seek(0)
-        logger.info("Uploading resume to Supabase")
-        await uploadResume(supabaseClient, resume, f"{email}/resume/{resume.filename}")
-        
-        logger.info("Uploading LinkedIn text to Supabase")
-        await uploadText(supabaseClient, linkedinText, f"{email}/linkedin/linkedinData.txt")
-        
-        # Upload extracted text
-        logger.info("Uploading extracted resume text")
-        await uploadText(supabaseClient, resumeText, f"{email}/resume/resumeData.txt")
-
-
         userDataProcessor.resumeChunker
-        resumeChunks = await userDataProcessor.chunkResume(resumeText)
-        await uploadJson(supabaseClient, resumeChunks["chunks"], f"{email}/resume/resumeChunks.json")
-        await uploadJson(supabaseClient, resumeChunks["semanticChunks"], f"{email}/resume/resumeSemanticChunks.json")
-        logger.info("Uploading extracted resume chunks")
-
         userDataProcessor.linkedinChunker
-        linkedinChunks = await userDataProcessor.chunkLinkedin(linkedinText)
-        await uploadJson(supabaseClient, linkedinChunks["chunks"], f"{email}/linkedin/linkedinChunks.json")
-        await uploadJson(supabaseClient, linkedinChunks["semanticChunks"], f"{email}/linkedin/linkedinSemanticChunks.json")
-        logger.info("Uploading extracted LinkedIn chunks")
-       
+
+        artifacts = ArtifactWriter(supabaseClient, email)
+        resumeChunks, linkedinChunks = await runBranches(
+            resumeBranch(job, userDataProcessor, artifacts, resume),
+            linkedinBranch(job, userDataProcessor, artifacts, linkedinText),
+        )
+
         fullUserData = []
 
         allChunks = linkedinChunks["semanticChunks"]["chunks"] + resumeChunks["semanticChunks"]["chunks"]
-        await uploadJson(supabaseClient, allChunks, f"{email}/mergingData/unprocessedUserData.json")
-        logger.info("Uploading unprocessed user data chunks")
+        artifacts.json("unprocessedUserData", allChunks)
 
 
-        processedChunks = userDataProcessor.filterChunks(allChunks)
-        await uploadJson(supabaseClient, processedChunks["validChunks"], f"{email}/mergingData/validChunks.json")
-        await uploadJson(supabaseClient, processedChunks["naCompanyChunks"], f"{email}/mergingData/naCompanyChunks.json")
-        logger.info("Uploading filtered user data chunks")
+        job.advance("filterChunks")
+        with timed("ingest.filterChunks"):
+            processedChunks = userDataProcessor.filterChunks(allChunks)
+        artifacts.json("validChunks", processedChunks["validChunks"])
+        artifacts.json("naCompanyChunks", processedChunks["naCompanyChunks"])
         
         hasValidDuplicates = bool(processedChunks["validChunks"]["similar"])
         hasNaDuplicates = bool(processedChunks["naCompanyChunks"]["similar"])
 
+        job.advance("mergeDuplicates")
         if hasValidDuplicates:
             sortedValidChunks = await userDataProcessor.sortChunks(processedChunks["validChunks"]['unsimilar'])
-            await uploadJson(supabaseClient, sortedValidChunks, f"{email}/mergingData/sortedValidChunks.json")
+            artifacts.json("sortedValidChunks", sortedValidChunks)
             if sortedValidChunks['similar']:
                 processedChunks["validChunks"]['similar'].extend(sortedValidChunks['similar'])
             mergedValidChunks = await userDataProcessor.mergeChunks(processedChunks["validChunks"]['similar'])
@@ -169,7 +246,7 @@ async def processUserData(linkedinText, resume, email):
 
         if hasNaDuplicates:
             sortedNaChunks = await userDataProcessor.sortChunks(processedChunks["naCompanyChunks"]['unsimilar'])
-            await uploadJson(supabaseClient, sortedNaChunks, f"{email}/mergingData/sortedNaChunks.json")
+            artifacts.json("sortedNaChunks", sortedNaChunks)
             if sortedNaChunks['similar']:
                 processedChunks["naCompanyChunks"]['similar'].extend(sortedNaChunks['similar'])
             mergedNaChunks = await userDataProcessor.mergeChunks(processedChunks["naCompanyChunks"]['similar'])
@@ -184,41 +261,22 @@ async def processUserData(linkedinText, resume, email):
             f"User profile construction complete: "
             f"{len(fullUserData)} total chunks "
         )
-        await uploadJson(supabaseClient, fullUserData, f"{email}/fullUserProfile.json")
-        logger.info("Uploading full user profile data")
+        artifacts.json("fullUserProfile", fullUserData)
         
+        job.advance("embed")
         await userDataProcessor.generateEmbeddings(supabaseClient, email, fullUserData)
         logger.info("Generated and stored embeddings for user data")
 
+        job.advance("saveArtifacts")
+        await artifacts.flush(replaced=list(ARTIFACTS))
 
-
-
-        return JSONResponse(
-            status_code=200,
-            content={
-                "message": "User data processed successfully",
-            }
-        )
-        
-    except ValueError as ve:
-        # Validation errors (400 - Bad Request)
-        logger.error(f"Validation error processing user data: {ve}", exc_info=True)
-        return JSONResponse(
-            status_code=400,
-            content={
-                "error": "Validation error processing user data"
-            }
-        )
-    
-    except Exception as e:
-        # All other errors (500 - Internal Server Error)
-        logger.error(f"Error processing user data for {email}: {type(e).__name__}: {e}", exc_info=True)
-        return JSONResponse(
-            status_code=500,
-            content={
-                "error": "Failed to process user data",
-            }
-        )
+    except ValueError:
+        # Validation errors
+        job.error = "Validation error processing user data"
+        raise
+    except Exception:
+        job.error = "Failed to process user data"
+        raise
 
 async def getUserProfile(data):
     email = data.get("email")
@@ -257,86 +315,102 @@ async def updateUserProfile(email, updateLinkedin, updateResume, linkedinText, r
             status_code=400,
             content={"error": "Missing required fields"}
         )
+    if updateLinkedin and not linkedinText:
+        return JSONResponse(
+            status_code=400,
+            content={"error": "Missing LinkedIn text"}
+        )
+    # Validate resume is a PDF
+    if updateResume and (not resume or resume.content_type != "application/pdf"):
+        return JSONResponse(
+            status_code=400,
+            content={"error": "Resume must be a PDF file"}
+        )
+    try:
+        llm = await getLLM(email)
+        if updateResume:
+            resume = await bufferedUpload(resume)
+    except Exception as e:
+        logger.error(f"Error processing user data for {email}: {type(e).__name__}: {e}", exc_info=True)
+        return JSONResponse(
+            status_code=500,
+            content={"error": "Failed to update user profile"}
+        )
+
+    stages = (["chunkLinkedin"] if updateLinkedin else []) + (["extractResume", "chunkResume"] if updateResume else []) + ["filterChunks", "mergeDuplicates", "embed", "saveArtifacts"]
+    return submitIngest(email, "update", stages, lambda job: ingestProfileUpdate(job, email, updateLinkedin, updateResume, linkedinText, resume, llm))
+
+async def updateLinkedinBranch(job: IngestJob, userDataProcessor, artifacts: ArtifactWriter, linkedinText):
+    job.start("chunkLinkedin")
+    artifacts.text("linkedinText", linkedinText)
+    linkedinChunks = await userDataProcessor.chunkLinkedin(linkedinText)
+    artifacts.json("linkedinChunks", linkedinChunks["chunks"])
+    artifacts.json("linkedinSemanticChunks", linkedinChunks["semanticChunks"])
+    job.finish("chunkLinkedin")
+    return linkedinChunks["semanticChunks"]
+
+async def updateResumeBranch(job: IngestJob, userDataProcessor, artifacts: ArtifactWriter, resume):
+    job.start("extractResume")
+    logger.info(f"Updating resume for {artifacts.email}")
+
+    # The new PDF may have another name, so the old one is removed rather than overwritten
+    await deleteResume(artifacts.client, f"{artifacts.email}/resume/", artifacts.email)
+    resumeText = await userDataProcessor.extractResume(resume)
+    await resume.seek(0)
+    artifacts.resume(resume)
+    artifacts.text("resumeText", resumeText)
+    job.finish("extractResume")
+
+    job.start("chunkResume")
+    resumeChunks = await userDataProcessor.chunkResume(resumeText)
+    artifacts.json("resumeChunks", resumeChunks["chunks"])
+    artifacts.json("resumeSemanticChunks", resumeChunks["semanticChunks"])
+    job.finish("chunkResume")
+    return resumeChunks["semanticChunks"]
+
+async def ingestProfileUpdate(job: IngestJob, email, updateLinkedin, updateResume, linkedinText, resume, llm):
+    """Background part of /user/update, runs on an ingest worker"""
     try:
         supabaseClient = getSupabaseClient()
-        llm = getLLM(email)
         embeddingConfig = getEmbeddingConfig()
         userDataProcessor = ProcessUserData(llm, embeddingConfig)
 
-        if updateLinkedin:
-            if not linkedinText:
-                return JSONResponse(
-                    status_code=400,
-                    content={"error": "Missing LinkedIn text"}
-                )
-            await deleteFile(supabaseClient, f"{email}/linkedin/linkedinData.txt")
-            await deleteFile(supabaseClient, f"{email}/linkedin/linkedinChunks.json")
-            await deleteFile(supabaseClient, f"{email}/linkedin/linkedinSemanticChunks.json")
-
-            await uploadText(supabaseClient, linkedinText, f"{email}/linkedin/linkedinData.txt")
-            userDataProcessor.linkedinChunker
-            linkedinChunks = await userDataProcessor.chunkLinkedin(linkedinText)
-            await uploadJson(supabaseClient, linkedinChunks["chunks"], f"{email}/linkedin/linkedinChunks.json")
-            await uploadJson(supabaseClient, linkedinChunks["semanticChunks"], f"{email}/linkedin/linkedinSemanticChunks.json")
-            logger.info("Uploading updated extracted Linkedin chunks")
+        # Built here, before the branches' threads read them
+        userDataProcessor.resumeExtractor
+        userDataProcessor.resumeChunker
+        userDataProcessor.linkedinChunker
 
+        artifacts = ArtifactWriter(supabaseClient, email)
+        branches = {}
+        if updateLinkedin:
+            branches["linkedin"] = updateLinkedinBranch(job, userDataProcessor, artifacts, linkedinText)
         if updateResume:
-            logger.info(f"Updating resume for {email}")
-            
-            # Validate resume is a PDF
-            if resume.content_type != "application/pdf":
-                return JSONResponse(
-                    status_code=400,
-                    content={"error": "Resume must be a PDF file"}
-                )
-            await deleteResume(supabaseClient, f"{email}/resume/", email)
-            await deleteFile(supabaseClient, f"{email}/resume/resumeData.txt")
-            await deleteFile(supabaseClient, f"{email}/resume/resumeChunks.json")
-            await deleteFile(supabaseClient, f"{email}/resume/resumeSemanticChunks.json")
-            userDataProcessor.resumeExtractor
-            resumeText = await userDataProcessor.extractResume(resume)
-
-            await resume.seek(0)
-            logger.info("Uploading updated resume to Supabase")
-            await uploadResume(supabaseClient, resume, f"{email}/resume/{resume.filename}")
-            logger.info("Uploading updated extracted resume text")
-            await uploadText(supabaseClient, resumeText, f"{email}/resume/resumeData.txt")
-
-
-            userDataProcessor.resumeChunker
-            resumeChunks = await userDataProcessor.chunkResume(resumeText)
-            await uploadJson(supabaseClient, resumeChunks["chunks"], f"{email}/resume/resumeChunks.json")
-            await uploadJson(supabaseClient, resumeChunks["semanticChunks"], f"{email}/resume/resumeSemanticChunks.json")
-            logger.info("Uploading extracted resume chunks")
-
-        resumeChunks = await downloadJson(supabaseClient, f"{email}/resume/resumeSemanticChunks.json")
-        linkedinChunks = await downloadJson(supabaseClient, f"{email}/linkedin/linkedinSemanticChunks.json")
-
-        await deleteFile(supabaseClient, f"{email}/mergingData/unprocessedUserData.json")
-        await deleteFile(supabaseClient, f"{email}/mergingData/validChunks.json")
-        await deleteFile(supabaseClient, f"{email}/mergingData/naCompanyChunks.json")
-        await deleteFile(supabaseClient, f"{email}/mergingData/sortedValidChunks.json")
-        await deleteFile(supabaseClient, f"{email}/mergingData/sortedNaChunks.json")
-        await deleteFile(supabaseClient, f"{email}/fullUserProfile.json")
+            branches["resume"] = updateResumeBranch(job, userDataProcessor, artifacts, resume)
+        semanticChunks = dict(zip(branches, await runBranches(*branches.values())))
+
+        # The side that did not change is read back from its last build
+        resumeChunks = semanticChunks.get("resume") or await downloadJson(supabaseClient, artifactPath(email, "resumeSemanticChunks"))
+        linkedinChunks = semanticChunks.get("linkedin") or await downloadJson(supabaseClient, artifactPath(email, "linkedinSemanticChunks"))
 
         fullUserData = []
 
         allChunks = linkedinChunks["chunks"] + resumeChunks["chunks"]
-        await uploadJson(supabaseClient, allChunks, f"{email}/mergingData/unprocessedUserData.json")
-        logger.info("Uploading unprocessed user data chunks")
+        artifacts.json("unprocessedUserData", allChunks)
 
 
-        processedChunks = userDataProcessor.filterChunks(allChunks)
-        await uploadJson(supabaseClient, processedChunks["validChunks"], f"{email}/mergingData/validChunks.json")
-        await uploadJson(supabaseClient, processedChunks["naCompanyChunks"], f"{email}/mergingData/naCompanyChunks.json")
-        logger.info("Uploading filtered user data chunks")
+        job.advance("filterChunks")
+        with timed("ingest.filterChunks"):
+            processedChunks = userDataProcessor.filterChunks(allChunks)
+        artifacts.json("validChunks", processedChunks["validChunks"])
+        artifacts.json("naCompanyChunks", processedChunks["naCompanyChunks"])
         
         hasValidDuplicates = bool(processedChunks["validChunks"]["similar"])
         hasNaDuplicates = bool(processedChunks["naCompanyChunks"]["similar"])
 
+        job.advance("mergeDuplicates")
         if hasValidDuplicates:
             sortedValidChunks = await userDataProcessor.sortChunks(processedChunks["validChunks"]['unsimilar'])
-            await uploadJson(supabaseClient, sortedValidChunks, f"{email}/mergingData/sortedValidChunks.json")
+            artifacts.json("sortedValidChunks", sortedValidChunks)
             if sortedValidChunks['similar']:
                 processedChunks["validChunks"]['similar'].extend(sortedValidChunks['similar'])
             mergedValidChunks = await userDataProcessor.mergeChunks(processedChunks["validChunks"]['similar'])
@@ -350,7 +424,7 @@ async def updateUserProfile(email, updateLinkedin, updateResume, linkedinText, r
 
         if hasNaDuplicates:
             sortedNaChunks = await userDataProcessor.sortChunks(processedChunks["naCompanyChunks"]['unsimilar'])
-            await uploadJson(supabaseClient, sortedNaChunks, f"{email}/mergingData/sortedNaChunks.json")
+            artifacts.json("sortedNaChunks", sortedNaChunks)
             if sortedNaChunks['similar']:
                 processedChunks["naCompanyChunks"]['similar'].extend(sortedNaChunks['similar'])
             mergedNaChunks = await userDataProcessor.mergeChunks(processedChunks["naCompanyChunks"]['similar'])
@@ -365,21 +439,23 @@ async def updateUserProfile(email, updateLinkedin, updateResume, linkedinText, r
             f"User profile construction complete: "
             f"{len(fullUserData)} total chunks "
         )
-        await uploadJson(supabaseClient, fullUserData, f"{email}/fullUserProfile.json")
-        logger.info("Uploading full user profile data")
+        artifacts.json("fullUserProfile", fullUserData)
+        job.advance("embed")
         await userDataProcessor.generateEmbeddings(supabaseClient, email, fullUserData)
         logger.info("Generated and stored embeddings for user data")
 
-        return JSONResponse(
-            status_code=200,
-            content={"message": "User profile updated successfully"}
-        )
+        job.advance("saveArtifacts")
+        await artifacts.flush(replaced=MERGED_ARTIFACTS + (LINKEDIN_ARTIFACTS if updateLinkedin else []) + (RESUME_ARTIFACTS if updateResume else []))
 
-    except Exception as e:
-        logger.error(f"Error processing user data for {email}: {type(e).__name__}: {e}", exc_info=True)
+    except Exception:
+        job.error = "Failed to update user profile"
+        raise
+
+async def getIngestJob(jobId: str, email: str):
+    job = getIngestJobPool().get(jobId, email)
+    if job is None:
         return JSONResponse(
-            status_code=500,
-            content={"error": "Failed to update user profile"}
+            status_code=404,
+            content={"error": "Job not found or expired"}
         )
-
-    
+    return JSONResponse(status_code=200, content=job.toJson())
@@ -1,6 +1,7 @@
-from controllers.jobController import generateAnswer
+from controllers.jobController import generateAnswer, generateAnswerStream, generateAnswers, createJobSession, getJobSessionStatus, generateSessionAnswer, generateSessionAnswerStream
 from fastapi import APIRouter, Form, File, UploadFile
 from pydantic import BaseModel
+from typing import List, Optional
 
 jobRoutes = APIRouter()
 
@@ -11,6 +12,51 @@ class JobDataRequest(BaseModel):
     question: str
     jobDescription: str
     email: str
+    retrievalMode: Optional[str] = None  # "vector" or "hybrid", defaults to RETRIEVAL_MODE
 @jobRoutes.post("/answer")
 async def getJobResponse(data: JobDataRequest):
-    return await generateAnswer(data.model_dump())
\ No newline at end of file
+    return await generateAnswer(data.model_dump())
+
+@jobRoutes.post("/answer/stream")
+async def streamJobResponse(data: JobDataRequest):
+    return await generateAnswerStream(data.model_dump())
+
+class JobBatchRequest(BaseModel):
+    jobTitle: str
+    companyName: str
+    questions: List[str]
+    jobDescription: str
+    email: str
+    retrievalMode: Optional[str] = None
+
+@jobRoutes.post("/answers")
+async def getJobResponses(data: JobBatchRequest):
+    return await generateAnswers(data.model_dump())
+
+
+class JobSessionRequest(BaseModel):
+    jobTitle: str
+    companyName: str
+    jobDescription: str
+    email: str
+    retrievalMode: Optional[str] = None
+
+@jobRoutes.post("/session")
+async def startJobSession(data: JobSessionRequest):
+    return await createJobSession(data.model_dump())
+
+@jobRoutes.get("/session/{sessionId}")
+async def jobSessionStatus(sessionId: str, email: str):
+    return await getJobSessionStatus(sessionId, email)
+
+class JobSessionAnswerRequest(BaseModel):
+    question: str
+    email: str
+
+@jobRoutes.post("/session/{sessionId}/answer")
+async def getJobSessionResponse(sessionId: str, data: JobSessionAnswerRequest):
+    return await generateSessionAnswer(sessionId, data.model_dump())
+
+@jobRoutes.post("/session/{sessionId}/answer/stream")
+async def streamJobSessionResponse(sessionId: str, data: JobSessionAnswerRequest):
+    return await generateSessionAnswerStream(sessionId, data.model_dump())
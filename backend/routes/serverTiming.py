@@ -0,0 +1,23 @@
+import time
+from fastapi import Request
+from services.metrics import startRequestTimings, serverTimingHeader, recordStage
+
+def routeTemplate(request: Request) -> str:
+    # Path params folded back into their placeholders to keep the metric label set bounded
+    path = request.url.path
+    for name, value in request.path_params.items():
+        path = path.replace(str(value), "{" + name + "}")
+    return path
+
+async def serverTiming(request: Request, call_next):
+    # Stage timings recorded while handling the request come back as a Server-Timing header.
+    # Streaming responses send headers first, so they only carry what ran before the stream.
+    timings = startRequestTimings()
+    start = time.perf_counter()
+    response = await call_next(request)
+    total = time.perf_counter() - start
+    response.headers["Server-Timing"] = serverTimingHeader(timings, total)
+
+    if request.scope.get("route") is not None:
+        recordStage(f"request.{request.method} {routeTemplate(request)}", total, f"{response.status_code // 100}xx")
+    return response
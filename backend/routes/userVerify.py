@@ -2,18 +2,26 @@ from fastapi import FastAPI, Request
 from fastapi.responses import JSONResponse
 import os
 from dotenv import load_dotenv
-from supabase import create_client, Client
+from supabase import acreate_client, AsyncClient
+from services.metrics import timed
 
 load_dotenv()
 
 # Initialize Supabase client
 SUPABASE_URL = os.getenv("SUPABASE_URL")
 SUPABASE_KEY = os.getenv("SUPABASE_KEY")
-supabase: Client = create_client(SUPABASE_URL, SUPABASE_KEY)
+supabase: AsyncClient = None
+
+async def getAuthClient() -> AsyncClient:
+    # Token checks run on every request, so they must not block the event loop
+    global supabase
+    if supabase is None:
+        supabase = await acreate_client(SUPABASE_URL, SUPABASE_KEY)
+    return supabase
 
 async def verifyUser(request: Request, call_next):
     
-    public_paths = ["/"]
+    public_paths = ["/", "/metrics"]
     if request.url.path in public_paths:
         response = await call_next(request)
         return response
@@ -31,7 +39,9 @@ async def verifyUser(request: Request, call_next):
     
     try:
         # Use Supabase's get_user() to verify the token
-        user = supabase.auth.get_user(token)
+        authClient = await getAuthClient()
+        with timed("supabase.authGetUser"):
+            user = await authClient.auth.get_user(token)
         print(f"User Metadata: {user.user.user_metadata}")
         request.state.user = user
     except Exception as e:
@@ -1,7 +1,7 @@
 from fastapi import APIRouter, Form, File, UploadFile
 from pydantic import BaseModel
 from typing import Optional
-from controllers.userController import initializeAPIkeys, processUserData, getUserProfile, updateUserProfile
+from controllers.userController import initializeAPIkeys, processUserData, getUserProfile, updateUserProfile, getIngestJob
 
 
 userRoutes = APIRouter()
@@ -17,6 +17,11 @@ class APIKeysRequest(BaseModel):
 async def setApiKey(data: APIKeysRequest):
     return await initializeAPIkeys(data.model_dump())
 
+# /userdata and /update answer 202 with a jobId, poll it here
+@userRoutes.get('/jobs/{jobId}')
+async def getJob(jobId: str, email: str):
+    return await getIngestJob(jobId, email)
+
 @userRoutes.post('/userdata')
 async def setUserData(linkedinText: str = Form(...),resume: UploadFile = File(...), email: str = Form(...)):
     return await processUserData(linkedinText, resume, email)
@@ -0,0 +1,124 @@
+import json
+import logging
+import time
+from collections import OrderedDict
+from typing import Any, Hashable, Optional
+
+logger = logging.getLogger(__name__)
+
+# Sentinel so that cached None values still count as hits
+MISSING = object()
+
+
+class TTLCache:
+    """
+    In-process LRU cache with a per-entry time to live and hit/miss counters.
+    A ttl of None keeps entries until they are evicted for space.
+    """
+
+    def __init__(self, maxEntries: int = 1024, ttl: Optional[float] = None, name: str = "cache"):
+        self.maxEntries = maxEntries
+        self.ttl = ttl
+        self.name = name
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self._entries: "OrderedDict[Hashable, tuple[float, Any]]" = OrderedDict()
+
+    def get(self, key: Hashable, default: Any = None) -> Any:
+        entry = self._entries.get(key, MISSING)
+        if entry is not MISSING:
+            expiresAt, value = entry
+            if expiresAt >= time.monotonic():
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return value
+            del self._entries[key]
+        self.misses += 1
+        return default
+
+    def set(self, key: Hashable, value: Any, ttl: Optional[float] = None):
+        ttl = self.ttl if ttl is None else ttl
+        expiresAt = time.monotonic() + ttl if ttl is not None else float("inf")
+        self._entries[key] = (expiresAt, value)
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.maxEntries:
+            self._entries.popitem(last=False)
+            self.evictions += 1
+
+    def delete(self, key: Hashable):
+        self._entries.pop(key, None)
+
+    def clear(self):
+        self._entries.clear()
+
+    def __len__(self):
+        return len(self._entries)
+
+    def stats(self) -> dict:
+        lookups = self.hits + self.misses
+        return {
+            "name": self.name,
+            "size": len(self._entries),
+            "hits": self.hits,
+            "misses": self.misses,
+            "evictions": self.evictions,
+            "hitRate": self.hits / lookups if lookups else 0.0,
+        }
+
+
+class RedisCache:
+    """
+    Shared cache for multi-worker deployments. Values are stored as JSON,
+    expiry is handled by Redis and eviction by its maxmemory policy.
+    """
+
+    def __init__(self, url: str, ttl: Optional[float] = None, name: str = "cache"):
+        # Imported lazily so the in-process default does not need redis installed
+        import redis.asyncio as redis
+
+        self.client = redis.from_url(url)
+        self.ttl = ttl
+        self.name = name
+        self.hits = 0
+        self.misses = 0
+
+    def _key(self, key: str) -> str:
+        return f"answerly:{self.name}:{key}"
+
+    async def get(self, key: str, default: Any = None) -> Any:
+        raw = await self.client.get(self._key(key))
+        if raw is None:
+            self.misses += 1
+            return default
+        self.hits += 1
+        return json.loads(raw)
+
+    async def set(self, key: str, value: Any, ttl: Optional[float] = None):
+        ttl = self.ttl if ttl is None else ttl
+        await self.client.set(self._key(key), json.dumps(value), ex=int(ttl) if ttl else None)
+
+    async def delete(self, key: str):
+        await self.client.delete(self._key(key))
+
+    def stats(self) -> dict:
+        lookups = self.hits + self.misses
+        return {
+            "name": self.name,
+            "hits": self.hits,
+            "misses": self.misses,
+            "hitRate": self.hits / lookups if lookups else 0.0,
+        }
+
+
+class AsyncTTLCache(TTLCache):
+    """TTLCache behind the same awaitable interface as RedisCache, so callers can swap backends"""
+
+    async def get(self, key: Hashable, default: Any = None) -> Any:
+        return TTLCache.get(self, key, default)
+
+    async def set(self, key: Hashable, value: Any, ttl: Optional[float] = None):
+        TTLCache.set(self, key, value, ttl)
+
+    async def delete(self, key: Hashable):
+        TTLCache.delete(self, key)
@@ -0,0 +1,142 @@
+import os
+import re
+import logging
+from dotenv import load_dotenv
+
+load_dotenv()
+
+logger = logging.getLogger(__name__)
+
+# Token budget for the variable parts of the final answer prompt (job
+# description, company data, retrieved chunks). 0 disables packing.
+CONTEXT_TOKEN_BUDGET = int(os.getenv("CONTEXT_TOKEN_BUDGET", "2500"))
+# A chunk whose share would fall below this is dropped rather than cut to a stub
+MIN_CHUNK_TOKENS = int(os.getenv("MIN_CHUNK_TOKENS", "60"))
+
+# Gemini's tokenizer is only reachable through the API, so counts are estimated.
+# ~4 characters per token holds for English prose.
+CHARS_PER_TOKEN = 4
+
+TRUNCATION_MARKER = " ..."
+
+# Sections of a job posting that never help answer an application question
+BOILERPLATE_HEADING = re.compile(
+    r"^\W*(benefits|perks|what we offer|what you.ll get|compensation|salary|pay range|"
+    r"equal (employment )?opportunity|eeo|accommodations?|privacy|applicant privacy)\b",
+    re.IGNORECASE,
+)
+BOILERPLATE_PHRASES = re.compile(
+    r"equal opportunity employer|without regard to|protected veteran|reasonable accommodation|"
+    r"e-verify|401\(k\)|paid time off|pay transparency",
+    re.IGNORECASE,
+)
+HEADING_MAX_CHARS = 60
+
+
+def estimateTokens(text: str) -> int:
+    if not text:
+        return 0
+    return (len(text) + CHARS_PER_TOKEN - 1) // CHARS_PER_TOKEN
+
+
+def truncateToTokens(text: str, tokens: int) -> str:
+    """Cuts text to about `tokens`, at the last sentence or word boundary that fits"""
+    if estimateTokens(text) <= tokens:
+        return text
+    limit = max(tokens * CHARS_PER_TOKEN - len(TRUNCATION_MARKER), 0)
+    cut = text[:limit]
+    sentenceEnd = max(cut.rfind(". "), cut.rfind(".\n"), cut.rfind("\n"))
+    if sentenceEnd > limit // 2:
+        cut = cut[:sentenceEnd + 1]
+    elif " " in cut:
+        cut = cut[:cut.rfind(" ")]
+    return cut.rstrip() + TRUNCATION_MARKER
+
+
+def isHeading(paragraph: str) -> bool:
+    firstLine = paragraph.strip().splitlines()[0] if paragraph.strip() else ""
+    return len(firstLine) <= HEADING_MAX_CHARS and not firstLine.rstrip().endswith(".")
+
+
+def trimBoilerplate(jobDescription: str) -> str:
+    """
+    Drops benefits, compensation, EEO and privacy sections from a job posting.
+    A boilerplate heading removes everything up to the next heading; stray
+    paragraphs are removed when they contain typical legal phrases.
+    """
+    if not jobDescription:
+        return jobDescription
+    kept = []
+    inBoilerplate = False
+    for paragraph in re.split(r"\n\s*\n", jobDescription):
+        if not paragraph.strip():
+            continue
+        if isHeading(paragraph):
+            inBoilerplate = bool(BOILERPLATE_HEADING.match(paragraph.strip()))
+        if inBoilerplate or BOILERPLATE_PHRASES.search(paragraph):
+            continue
+        kept.append(paragraph.strip())
+    return "\n\n".join(kept)
+
+
+def fairShares(needs: list[int], budget: int) -> list[int]:
+    """Splits `budget` so small needs are met in full and the rest share what is left equally"""
+    shares = [0] * len(needs)
+    pending = sorted(range(len(needs)), key=lambda i: needs[i])
+    remaining = budget
+    while pending:
+        share = remaining // len(pending)
+        index = pending.pop(0)
+        shares[index] = min(needs[index], share)
+        remaining -= shares[index]
+    return shares
+
+
+def packChunks(chunks: list[str], budget: int, minChunkTokens: int = MIN_CHUNK_TOKENS) -> list[str]:
+    """
+    Fits retrieved chunks into `budget`. Chunks arrive best first (MMR order),
+    so when they do not all fit the lowest-ranked ones are dropped until every
+    kept chunk gets at least `minChunkTokens`, and long chunks are cut to
+    their fair share.
+    """
+    chunks = [chunk for chunk in chunks if chunk]
+    while chunks:
+        needs = [estimateTokens(chunk) for chunk in chunks]
+        shares = fairShares(needs, budget)
+        if len(chunks) == 1 or all(share >= min(need, minChunkTokens) for share, need in zip(shares, needs)):
+            return [truncateToTokens(chunk, share) for chunk, share in zip(chunks, shares)]
+        chunks = chunks[:-1]
+    return []
+
+
+def packContext(jobDescription: str, companyData: str, userData: list[str], budget: int = None) -> dict:
+    """
+    Fits the final answer context into `budget` tokens (CONTEXT_TOKEN_BUDGET).
+    The job description loses its boilerplate first, then the job description,
+    company data and retrieved chunks share the budget. Pass "" for a part
+    the prompt does not use so it gets no share.
+    """
+    budget = CONTEXT_TOKEN_BUDGET if budget is None else budget
+    userData = list(userData or [])
+    tokensBefore = estimateTokens(jobDescription) + estimateTokens(companyData) + sum(estimateTokens(chunk) for chunk in userData)
+
+    trimmedJobDescription = trimBoilerplate(jobDescription)
+    boilerplateTokens = estimateTokens(jobDescription) - estimateTokens(trimmedJobDescription)
+
+    needs = [estimateTokens(trimmedJobDescription), estimateTokens(companyData), sum(estimateTokens(chunk) for chunk in userData)]
+    jobShare, companyShare, userShare = fairShares(needs, budget)
+    packed = {
+        "jobDescription": truncateToTokens(trimmedJobDescription, jobShare),
+        "companyData": truncateToTokens(companyData, companyShare) if companyData else companyData,
+        "userData": packChunks(userData, userShare),
+    }
+
+    tokensAfter = estimateTokens(packed["jobDescription"]) + estimateTokens(packed["companyData"]) + sum(estimateTokens(chunk) for chunk in packed["userData"])
+    packed["stats"] = {
+        "tokensBefore": tokensBefore,
+        "tokensAfter": tokensAfter,
+        "tokensSaved": tokensBefore - tokensAfter,
+        "boilerplateTokens": boilerplateTokens,
+        "droppedChunks": len(userData) - len(packed["userData"]),
+    }
+    return packed
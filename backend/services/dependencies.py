@@ -1,13 +1,21 @@
 import os
+import uuid
+import asyncio
 from dotenv import load_dotenv
 from langchain_google_genai import ChatGoogleGenerativeAI
 import logging
-from supabase import create_client, Client
+from supabase import create_client, Client, acreate_client, AsyncClient
 import json
-from voyageai import Client as VoyageClient
+from voyageai import Client as VoyageClient, AsyncClient as AsyncVoyageClient
 from langchain_tavily import TavilySearch
 import base64
 from services.encryption import decryptKey
+from services.cache import TTLCache, AsyncTTLCache, RedisCache
+from services.embeddingBatcher import EmbeddingBatcher
+from services.embeddingStore import aembedWithStore
+from services.metrics import timed
+from services.rateLimiter import getScheduler
+from services.runnableRegistry import RunnableRegistry
 
 load_dotenv()
 
@@ -23,12 +31,28 @@ logging.basicConfig(
 logger = logging.getLogger(__name__)  # ← ADD THIS LINE
 
 # Global instances (singleton pattern)
-_llm = None
 _embeddingconfig = None
+_asyncEmbeddingConfig = None
 _supabaseClient = None
-_tavilyClient = None
+_asyncSupabaseClient = None
+_queryBatcher = None
 bucketName = 'answerlyData'
 
+QUERY_EMBEDDING_MODEL = "voyage-3.5"
+QUERY_EMBEDDING_DIMENSION = 1024
+_queryEmbeddingCache = TTLCache(maxEntries=int(os.getenv("QUERY_EMBEDDING_CACHE_SIZE", "2048")), name="queryEmbeddings")
+
+# Each user's LLM and Tavily client, built from their own keys. Warm requests
+# skip the user_api_keys query and the decrypt; initializeAPIkeys invalidates
+# them through the user's key generation (see getUserClientGenerations).
+_userClients = TTLCache(
+    maxEntries=int(os.getenv("USER_CLIENT_CACHE_SIZE", "1000")),
+    ttl=float(os.getenv("USER_CLIENT_TTL_SECONDS", "900")),
+    name="userClients",
+)
+_userClientBuilds = {}
+_userClientGenerations = None
+
 def getSupabaseClient():
     global _supabaseClient
     if _supabaseClient is None:
@@ -43,14 +67,30 @@ def getSupabaseClient():
     
     return _supabaseClient
 
+async def getAsyncSupabaseClient():
+    """Returns a shared Supabase client whose queries can be awaited on the event loop"""
+    global _asyncSupabaseClient
+    if _asyncSupabaseClient is None:
+        sUrl = os.getenv("SUPABASE_URL")
+        sApiKey = os.getenv("SUPABASE_SERVICE_ROLE_KEY")
+
+        if not sUrl or not sApiKey:
+            raise ValueError("Missing SUPABASE_URL or SUPABASE_SERVICE_ROLE_KEY in .env file")
+
+        _asyncSupabaseClient = await acreate_client(sUrl, sApiKey)
+        logger.info("Async Supabase client initialized")
+
+    return _asyncSupabaseClient
+
 async def uploadResume(client, resume, filePath):
     try:
         fileBytes= await resume.read() 
-        upload = client.storage.from_(bucketName).upload(
-            filePath,
-            fileBytes,
-            {"content-type": "application/pdf"},
-        )
+        with timed("storage.upload"):
+            upload = client.storage.from_(bucketName).upload(
+                filePath,
+                fileBytes,
+                {"content-type": "application/pdf", "upsert": "true"},
+            )
         
         logger.info(f"Resume uploaded successfully to {bucketName}/{filePath}")
         
@@ -61,11 +101,12 @@ async def uploadResume(client, resume, filePath):
 async def uploadText(client, text, filePath):
     try:
         textBytes = text.encode('utf-8')
-        upload = client.storage.from_(bucketName).upload(
-            filePath,
-            textBytes,
-            {"content-type": "text/plain"},
-        )
+        with timed("storage.upload"):
+            upload = client.storage.from_(bucketName).upload(
+                filePath,
+                textBytes,
+                {"content-type": "text/plain", "upsert": "true"},
+            )
         logger.info(f"Text file uploaded successfully to {bucketName}/{filePath}")
     except Exception as e:
         logger.error(f"Unexpected error while uploading text file: {e}")
@@ -74,11 +115,12 @@ async def uploadText(client, text, filePath):
 async def uploadJson(client, data, filePath):
     try:
         jsonBytes = json.dumps(data, indent=2).encode('utf-8')
-        upload = client.storage.from_(bucketName).upload(
-            filePath,
-            jsonBytes,
-            {"content-type": "application/json"},
-        )
+        with timed("storage.upload"):
+            upload = client.storage.from_(bucketName).upload(
+                filePath,
+                jsonBytes,
+                {"content-type": "application/json", "upsert": "true"},
+            )
         logger.info(f"JSON file uploaded successfully to {bucketName}/{filePath}") 
     except Exception as e:
         logger.error(f"Unexpected error while uploading JSON file: {e}")
@@ -86,10 +128,12 @@ async def uploadJson(client, data, filePath):
 
 async def getResume(client, filePath, email):
     try:
-        files = client.storage.from_(bucketName).list(filePath)
+        with timed("storage.list"):
+            files = client.storage.from_(bucketName).list(filePath)
         resume = next((f for f in files if f['name'].lower().endswith('.pdf')), None)
         fileName = resume['name']
-        resume_bytes = client.storage.from_(bucketName).download(f"{email}/resume/{fileName}")
+        with timed("storage.download"):
+            resume_bytes = client.storage.from_(bucketName).download(f"{email}/resume/{fileName}")
         resumeBase64 = base64.b64encode(resume_bytes).decode('utf-8')
         logger.info(f"Resume downloaded successfully from {bucketName}/{email}/resume/{fileName}")
         return (fileName, resumeBase64)
@@ -99,7 +143,8 @@ async def getResume(client, filePath, email):
 
 async def getLinkedInText(client, filePath):
     try:
-        download = client.storage.from_(bucketName).download(filePath)
+        with timed("storage.download"):
+            download = client.storage.from_(bucketName).download(filePath)
         linkedinBytes = download
         linkedinText = linkedinBytes.decode('utf-8')
         logger.info(f"LinkedIn text downloaded successfully from {bucketName}/{filePath}")
@@ -111,18 +156,32 @@ async def getLinkedInText(client, filePath):
 async def deleteFile(client, filePath: str):
     """Delete a file from Supabase Storage"""
     try:
-        client.storage.from_(bucketName).remove(filePath)
+        with timed("storage.remove"):
+            client.storage.from_(bucketName).remove(filePath)
         logger.info(f"Deleted file: {filePath}")
     except Exception as e:
         logger.warning(f"Could not delete {filePath}: {str(e)}")
         # Don't fail the whole operation if file doesn't exist
 
+async def deleteFiles(client, filePaths: list[str]):
+    """Delete several files from Supabase Storage in one request"""
+    if not filePaths:
+        return
+    try:
+        with timed("storage.remove"):
+            client.storage.from_(bucketName).remove(filePaths)
+        logger.info(f"Deleted {len(filePaths)} files")
+    except Exception as e:
+        logger.warning(f"Could not delete {filePaths}: {str(e)}")
+
 async def deleteResume(client, filePath, email):
     try:
-        files = client.storage.from_(bucketName).list(filePath)
+        with timed("storage.list"):
+            files = client.storage.from_(bucketName).list(filePath)
         resume = next((f for f in files if f['name'].lower().endswith('.pdf')), None)
         fileName = resume['name']
-        client.storage.from_(bucketName).remove(f"{email}/resume/{fileName}")
+        with timed("storage.remove"):
+            client.storage.from_(bucketName).remove(f"{email}/resume/{fileName}")
         logger.info(f"Resume deleted successfully from {bucketName}/{email}/resume/{fileName}")
     except Exception as e:
         logger.error(f"Unexpected error while deleting resume: {e}")
@@ -130,30 +189,116 @@ async def deleteResume(client, filePath, email):
 async def downloadJson(client, filePath: str):
     """Download and parse JSON file from Supabase Storage"""
     try:
-        response = client.storage.from_(bucketName).download(filePath)
+        with timed("storage.download"):
+            response = client.storage.from_(bucketName).download(filePath)
         return json.loads(response.decode('utf-8'))
     except Exception as e:
         logger.error(f"Error downloading {filePath}: {str(e)}")
         raise
 
-def getLLM(email):
-    """Returns a shared LLM instance"""
-    global _llm
-    if _llm is None:
-        client = getSupabaseClient()
-        result = client.table("user_api_keys").select("gemini_key").eq("user_email", email).single().execute()
-    
-        if not result.data or not result.data.get("gemini_key"):
-            raise ValueError(f"No Gemini API key found for user {email}")
-    
-        apiKey = decryptKey(result.data["gemini_key"])
-        _llm = ChatGoogleGenerativeAI(
-            model="gemini-2.5-flash-lite",
-            google_api_key=apiKey,
-            temperature=0.0
-        )
-        logger.info("LLM initialized")  
-    return _llm
+class UserClients:
+    """
+    One user's LLM and Tavily client, None where the user has no key stored.
+    LLM calls are admitted by the user's slot in the Gemini scheduler. The
+    runnables built on the LLM live in `runnables` and are dropped with it.
+    `generation` is the user's key generation the clients were built for.
+    """
+
+    def __init__(self, email: str, geminiKey: str = None, tavilyKey: str = None, generation: str = None):
+        self.generation = generation
+        self.llm = None
+        self.tavily = None
+        self.runnables = None
+        if geminiKey:
+            self.llm = ChatGoogleGenerativeAI(
+                model="gemini-2.5-flash-lite",
+                google_api_key=decryptKey(geminiKey),
+                temperature=0.0,
+                rate_limiter=getScheduler("gemini").limiter(email)
+            )
+            self.runnables = RunnableRegistry(self.llm)
+        if tavilyKey:
+            self.tavily = TavilySearch(
+                tavily_api_key=decryptKey(tavilyKey),
+                max_results=10,
+                search_depth="advanced",
+                include_answer=True,
+                include_domains=None,
+                exclude_domains=None,
+                topic="general",
+                time_range="month"
+            )
+
+def getUserClientGenerations():
+    """
+    Each user's key generation, replaced whenever their keys are saved. In
+    process by default; set USER_CLIENT_GENERATIONS_BACKEND=redis (with
+    REDIS_URL) so a key change on one worker invalidates the clients every
+    worker has cached, at the cost of one Redis read per request.
+    """
+    global _userClientGenerations
+    if _userClientGenerations is None:
+        backend = os.getenv("USER_CLIENT_GENERATIONS_BACKEND", "memory").lower()
+        if backend == "redis":
+            redisUrl = os.getenv("REDIS_URL")
+            if not redisUrl:
+                raise ValueError("Missing REDIS_URL in .env file")
+            _userClientGenerations = RedisCache(redisUrl, name="userClientGenerations")
+        elif backend == "memory":
+            _userClientGenerations = AsyncTTLCache(maxEntries=int(os.getenv("USER_CLIENT_CACHE_SIZE", "1000")), name="userClientGenerations")
+        else:
+            raise ValueError(f"Unknown USER_CLIENT_GENERATIONS_BACKEND {backend}")
+        logger.info(f"User client generations initialized ({backend})")
+    return _userClientGenerations
+
+async def buildUserClients(email: str, generation: str) -> UserClients:
+    client = await getAsyncSupabaseClient()
+    with timed("supabase.loadApiKey"):
+        result = await client.table("user_api_keys").select("gemini_key, tavily_key").eq("user_email", email).maybe_single().execute()
+    data = (result.data if result else None) or {}
+    clients = UserClients(email, data.get("gemini_key"), data.get("tavily_key"), generation)
+    # Keys saved while this build was running make it stale
+    if await getUserClientGenerations().get(email) == generation:
+        _userClients.set(email, clients)
+    logger.info(f"Clients initialized for {email}")
+    return clients
+
+async def getUserClients(email: str) -> UserClients:
+    """
+    Cached per email while the user's key generation is unchanged. Concurrent
+    first requests for a user share one build instead of each querying and
+    decrypting the keys.
+    """
+    generation = await getUserClientGenerations().get(email)
+    clients = _userClients.get(email)
+    if clients is not None and clients.generation == generation:
+        return clients
+    buildGeneration, build = _userClientBuilds.get(email, (None, None))
+    if build is None or buildGeneration != generation:
+        build = asyncio.ensure_future(buildUserClients(email, generation))
+        _userClientBuilds[email] = (generation, build)
+
+        def finished(task):
+            # A build for a newer generation may already have replaced this one
+            if _userClientBuilds.get(email, (None, None))[1] is task:
+                del _userClientBuilds[email]
+        build.add_done_callback(finished)
+    # Shielded so a cancelled request does not fail the build for the others
+    return await asyncio.shield(build)
+
+async def invalidateUserClients(email: str):
+    """Drops the user's cached clients on every worker sharing the generations, after their keys change"""
+    await getUserClientGenerations().set(email, uuid.uuid4().hex)
+    _userClients.delete(email)
+    _userClientBuilds.pop(email, None)
+    logger.info(f"Invalidated cached clients for {email}")
+
+async def getLLM(email):
+    """Returns the user's LLM, built from their own Gemini key"""
+    clients = await getUserClients(email)
+    if clients.llm is None:
+        raise ValueError(f"No Gemini API key found for user {email}")
+    return clients.llm
 
 def getEmbeddingConfig():
     """Configure the genai API with key"""
@@ -166,42 +311,80 @@ def getEmbeddingConfig():
         logger.info("Embedding config initialized")
     return _embeddingconfig
 
-def getTavilyClient(email):
-    global _tavilyClient
-    if _tavilyClient is None:
-        client = getSupabaseClient()
-        result = client.table("user_api_keys").select("tavily_key").eq("user_email", email).single().execute()
-        if not result.data or not result.data.get("tavily_key"):
-            raise ValueError(f"No Tavily API key found for user {email}")
-        apiKey = decryptKey(result.data["tavily_key"])
-        _tavilyClient = TavilySearch(
-            tavily_api_key=apiKey,
-            max_results=10,
-            search_depth="advanced",
-            include_answer=True,
-            include_domains=None,
-            exclude_domains=None,
-            topic="general",
-            time_range="month"
-        )
-        logger.info("Tavily client initialized")
-    return _tavilyClient
-
-async def queryEmbedder(query: str, embedder: VoyageClient):
-    logger.info(f"Generating query embedding for: {query}")
-
-    result = embedder.embed(
-        texts=[query],  # ← Must be a list! Changed from query to [query]
-        model="voyage-3.5",
-        input_type="query",  # Correct - use "query" for search queries
-        output_dimension=1024,
-        output_dtype="float"
-    )
-    
-    embeddings = result.embeddings[0]  # ← Get first embedding since we only sent one query
-    
+def getAsyncEmbeddingConfig():
+    """Voyage client for the answer path, embed() is awaitable"""
+    global _asyncEmbeddingConfig
+    if _asyncEmbeddingConfig is None:
+        apiKey = os.getenv("VOYAGE_KEY")
+        if not apiKey:
+            raise ValueError("Missing VOYAGE_KEY in .env file")
+        _asyncEmbeddingConfig = AsyncVoyageClient(api_key=apiKey)
+        logger.info("Async embedding config initialized")
+    return _asyncEmbeddingConfig
+
+async def getTavilyClient(email):
+    """Returns the user's Tavily client, built from their own Tavily key"""
+    clients = await getUserClients(email)
+    if clients.tavily is None:
+        raise ValueError(f"No Tavily API key found for user {email}")
+    return clients.tavily
+
+async def queryEmbedder(query: str, embedder: AsyncVoyageClient):
+    """
+    Embeds one search query. Repeated queries come from an LRU cache, then from
+    the embedding store; concurrent misses are coalesced into a single Voyage
+    request by the query batcher.
+    """
+    cacheKey = (query, QUERY_EMBEDDING_MODEL, QUERY_EMBEDDING_DIMENSION)
+    cached = _queryEmbeddingCache.get(cacheKey)
+    if cached is not None:
+        logger.info(f"Query embedding cache hit for: {query}")
+        return cached
+
+    async def embed(misses: list[str]) -> list[list[float]]:
+        logger.info(f"Generating query embedding for: {query}")
+        return [await getQueryBatcher(embedder).embed(misses[0])]
+
+    [embeddings] = await aembedWithStore([query], QUERY_EMBEDDING_MODEL, QUERY_EMBEDDING_DIMENSION, "query", embed)
+    _queryEmbeddingCache.set(cacheKey, embeddings)
     return embeddings
 
+async def queryBatchEmbedder(queries: list[str], embedder: AsyncVoyageClient) -> list[list[float]]:
+    """Embeds several search queries in one Voyage request, skipping any already cached or stored"""
+    keys = [(query, QUERY_EMBEDDING_MODEL, QUERY_EMBEDDING_DIMENSION) for query in queries]
+    cached = {key: _queryEmbeddingCache.get(key) for key in keys}
+    misses = list(dict.fromkeys(key[0] for key, vector in cached.items() if vector is None))
 
+    async def embed(texts: list[str]) -> list[list[float]]:
+        logger.info(f"Generating {len(texts)} query embeddings in batch ({len(queries) - len(texts)} cached)")
+        with timed("voyage.queryEmbedBatch"):
+            result = await embedder.embed(
+                texts=texts,
+                model=QUERY_EMBEDDING_MODEL,
+                input_type="query",
+                output_dimension=QUERY_EMBEDDING_DIMENSION,
+                output_dtype="float"
+            )
+        return result.embeddings
 
+    if misses:
+        vectors = await aembedWithStore(misses, QUERY_EMBEDDING_MODEL, QUERY_EMBEDDING_DIMENSION, "query", embed)
+        for query, vector in zip(misses, vectors):
+            key = (query, QUERY_EMBEDDING_MODEL, QUERY_EMBEDDING_DIMENSION)
+            cached[key] = vector
+            _queryEmbeddingCache.set(key, vector)
 
+    return [cached[key] for key in keys]
+
+def getQueryBatcher(embedder: AsyncVoyageClient) -> EmbeddingBatcher:
+    global _queryBatcher
+    if _queryBatcher is None or _queryBatcher.embedder is not embedder:
+        _queryBatcher = EmbeddingBatcher(
+            embedder,
+            model=QUERY_EMBEDDING_MODEL,
+            inputType="query",
+            dimension=QUERY_EMBEDDING_DIMENSION,
+            window=float(os.getenv("QUERY_EMBEDDING_BATCH_WINDOW_MS", "5")) / 1000,
+            maxBatch=int(os.getenv("QUERY_EMBEDDING_MAX_BATCH", "64")),
+        )
+    return _queryBatcher
@@ -0,0 +1,80 @@
+import asyncio
+import logging
+import time
+from services.metrics import timed, EMBEDDING_BATCH_SIZE, EMBEDDING_BATCH_WAIT_SECONDS
+
+logger = logging.getLogger(__name__)
+
+
+class EmbeddingBatcher:
+    """
+    Coalesces concurrent single-text embed calls made within `window` seconds
+    into one Voyage request and hands each caller its own vector. A batch is
+    sent early once it reaches `maxBatch` texts.
+    """
+
+    def __init__(self, embedder, model: str, inputType: str, dimension: int, window: float = 0.005, maxBatch: int = 64):
+        self.embedder = embedder
+        self.model = model
+        self.inputType = inputType
+        self.dimension = dimension
+        self.window = window
+        self.maxBatch = maxBatch
+
+        self._pending = []
+        self._flushHandle = None
+        self._inFlight = set()
+
+    async def embed(self, text: str) -> list[float]:
+        loop = asyncio.get_running_loop()
+        future = loop.create_future()
+        self._pending.append((text, future, time.perf_counter()))
+
+        if len(self._pending) >= self.maxBatch:
+            self._flush()
+        elif self._flushHandle is None:
+            self._flushHandle = loop.call_later(self.window, self._flush)
+        return await future
+
+    def _flush(self):
+        if self._flushHandle is not None:
+            self._flushHandle.cancel()
+            self._flushHandle = None
+        batch, self._pending = self._pending, []
+        if batch:
+            task = asyncio.create_task(self._send(batch))
+            # Keep a reference so the task is not garbage collected mid-flight
+            self._inFlight.add(task)
+            task.add_done_callback(self._inFlight.discard)
+
+    async def _send(self, batch):
+        texts = list(dict.fromkeys(text for text, _, _ in batch))
+        sentAt = time.perf_counter()
+        self._record(len(texts), [sentAt - queuedAt for _, _, queuedAt in batch])
+
+        try:
+            with timed("voyage.queryEmbed"):
+                result = await self.embedder.embed(
+                    texts=texts,
+                    model=self.model,
+                    input_type=self.inputType,
+                    output_dimension=self.dimension,
+                    output_dtype="float"
+                )
+        except Exception as e:
+            for _, future, _ in batch:
+                if not future.done():
+                    future.set_exception(e)
+            return
+
+        vectors = dict(zip(texts, result.embeddings))
+        for text, future, _ in batch:
+            if not future.done():
+                future.set_result(vectors[text])
+
+    def _record(self, size: int, waits: list[float]):
+        EMBEDDING_BATCH_SIZE.observe(size)
+        for wait in waits:
+            EMBEDDING_BATCH_WAIT_SECONDS.observe(wait)
+        if size > 1:
+            logger.info(f"Coalesced {size} query embeddings into one request")
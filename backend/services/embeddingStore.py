@@ -0,0 +1,163 @@
+import os
+import json
+import sqlite3
+import asyncio
+import hashlib
+import logging
+import threading
+from typing import Awaitable, Callable
+import numpy as np
+from dotenv import load_dotenv
+from services.cache import TTLCache
+
+load_dotenv()
+
+logger = logging.getLogger(__name__)
+
+_embeddingStore = None
+_embeddingStoreLoaded = False
+_embeddingStoreLock = threading.Lock()
+
+
+def embeddingKey(text: str, model: str, dimension: int, inputType: str) -> str:
+    """Content address of an embedding, the same text embedded another way is another entry"""
+    content = json.dumps([text, model, dimension, inputType], ensure_ascii=False)
+    return hashlib.sha256(content.encode("utf-8")).hexdigest()
+
+
+class MemoryEmbeddingStore:
+    """Embeddings in an in-process LRU, lost on restart"""
+
+    def __init__(self, maxEntries: int):
+        self.entries = TTLCache(maxEntries=maxEntries, name="embeddingStore")
+        self._lock = threading.Lock()
+
+    def getMany(self, keys: list[str]) -> dict:
+        with self._lock:
+            found = {key: self.entries.get(key) for key in keys}
+        return {key: vector for key, vector in found.items() if vector is not None}
+
+    def putMany(self, vectors: dict):
+        with self._lock:
+            for key, vector in vectors.items():
+                self.entries.set(key, vector)
+
+
+class SqliteEmbeddingStore:
+    """
+    Embeddings in a local SQLite file as float32 blobs, kept across restarts
+    and shared by the workers on one host. Once past `maxEntries` the oldest
+    entries are dropped.
+    """
+
+    def __init__(self, path: str, maxEntries: int):
+        self.path = path
+        self.maxEntries = maxEntries
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self._lock = threading.Lock()
+        self._connection = sqlite3.connect(path, check_same_thread=False, timeout=5)
+        # WAL lets other workers read while one writes; a crash may lose the last writes, which are only cache
+        self._connection.execute("PRAGMA journal_mode=WAL")
+        self._connection.execute("PRAGMA synchronous=NORMAL")
+        self._connection.execute(
+            "CREATE TABLE IF NOT EXISTS embeddings (key TEXT PRIMARY KEY, dimension INTEGER NOT NULL, vector BLOB NOT NULL)"
+        )
+        self._connection.commit()
+
+    def getMany(self, keys: list[str]) -> dict:
+        keys = list(dict.fromkeys(keys))
+        if not keys:
+            return {}
+        placeholders = ",".join("?" * len(keys))
+        with self._lock:
+            rows = self._connection.execute(
+                f"SELECT key, vector FROM embeddings WHERE key IN ({placeholders})", keys
+            ).fetchall()
+        return {key: np.frombuffer(vector, dtype=np.float32).tolist() for key, vector in rows}
+
+    def putMany(self, vectors: dict):
+        if not vectors:
+            return
+        rows = [(key, len(vector), np.asarray(vector, dtype=np.float32).tobytes()) for key, vector in vectors.items()]
+        with self._lock:
+            self._connection.executemany("INSERT OR REPLACE INTO embeddings (key, dimension, vector) VALUES (?, ?, ?)", rows)
+            self._connection.execute(
+                "DELETE FROM embeddings WHERE rowid <= (SELECT MAX(rowid) FROM embeddings) - ?", (self.maxEntries,)
+            )
+            self._connection.commit()
+
+
+def cachedKeys(texts: list[str], model: str, dimension: int, inputType: str, store):
+    """Content keys of `texts`, the vectors already stored, and the distinct texts to embed"""
+    keys = [embeddingKey(text, model, dimension, inputType) for text in texts]
+    found = {}
+    if store is not None:
+        try:
+            found = store.getMany(keys)
+        except Exception as e:
+            # The store is only a cache, a locked or broken file means embedding everything
+            logger.warning(f"Embedding store lookup failed: {type(e).__name__}: {e}")
+    misses = list(dict.fromkeys(text for text, key in zip(texts, keys) if key not in found))
+    return keys, found, misses
+
+
+def storeVectors(store, vectors: dict):
+    if store is None:
+        return
+    try:
+        store.putMany(vectors)
+    except Exception as e:
+        logger.warning(f"Could not store {len(vectors)} embeddings: {type(e).__name__}: {e}")
+
+
+def embedWithStore(texts: list[str], model: str, dimension: int, inputType: str, embed: Callable[[list[str]], list]) -> list:
+    """
+    Vectors for `texts` in order. Stored vectors are returned without a call,
+    `embed` gets each missing text once and its vectors are stored.
+    """
+    store = getEmbeddingStore()
+    keys, found, misses = cachedKeys(texts, model, dimension, inputType, store)
+    if misses:
+        vectors = dict(zip((embeddingKey(text, model, dimension, inputType) for text in misses), embed(misses)))
+        found.update(vectors)
+        storeVectors(store, vectors)
+    logger.info(f"Embedding store: {len(texts) - len(misses)} of {len(texts)} {inputType} embeddings cached")
+    return [found[key] for key in keys]
+
+
+async def aembedWithStore(texts: list[str], model: str, dimension: int, inputType: str, embed: Callable[[list[str]], Awaitable[list]]) -> list:
+    """embedWithStore for an awaitable `embed`; the store is read and written off the event loop"""
+    store = getEmbeddingStore()
+    keys, found, misses = await asyncio.to_thread(cachedKeys, texts, model, dimension, inputType, store)
+    if misses:
+        vectors = dict(zip((embeddingKey(text, model, dimension, inputType) for text in misses), await embed(misses)))
+        found.update(vectors)
+        await asyncio.to_thread(storeVectors, store, vectors)
+    return [found[key] for key in keys]
+
+
+def getEmbeddingStore():
+    """
+    Store picked by EMBEDDING_STORE: "sqlite" (default, at EMBEDDING_STORE_PATH),
+    "memory", or "none" to always call Voyage. Holds EMBEDDING_STORE_MAX_ENTRIES.
+    """
+    global _embeddingStore, _embeddingStoreLoaded
+    if _embeddingStoreLoaded:
+        return _embeddingStore
+    # Ingest threads and the event loop may ask for it first at the same time
+    with _embeddingStoreLock:
+        if _embeddingStoreLoaded:
+            return _embeddingStore
+        backend = os.getenv("EMBEDDING_STORE", "sqlite")
+        maxEntries = int(os.getenv("EMBEDDING_STORE_MAX_ENTRIES", "200000"))
+        if backend == "sqlite":
+            _embeddingStore = SqliteEmbeddingStore(os.getenv("EMBEDDING_STORE_PATH", ".cache/embeddings.sqlite3"), maxEntries)
+        elif backend == "memory":
+            _embeddingStore = MemoryEmbeddingStore(maxEntries)
+        elif backend != "none":
+            raise ValueError(f"Unknown EMBEDDING_STORE {backend!r}, use sqlite, memory or none")
+        _embeddingStoreLoaded = True
+        logger.info(f"Embedding store initialized ({backend})")
+        return _embeddingStore
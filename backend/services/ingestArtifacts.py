@@ -0,0 +1,122 @@
+import os
+import copy
+import asyncio
+import logging
+from concurrent.futures import Future, ThreadPoolExecutor
+from dotenv import load_dotenv
+from services.dependencies import uploadResume, uploadText, uploadJson, deleteFiles
+
+load_dotenv()
+
+logger = logging.getLogger(__name__)
+
+_artifactExecutor = None
+
+# How much of a profile build is written to storage (INGEST_ARTIFACTS):
+#   none       only what is read back: the sources for GET /user/profile and
+#              the semantic chunks /user/update re-merges
+#   essential  also fullUserProfile.json
+#   debug      every intermediate step, as the pipeline always used to (default)
+# A lower policy writes less from then on, files an earlier run wrote are kept.
+ARTIFACT_POLICIES = ["none", "essential", "debug"]
+
+# Artifact name -> (path under the user's folder, lowest policy that keeps it)
+ARTIFACTS = {
+    "linkedinText": ("linkedin/linkedinData.txt", "none"),
+    "linkedinSemanticChunks": ("linkedin/linkedinSemanticChunks.json", "none"),
+    "resumeSemanticChunks": ("resume/resumeSemanticChunks.json", "none"),
+    "fullUserProfile": ("fullUserProfile.json", "essential"),
+    "resumeText": ("resume/resumeData.txt", "debug"),
+    "resumeChunks": ("resume/resumeChunks.json", "debug"),
+    "linkedinChunks": ("linkedin/linkedinChunks.json", "debug"),
+    "unprocessedUserData": ("mergingData/unprocessedUserData.json", "debug"),
+    "validChunks": ("mergingData/validChunks.json", "debug"),
+    "naCompanyChunks": ("mergingData/naCompanyChunks.json", "debug"),
+    "sortedValidChunks": ("mergingData/sortedValidChunks.json", "debug"),
+    "sortedNaChunks": ("mergingData/sortedNaChunks.json", "debug"),
+}
+
+# The artifacts each side of a profile produces, and the ones built from both
+RESUME_ARTIFACTS = ["resumeText", "resumeChunks", "resumeSemanticChunks"]
+LINKEDIN_ARTIFACTS = ["linkedinText", "linkedinChunks", "linkedinSemanticChunks"]
+MERGED_ARTIFACTS = ["unprocessedUserData", "validChunks", "naCompanyChunks", "sortedValidChunks", "sortedNaChunks", "fullUserProfile"]
+
+
+def artifactPolicy() -> str:
+    policy = os.getenv("INGEST_ARTIFACTS", "debug")
+    if policy not in ARTIFACT_POLICIES:
+        logger.warning(f"Unknown INGEST_ARTIFACTS {policy!r}, using debug")
+        return "debug"
+    return policy
+
+
+def artifactPath(email: str, name: str) -> str:
+    return f"{email}/{ARTIFACTS[name][0]}"
+
+
+class ArtifactWriter:
+    """
+    Writes one ingest job's artifacts to storage in the background. Each
+    write is handed to a shared pool of upload threads and returns at once,
+    so uploads overlap with the LLM and embedding steps instead of queueing
+    in front of them. Artifacts below the policy are skipped. flush() waits
+    for every write and removes the job's previous artifacts it did not redo.
+    """
+
+    def __init__(self, client, email: str, policy: str = None):
+        self.client = client
+        self.email = email
+        self.policy = policy or artifactPolicy()
+        self.written = set()
+        self.futures: list[Future] = []
+
+    def keeps(self, name: str) -> bool:
+        return ARTIFACT_POLICIES.index(ARTIFACTS[name][1]) <= ARTIFACT_POLICIES.index(self.policy)
+
+    def _submit(self, upload, *args):
+        # The storage helpers block; each write gets its own event loop on an upload thread
+        self.futures.append(getArtifactExecutor().submit(asyncio.run, upload(self.client, *args)))
+
+    def json(self, name: str, data):
+        if self.keeps(name):
+            self.written.add(name)
+            # Snapshot, the pipeline keeps extending some of these lists after they are saved
+            self._submit(uploadJson, copy.deepcopy(data), artifactPath(self.email, name))
+
+    def text(self, name: str, text: str):
+        if self.keeps(name):
+            self.written.add(name)
+            self._submit(uploadText, text, artifactPath(self.email, name))
+
+    def resume(self, resume):
+        """The uploaded PDF, always kept. `resume` must not be read again until flush()"""
+        self._submit(uploadResume, resume, f"{self.email}/resume/{resume.filename}")
+
+    async def flush(self, replaced: list[str] = ()):
+        """
+        Waits for the writes, raising the first upload error. Artifacts in
+        `replaced` that the policy keeps but this job did not write, such as
+        a merge step that did not happen this time, are then deleted so an
+        outdated copy does not linger. Artifacts the policy skips are left
+        as an earlier run wrote them.
+        """
+        results = await asyncio.gather(*(asyncio.wrap_future(future) for future in self.futures), return_exceptions=True)
+        self.futures = []
+        for result in results:
+            if isinstance(result, BaseException):
+                raise result
+        stale = [artifactPath(self.email, name) for name in replaced if self.keeps(name) and name not in self.written]
+        await asyncio.to_thread(asyncio.run, deleteFiles(self.client, stale))
+        logger.info(f"Wrote {len(results)} ingest artifacts for {self.email} ({self.policy}), removed {len(stale)} stale")
+
+
+def getArtifactExecutor() -> ThreadPoolExecutor:
+    """Upload threads shared by all ingest jobs, ARTIFACT_UPLOAD_WORKERS of them"""
+    global _artifactExecutor
+    if _artifactExecutor is None:
+        _artifactExecutor = ThreadPoolExecutor(
+            max_workers=int(os.getenv("ARTIFACT_UPLOAD_WORKERS", "8")),
+            thread_name_prefix="artifacts",
+        )
+        logger.info("Ingest artifact upload pool initialized")
+    return _artifactExecutor
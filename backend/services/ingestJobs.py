@@ -0,0 +1,186 @@
+import os
+import time
+import uuid
+import asyncio
+import logging
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from typing import Awaitable, Callable, Coroutine, Optional
+from dotenv import load_dotenv
+from services.cache import TTLCache
+
+load_dotenv()
+
+logger = logging.getLogger(__name__)
+
+_ingestJobPool = None
+
+
+class IngestFull(Exception):
+    """The ingest queue is at INGEST_MAX_QUEUED_JOBS"""
+
+
+class IngestJob:
+    """
+    One /user/userdata or /user/update run. `stages` lists the steps this
+    job will go through, progress is the share of them already finished.
+    Independent branches of a job run their stages side by side, so more
+    than one stage can be running at once.
+    """
+
+    def __init__(self, email: str, kind: str, stages: list[str]):
+        self.jobId = uuid.uuid4().hex
+        self.email = email
+        self.kind = kind
+        self.stages = stages
+        self.status = "queued"
+        self.stage = None
+        self.runningStages = []
+        self.finishedStages = set()
+        self.completedStages = 0
+        self.error = None
+        self.createdAt = time.time()
+        self.startedAt = None
+        self.finishedAt = None
+        self._lock = threading.Lock()
+
+    def start(self, stage: str):
+        """Marks `stage` as running, alongside any stage another branch is running"""
+        with self._lock:
+            self.runningStages.append(stage)
+            self.stage = stage
+        logger.info(f"Ingest job {self.jobId} ({self.email}): {stage}")
+
+    def finish(self, stage: str):
+        with self._lock:
+            if stage in self.runningStages:
+                self.runningStages.remove(stage)
+            self.finishedStages.add(stage)
+            self.completedStages = len(self.finishedStages & set(self.stages))
+            self.stage = self.runningStages[-1] if self.runningStages else None
+
+    def advance(self, stage: str):
+        """Marks every running stage as done and `stage` as running"""
+        for running in list(self.runningStages):
+            self.finish(running)
+        self.start(stage)
+
+    def toJson(self) -> dict:
+        return {
+            "jobId": self.jobId,
+            "kind": self.kind,
+            "status": self.status,
+            "stage": self.stage,
+            "runningStages": list(self.runningStages),
+            "stages": self.stages,
+            "progress": round(self.completedStages / len(self.stages), 2) if self.stages else 0.0,
+            "error": self.error,
+            "createdAt": self.createdAt,
+            "startedAt": self.startedAt,
+            "finishedAt": self.finishedAt,
+        }
+
+
+class IngestJobPool:
+    """
+    Runs ingest jobs on a bounded pool of worker threads. The ingest pipeline
+    makes blocking LLM, Voyage and Supabase calls; each job gets its own
+    event loop in a worker thread so those calls never stall the answer
+    endpoints on the main loop. At most `workers` jobs run at once, at most
+    `maxQueued` wait, and each user has at most one job queued or running.
+
+    Job state lives in this process's memory only. With more than one server
+    worker, GET /user/jobs/{jobId} can land on a worker that never saw the
+    job and answer 404, so run the API with a single worker or sticky
+    routing. A restart drops queued and running jobs and their status; the
+    user has to submit the profile again.
+    """
+
+    def __init__(self, workers: int, maxQueued: int, ttl: float):
+        self.workers = workers
+        self.maxQueued = maxQueued
+        self.executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="ingest")
+        self.jobs = TTLCache(maxEntries=10000, ttl=ttl, name="ingestJobs")
+        self.activeJobs = {}
+
+    def queued(self) -> int:
+        jobs = [self.jobs.get(jobId) for jobId in list(self.activeJobs.values())]
+        return sum(1 for job in jobs if job is not None and job.status == "queued")
+
+    def active(self, email: str) -> Optional[IngestJob]:
+        jobId = self.activeJobs.get(email)
+        return self.jobs.get(jobId) if jobId else None
+
+    def submit(self, job: IngestJob, run: Callable[[IngestJob], Awaitable[None]]) -> IngestJob:
+        if self.queued() >= self.maxQueued:
+            raise IngestFull(f"{self.maxQueued} ingest jobs already queued")
+        self.jobs.set(job.jobId, job)
+        self.activeJobs[job.email] = job.jobId
+        asyncio.get_running_loop().run_in_executor(self.executor, self._work, job, run)
+        logger.info(f"Queued ingest job {job.jobId} ({job.kind}) for {job.email}")
+        return job
+
+    def _work(self, job: IngestJob, run: Callable[[IngestJob], Awaitable[None]]):
+        job.status = "running"
+        job.startedAt = time.time()
+        try:
+            asyncio.run(run(job))
+            job.status = "succeeded"
+            job.completedStages = len(job.stages)
+            job.runningStages = []
+            job.stage = None
+        except Exception as e:
+            job.status = "failed"
+            # Callers set a user-facing message, internals stay in the log
+            job.error = job.error or "Ingest failed"
+            logger.error(f"Ingest job {job.jobId} failed in {job.stage}: {type(e).__name__}: {e}", exc_info=True)
+        finally:
+            job.finishedAt = time.time()
+            if self.activeJobs.get(job.email) == job.jobId:
+                del self.activeJobs[job.email]
+            logger.info(f"Ingest job {job.jobId} {job.status} in {job.finishedAt - job.startedAt:.1f}s")
+
+    def get(self, jobId: str, email: str) -> Optional[IngestJob]:
+        """The job, if it is still retained and belongs to `email`"""
+        job = self.jobs.get(jobId)
+        if job is None or job.email != email:
+            return None
+        return job
+
+    def stats(self) -> dict:
+        return {
+            "workers": self.workers,
+            "active": len(self.activeJobs),
+            "queued": self.queued(),
+        }
+
+
+async def runBranches(*branches: Coroutine):
+    """
+    Runs independent parts of an ingest job side by side and returns their
+    results in order. The ingest steps block, so each branch gets its own
+    thread and event loop. Every branch is left to finish before the first
+    error is raised, so a failed job is not reported while a branch is
+    still writing its files.
+    """
+    results = await asyncio.gather(
+        *(asyncio.to_thread(asyncio.run, branch) for branch in branches),
+        return_exceptions=True,
+    )
+    for result in results:
+        if isinstance(result, BaseException):
+            raise result
+    return results
+
+
+def getIngestJobPool() -> IngestJobPool:
+    """INGEST_WORKERS jobs run concurrently, finished jobs are kept for INGEST_JOB_TTL_SECONDS"""
+    global _ingestJobPool
+    if _ingestJobPool is None:
+        _ingestJobPool = IngestJobPool(
+            workers=int(os.getenv("INGEST_WORKERS", "2")),
+            maxQueued=int(os.getenv("INGEST_MAX_QUEUED_JOBS", "50")),
+            ttl=float(os.getenv("INGEST_JOB_TTL_SECONDS", "86400")),
+        )
+        logger.info("Ingest job pool initialized")
+    return _ingestJobPool
@@ -0,0 +1,109 @@
+import os
+import time
+import uuid
+import asyncio
+import logging
+from typing import Awaitable, Callable, Optional
+from dotenv import load_dotenv
+from services.cache import TTLCache
+
+load_dotenv()
+
+logger = logging.getLogger(__name__)
+
+_jobSessionStore = None
+
+
+class JobSession:
+    """
+    One job posting, analyzed once. The precompute task fills in the
+    structured requirements, company research and the job-derived retrieval
+    query with its embedding, so each answer only makes its own LLM call. A
+    part that failed stays None: answers then go without research and
+    retrieve with the raw job description.
+    """
+
+    def __init__(self, email: str, jobTitle: str, companyName: str, jobDescription: str, retrievalMode: Optional[str] = None):
+        self.sessionId = uuid.uuid4().hex
+        self.email = email
+        self.jobTitle = jobTitle
+        self.companyName = companyName
+        self.jobDescription = jobDescription
+        self.retrievalMode = retrievalMode
+        self.createdAt = time.time()
+
+        self.requirements = None
+        self.companyData = None
+        self.jobQuery = None
+        self.jobQueryEmbedding = None
+        self.errors = {}
+        self.task: Optional[asyncio.Task] = None
+
+    def start(self, precompute: Callable[["JobSession"], Awaitable[None]]):
+        self.task = asyncio.create_task(precompute(self), name=f"jobSession:{self.sessionId}")
+        self.task.add_done_callback(self._finished)
+
+    def _finished(self, task: asyncio.Task):
+        if not task.cancelled() and task.exception() is not None:
+            self.errors["precompute"] = str(task.exception())
+            logger.error(f"Job session {self.sessionId} precompute failed: {task.exception()}")
+        else:
+            logger.info(f"Job session {self.sessionId} ready in {time.time() - self.createdAt:.2f}s")
+
+    def ready(self) -> bool:
+        return self.task is not None and self.task.done()
+
+    async def wait(self):
+        """Waits for the precompute without cancelling it for other answers if this caller gives up"""
+        if self.task is not None and not self.task.done():
+            await asyncio.wait({self.task})
+
+    def jobData(self) -> dict:
+        return {
+            "jobTitle": self.jobTitle,
+            "companyName": self.companyName,
+            "jobDescription": self.jobDescription,
+            "email": self.email,
+            "retrievalMode": self.retrievalMode,
+        }
+
+    def status(self) -> dict:
+        return {
+            "sessionId": self.sessionId,
+            "status": "ready" if self.ready() else "pending",
+            "requirements": self.requirements.model_dump() if self.requirements else None,
+            "companyResearch": self.companyData is not None,
+            "jobQuery": self.jobQuery,
+            "errors": self.errors,
+        }
+
+
+class JobSessionStore:
+    def __init__(self, ttl: float, maxEntries: int):
+        self.sessions = TTLCache(maxEntries=maxEntries, ttl=ttl, name="jobSessions")
+
+    def create(self, session: JobSession, precompute: Callable[[JobSession], Awaitable[None]]) -> JobSession:
+        self.sessions.set(session.sessionId, session)
+        session.start(precompute)
+        return session
+
+    def get(self, sessionId: str, email: str) -> Optional[JobSession]:
+        """The session, if it exists, has not expired and belongs to `email`"""
+        session = self.sessions.get(sessionId)
+        if session is None or session.email != email:
+            return None
+        # Each use extends the session's lifetime
+        self.sessions.set(sessionId, session)
+        return session
+
+
+def getJobSessionStore() -> JobSessionStore:
+    """Sessions live in process for JOB_SESSION_TTL_SECONDS after their last use"""
+    global _jobSessionStore
+    if _jobSessionStore is None:
+        _jobSessionStore = JobSessionStore(
+            ttl=float(os.getenv("JOB_SESSION_TTL_SECONDS", "3600")),
+            maxEntries=int(os.getenv("JOB_SESSION_MAX_ENTRIES", "1000")),
+        )
+        logger.info("Job session store initialized")
+    return _jobSessionStore
@@ -0,0 +1,85 @@
+import re
+import math
+from collections import Counter, defaultdict
+
+# Common English words that carry no retrieval signal
+STOPWORDS = {
+    "a", "an", "and", "are", "as", "at", "be", "by", "for", "from", "has", "have", "in", "into", "is", "it", "its",
+    "of", "on", "or", "that", "the", "their", "this", "to", "was", "were", "which", "with", "while", "within",
+}
+
+TOKEN_PATTERN = re.compile(r"[a-z0-9][a-z0-9+#]*(?:[.\-][a-z0-9+#]+)*")
+
+
+def tokenize(text: str) -> list[str]:
+    """Lowercased word tokens that keep technology names intact (c++, c#, node.js, ci-cd)"""
+    return [token for token in TOKEN_PATTERN.findall(text.lower()) if token not in STOPWORDS]
+
+
+class LexicalIndex:
+    """
+    BM25 inverted index over one user's chunk texts. Small enough to keep in
+    memory and to persist as JSON next to the profile.
+    """
+
+    def __init__(self, texts: list[str], k1: float = 1.2, b: float = 0.75):
+        self.texts = texts
+        self.k1 = k1
+        self.b = b
+        self.postings = defaultdict(list)
+        self.docLengths = []
+        for doc, text in enumerate(texts):
+            counts = Counter(tokenize(text))
+            self.docLengths.append(sum(counts.values()))
+            for term, frequency in counts.items():
+                self.postings[term].append((doc, frequency))
+        self._prepare()
+
+    def _prepare(self):
+        count = len(self.docLengths)
+        self.avgDocLength = sum(self.docLengths) / count if count else 0.0
+        self.idf = {
+            term: math.log(1 + (count - len(docs) + 0.5) / (len(docs) + 0.5))
+            for term, docs in self.postings.items()
+        }
+
+    def search(self, query: str, limit: int) -> list[tuple[int, float]]:
+        """(doc number, BM25 score) for the best matching docs, highest first"""
+        scores = defaultdict(float)
+        for term in set(tokenize(query)):
+            idf = self.idf.get(term)
+            if idf is None:
+                continue
+            for doc, frequency in self.postings[term]:
+                lengthNorm = 1 - self.b + self.b * self.docLengths[doc] / self.avgDocLength
+                scores[doc] += idf * frequency * (self.k1 + 1) / (frequency + self.k1 * lengthNorm)
+        return sorted(scores.items(), key=lambda item: (-item[1], item[0]))[:limit]
+
+    def toJson(self) -> dict:
+        return {
+            "k1": self.k1,
+            "b": self.b,
+            "texts": self.texts,
+            "docLengths": self.docLengths,
+            "postings": {term: docs for term, docs in self.postings.items()},
+        }
+
+    @classmethod
+    def fromJson(cls, data: dict) -> "LexicalIndex":
+        index = cls.__new__(cls)
+        index.texts = data["texts"]
+        index.k1 = data["k1"]
+        index.b = data["b"]
+        index.docLengths = data["docLengths"]
+        index.postings = defaultdict(list, {term: [tuple(doc) for doc in docs] for term, docs in data["postings"].items()})
+        index._prepare()
+        return index
+
+
+def reciprocalRankFusion(rankings: list[list[int]], k: int = 60) -> list[tuple[int, float]]:
+    """Fuses several best-first rankings of the same items, score = sum of 1 / (k + rank)"""
+    scores = defaultdict(float)
+    for ranking in rankings:
+        for rank, item in enumerate(ranking, start=1):
+            scores[item] += 1.0 / (k + rank)
+    return sorted(scores.items(), key=lambda item: (-item[1], item[0]))
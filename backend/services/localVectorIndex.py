@@ -0,0 +1,193 @@
+import os
+import json
+import asyncio
+import logging
+import numpy as np
+from dotenv import load_dotenv
+from services.cache import TTLCache
+from services.dependencies import bucketName
+from services.lexicalIndex import LexicalIndex, reciprocalRankFusion
+from services.metrics import timed
+
+load_dotenv()
+
+logger = logging.getLogger(__name__)
+
+_localVectorStore = None
+
+
+class UserVectorIndex:
+    """One user's profile chunks as a contiguous matrix of unit vectors, plus their BM25 index"""
+
+    def __init__(self, texts: list[str], embeddings, lexical: LexicalIndex = None):
+        self.texts = texts
+        self.lexical = lexical or LexicalIndex(texts)
+        # Lexical docs can come from a persisted index, map them onto matrix rows by text
+        rowByText = {text: row for row, text in enumerate(texts)}
+        self.rowForDoc = [rowByText.get(text) for text in self.lexical.texts]
+        if not texts:
+            self.matrix = np.zeros((0, 0), dtype=np.float32)
+            return
+        matrix = np.asarray(embeddings, dtype=np.float32).reshape(len(texts), -1)
+        norms = np.linalg.norm(matrix, axis=1, keepdims=True)
+        norms[norms == 0] = 1.0
+        self.matrix = np.ascontiguousarray(matrix / norms)
+
+    def __len__(self):
+        return len(self.texts)
+
+    def similarities(self, queryEmbedding) -> np.ndarray:
+        query = np.asarray(queryEmbedding, dtype=np.float32)
+        norm = np.linalg.norm(query)
+        return self.matrix @ (query / norm if norm else query)
+
+    def vectorCandidates(self, similarities: np.ndarray, fetchCount: int, matchThreshold: float) -> np.ndarray:
+        """Rows above the threshold, most similar first, at most fetchCount"""
+        candidates = np.flatnonzero(similarities >= matchThreshold)
+        order = np.argsort(-similarities[candidates], kind="stable")
+        return candidates[order][:fetchCount]
+
+    def search(self, queryEmbedding, matchCount: int, fetchCount: int, lambdaMult: float, matchThreshold: float) -> list[dict]:
+        """Same contract as the search_user_profiles_mmr RPC"""
+        if not self.texts:
+            return []
+        similarities = self.similarities(queryEmbedding)
+        candidates = self.vectorCandidates(similarities, fetchCount, matchThreshold)
+        selected = mmrSelect(self, candidates, similarities[candidates], matchCount, lambdaMult)
+        return [{"embedding_text": self.texts[row], "similarity": float(similarities[row])} for row in selected]
+
+    def hybridSearch(self, queryEmbedding, queryText: str, matchCount: int, fetchCount: int, lambdaMult: float, matchThreshold: float, rrfK: int = 60) -> list[dict]:
+        """
+        Fuses the vector candidates with BM25 matches on queryText by reciprocal
+        rank fusion, then runs MMR over the fused list using the normalised
+        fusion score as relevance. Exact terms such as technology and company
+        names can surface chunks that fall under the similarity threshold.
+        """
+        if not self.texts:
+            return []
+        similarities = self.similarities(queryEmbedding)
+        vectorRanking = self.vectorCandidates(similarities, fetchCount, matchThreshold).tolist()
+        lexicalRanking = [self.rowForDoc[doc] for doc, _ in self.lexical.search(queryText, fetchCount) if self.rowForDoc[doc] is not None]
+
+        fused = reciprocalRankFusion([vectorRanking, lexicalRanking], rrfK)[:fetchCount]
+        if not fused:
+            return []
+        candidates = np.array([row for row, _ in fused])
+        fusedScores = np.array([score for _, score in fused], dtype=np.float32)
+        selected = mmrSelect(self, candidates, fusedScores / fusedScores.max(), matchCount, lambdaMult)
+        return [{"embedding_text": self.texts[row], "similarity": float(similarities[row])} for row in selected]
+
+
+def mmrSelect(index: UserVectorIndex, candidates: np.ndarray, relevance: np.ndarray, matchCount: int, lambdaMult: float) -> list[int]:
+    """
+    Maximal marginal relevance: greedily picks matchCount of the candidate
+    rows, trading relevance (lambdaMult) against the highest cosine similarity
+    to a row already picked. Returns row numbers in pick order.
+    """
+    if candidates.size == 0:
+        return []
+    pairwise = index.matrix[candidates] @ index.matrix[candidates].T
+    selected = []
+    maxRedundancy = np.full(candidates.size, -np.inf, dtype=np.float32)
+    available = np.ones(candidates.size, dtype=bool)
+
+    for _ in range(min(matchCount, candidates.size)):
+        if selected:
+            scores = lambdaMult * relevance - (1 - lambdaMult) * maxRedundancy
+        else:
+            scores = relevance.copy()
+        scores[~available] = -np.inf
+        best = int(np.argmax(scores))
+        selected.append(best)
+        available[best] = False
+        maxRedundancy = np.maximum(maxRedundancy, pairwise[best])
+
+    return [int(candidates[position]) for position in selected]
+
+
+def parseEmbedding(raw):
+    # PostgREST returns pgvector columns as their text form, e.g. "[0.1,0.2]"
+    return json.loads(raw) if isinstance(raw, str) else raw
+
+
+class LocalVectorStore:
+    """
+    Per-user vector indexes loaded once from user_profile_embeddings and kept
+    in an LRU. Entries expire after `ttl` seconds so other workers pick up
+    profile changes; the worker that ingests a profile invalidates it directly.
+    """
+
+    def __init__(self, maxUsers: int, ttl: float):
+        self.indexes = TTLCache(maxEntries=maxUsers, ttl=ttl, name="userVectorIndexes")
+        self._loading = {}
+        self._generations = {}
+
+    async def getIndex(self, email: str, client) -> UserVectorIndex:
+        index = self.indexes.get(email)
+        if index is not None:
+            return index
+        if email not in self._loading:
+            # Concurrent first requests for a user share one load
+            self._loading[email] = asyncio.ensure_future(self._load(email, client))
+        try:
+            return await asyncio.shield(self._loading[email])
+        finally:
+            if email in self._loading and self._loading[email].done():
+                del self._loading[email]
+
+    async def _load(self, email: str, client) -> UserVectorIndex:
+        generation = self._generations.get(email, 0)
+        with timed("supabase.loadEmbeddings"):
+            response = await client.table('user_profile_embeddings')\
+                .select('embedding_text, embedding')\
+                .eq('user_email', email)\
+                .execute()
+        rows = response.data or []
+        index = UserVectorIndex(
+            [row['embedding_text'] for row in rows],
+            [parseEmbedding(row['embedding']) for row in rows],
+            await self._loadLexical(email, client)
+        )
+        if self._generations.get(email, 0) == generation:
+            # Skip caching if the profile was re-ingested while we were loading
+            self.indexes.set(email, index)
+        logger.info(f"Loaded local vector index for {email} ({len(index)} chunks)")
+        return index
+
+    async def _loadLexical(self, email: str, client):
+        # Built at ingest time; profiles stored before that get one built from their rows
+        try:
+            with timed("storage.download"):
+                data = await client.storage.from_(bucketName).download(lexicalIndexPath(email))
+            return LexicalIndex.fromJson(json.loads(data.decode('utf-8')))
+        except Exception as e:
+            logger.info(f"No stored lexical index for {email}, building from rows: {e}")
+            return None
+
+    def invalidate(self, email: str):
+        self._generations[email] = self._generations.get(email, 0) + 1
+        self.indexes.delete(email)
+        logger.info(f"Invalidated local vector index for {email}")
+
+    def stats(self) -> dict:
+        return self.indexes.stats()
+
+
+def lexicalIndexPath(email: str) -> str:
+    return f"{email}/lexicalIndex.json"
+
+
+def localRetrievalEnabled() -> bool:
+    """RETRIEVAL_ENGINE=local searches in-process instead of calling the Supabase RPC"""
+    return os.getenv("RETRIEVAL_ENGINE", "rpc").lower() == "local"
+
+
+def getLocalVectorStore() -> LocalVectorStore:
+    global _localVectorStore
+    if _localVectorStore is None:
+        _localVectorStore = LocalVectorStore(
+            maxUsers=int(os.getenv("LOCAL_INDEX_MAX_USERS", "1000")),
+            ttl=float(os.getenv("LOCAL_INDEX_TTL_SECONDS", "300")),
+        )
+        logger.info("Local vector store initialized")
+    return _localVectorStore
@@ -0,0 +1,139 @@
+import time
+import asyncio
+import logging
+from contextlib import contextmanager
+from contextvars import ContextVar
+from prometheus_client import Counter, Gauge, Histogram, generate_latest, CONTENT_TYPE_LATEST
+
+logger = logging.getLogger(__name__)
+
+# One series per stage and outcome. Stage names are dotted by kind:
+# graph.<pipeline>.<stage>, llm.<call>, tavily.<call>, voyage.<call>,
+# supabase.<call>, storage.<operation>
+STAGE_SECONDS = Histogram(
+    "answerly_stage_duration_seconds",
+    "Duration of pipeline stages and upstream calls",
+    ["stage", "outcome"],
+    buckets=(0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 20.0, 40.0, 80.0),
+)
+
+# Estimated tokens of the final answer context per request, before and after
+# packing, and the difference
+CONTEXT_TOKENS = Histogram(
+    "answerly_context_tokens",
+    "Estimated tokens in the final answer context",
+    ["kind"],
+    buckets=(100, 250, 500, 1000, 2000, 4000, 8000, 16000, 32000),
+)
+
+# Upstream calls waiting in a rate limit scheduler (services/rateLimiter.py),
+# how long they waited and calls refused for waiting too long or rejected by
+# the provider with 429
+UPSTREAM_QUEUE_DEPTH = Gauge(
+    "answerly_upstream_queue_depth",
+    "Upstream calls queued for rate limit tokens",
+    ["scheduler"],
+)
+UPSTREAM_QUEUE_WAIT_SECONDS = Histogram(
+    "answerly_upstream_queue_wait_seconds",
+    "Time upstream calls waited for rate limit tokens",
+    ["scheduler"],
+    buckets=(0.001, 0.01, 0.1, 0.5, 1.0, 2.5, 5.0, 10.0, 20.0, 30.0, 60.0),
+)
+UPSTREAM_RATE_LIMITED = Counter(
+    "answerly_upstream_rate_limited_total",
+    "Upstream calls refused by the scheduler or rejected by the provider",
+    ["scheduler", "reason"],
+)
+# Query embedding micro-batches (services/embeddingBatcher.py): texts per
+# Voyage request and how long each query waited for its batch to be sent
+EMBEDDING_BATCH_SIZE = Histogram(
+    "answerly_embedding_batch_size",
+    "Distinct texts per coalesced query embedding request",
+    buckets=(1, 2, 4, 8, 16, 32, 64),
+)
+EMBEDDING_BATCH_WAIT_SECONDS = Histogram(
+    "answerly_embedding_batch_wait_seconds",
+    "Time a query embedding waited in the batching window",
+    buckets=(0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1),
+)
+
+# Semantic cache lookups (services/semanticCache.py) and each cache's hit rate so far
+SEMANTIC_CACHE_LOOKUPS = Counter(
+    "answerly_semantic_cache_lookups_total",
+    "Semantic cache lookups by outcome",
+    ["cache", "outcome"],
+)
+SEMANTIC_CACHE_HIT_RATE = Gauge(
+    "answerly_semantic_cache_hit_rate",
+    "Share of semantic cache lookups that hit since the worker started",
+    ["cache"],
+)
+PROFILE_CHUNKS = Counter(
+    "answerly_profile_chunks_total",
+    "Profile chunks per ingest: embedded, deleted, or left unchanged",
+    ["outcome"],
+)
+
+# Timings collected for the current request's Server-Timing header, None outside a request
+_requestTimings: ContextVar = ContextVar("requestTimings", default=None)
+
+
+def outcomeOf(error: BaseException) -> str:
+    if isinstance(error, asyncio.CancelledError):
+        return "cancelled"
+    if isinstance(error, asyncio.TimeoutError):
+        return "timeout"
+    return "error"
+
+
+def recordStage(stage: str, seconds: float, outcome: str = "success"):
+    STAGE_SECONDS.labels(stage=stage, outcome=outcome).observe(seconds)
+    timings = _requestTimings.get()
+    if timings is not None:
+        timings.append((stage, seconds))
+
+
+def recordContextTokens(stats: dict):
+    CONTEXT_TOKENS.labels(kind="raw").observe(stats["tokensBefore"])
+    CONTEXT_TOKENS.labels(kind="packed").observe(stats["tokensAfter"])
+    CONTEXT_TOKENS.labels(kind="saved").observe(stats["tokensSaved"])
+
+
+@contextmanager
+def timed(stage: str):
+    """Times the enclosed block (sync or async code) as `stage`, labelled with how it ended"""
+    start = time.perf_counter()
+    outcome = "success"
+    try:
+        yield
+    except BaseException as e:
+        outcome = outcomeOf(e)
+        raise
+    finally:
+        recordStage(stage, time.perf_counter() - start, outcome)
+
+
+def startRequestTimings() -> list:
+    """Collects timings recorded by this request and the tasks it starts"""
+    timings = []
+    _requestTimings.set(timings)
+    return timings
+
+
+def serverTimingHeader(timings: list, totalSeconds: float) -> str:
+    """Server-Timing value with one entry per stage, repeated stages summed"""
+    totals = {}
+    counts = {}
+    for stage, seconds in timings:
+        totals[stage] = totals.get(stage, 0.0) + seconds
+        counts[stage] = counts.get(stage, 0) + 1
+    entries = [f"total;dur={totalSeconds * 1000:.1f}"]
+    for stage, seconds in totals.items():
+        description = f';desc="x{counts[stage]}"' if counts[stage] > 1 else ""
+        entries.append(f"{stage};dur={seconds * 1000:.1f}{description}")
+    return ", ".join(entries)
+
+
+def metricsPayload():
+    return generate_latest(), CONTENT_TYPE_LATEST
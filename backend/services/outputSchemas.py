@@ -120,8 +120,12 @@ class JobApplicationState(TypedDict):
     collectedCompanyData: Optional[str]
     jobdescriptionData: str
     retrievedUserData: list[str]
+    packedContext: Optional[dict]
     finalResponse: str
 
+    # Request options
+    retrievalMode: Optional[str]
+
 #Company Research Decision
 class CompanyResearchDecision(BaseModel):
     """Output schema for the decision"""
@@ -136,6 +140,10 @@ class OptimalQuery(BaseModel):
     optimized_query: str = Field(description="Rephrased and expanded query optimized for RAG retrieval")
     Keyadditions : List[str] = Field(description="List of key terms or phrases added to enhance retrieval effectiveness")
 
+class OptimalQueries(BaseModel):
+    optimized_queries: List[str] = Field(description="2-4 distinct queries optimized for RAG retrieval, each covering one aspect of the information need")
+    Keyadditions : List[str] = Field(description="List of key terms or phrases added to enhance retrieval effectiveness")
+
 class ResponseOutput(BaseModel):
     """Generated response to interview question"""
     response: str = Field(
@@ -143,3 +151,38 @@ class ResponseOutput(BaseModel):
     )
 
 
+
+#Planner (research decision + queries in one call)
+class AnswerPlan(BaseModel):
+    """Everything the answer pipeline needs before retrieval, from one call"""
+    companyResearchDecision: bool = Field(
+        description="True if company information is needed to answer the question"
+    )
+    retrieval_query: str = Field(
+        description="Query optimized for semantic search over the candidate's resume and LinkedIn chunks"
+    )
+    search_query: str = Field(
+        description="6-10 word web search query about the company's recent work, empty string when research is not needed"
+    )
+
+
+#Job Session (posting analyzed once, reused by every answer)
+class JobRequirements(BaseModel):
+    """What a job posting asks for, without benefits, pay or legal text"""
+    summary: str = Field(
+        description="2-3 sentences on what the role is, the team and the product or business area"
+    )
+    responsibilities: List[str] = Field(
+        description="Key responsibilities and job functions, one short phrase each"
+    )
+    required_qualifications: List[str] = Field(
+        description="Required skills, technologies, experience and education, one short phrase each"
+    )
+    preferred_qualifications: List[str] = Field(
+        default=[],
+        description="Nice-to-have skills and experience, one short phrase each"
+    )
+    values: List[str] = Field(
+        default=[],
+        description="Company values, mission or culture the posting emphasizes, one short phrase each"
+    )
@@ -0,0 +1,270 @@
+import os
+import re
+import math
+import time
+import asyncio
+import logging
+from collections import OrderedDict, deque
+from typing import Hashable, Optional
+from dotenv import load_dotenv
+from langchain_core.exceptions import ModelRateLimitError
+from langchain_core.rate_limiters import BaseRateLimiter
+from services.cache import TTLCache
+from services.metrics import UPSTREAM_QUEUE_DEPTH, UPSTREAM_QUEUE_WAIT_SECONDS, UPSTREAM_RATE_LIMITED
+
+load_dotenv()
+
+logger = logging.getLogger(__name__)
+
+_schedulers = {}
+
+# Shortest sleep of the dispatcher while calls are queued
+MIN_DISPATCH_DELAY = 0.005
+
+# How long a key is held after the provider answered 429 anyway
+RATE_LIMIT_BACKOFF_SECONDS = float(os.getenv("RATE_LIMIT_BACKOFF_SECONDS", "20"))
+
+# Provider quotas per user key, requests per minute. Defaults are the free tiers.
+PROVIDER_QUOTAS = {
+    "gemini": ("GEMINI_REQUESTS_PER_MINUTE", "15"),
+    "tavily": ("TAVILY_REQUESTS_PER_MINUTE", "100"),
+}
+
+
+class RateLimitedError(Exception):
+    """An upstream call waited too long for its quota, or kept getting 429s"""
+
+    def __init__(self, scheduler: str, retryAfter: float):
+        super().__init__(f"{scheduler} rate limit reached, retry after {retryAfter:.0f}s")
+        self.scheduler = scheduler
+        self.retryAfter = retryAfter
+
+
+# langchain_tavily raises a bare Exception("Error <status>: <reason>") for non-200 responses
+TAVILY_HTTP_ERROR = re.compile(r"Error (\d{3}): ")
+
+
+def httpStatus(error) -> Optional[int]:
+    """HTTP status of a failed request: aiohttp and requests errors carry it, Tavily's only in its fixed format"""
+    status = getattr(error, "status", None) or getattr(getattr(error, "response", None), "status_code", None)
+    if isinstance(status, int):
+        return status
+    match = TAVILY_HTTP_ERROR.match(str(error)) if type(error) is Exception else None
+    return int(match.group(1)) if match else None
+
+
+def isRateLimitError(error) -> bool:
+    """
+    Our own refusals (RateLimitedError) and provider 429s: Gemini's are raised
+    as ModelRateLimitError, Tavily's as HTTP errors with status 429.
+    """
+    return isinstance(error, (RateLimitedError, ModelRateLimitError)) or httpStatus(error) == 429
+
+
+class TokenBucket:
+    def __init__(self, ratePerSecond: float, burst: float):
+        self.rate = ratePerSecond
+        self.burst = burst
+        self.tokens = burst
+        self.updatedAt = time.monotonic()
+
+    def _refill(self):
+        now = time.monotonic()
+        self.tokens = min(self.burst, self.tokens + (now - self.updatedAt) * self.rate)
+        self.updatedAt = now
+
+    def delay(self) -> float:
+        """Seconds until a token is available, 0 if one is available now"""
+        self._refill()
+        return 0.0 if self.tokens >= 1 else (1 - self.tokens) / self.rate
+
+    def take(self):
+        self.tokens -= 1
+
+    def pause(self, seconds: float):
+        """No tokens for `seconds`, used after the provider answered 429"""
+        self._refill()
+        self.tokens = min(self.tokens, -seconds * self.rate)
+
+
+class FairScheduler:
+    """
+    Admits upstream calls. Each key (a user's API key, identified by email)
+    has a token bucket sized to the provider quota, and the worker as a whole
+    has one more. Calls over either limit are queued instead of failing, and
+    queued keys are served round-robin so one user with many calls in flight
+    cannot starve the others on this worker.
+
+    A call that would wait longer than `maxWait` raises RateLimitedError.
+    """
+
+    def __init__(self, name: str, ratePerMinute: float, burst: Optional[float] = None, workerRatePerMinute: Optional[float] = None, maxWait: float = 30.0):
+        self.name = name
+        self.rate = ratePerMinute / 60
+        self.burst = burst or ratePerMinute
+        self.maxWait = maxWait
+        # Buckets of idle keys expire; a fresh bucket starts full, as the idle one would be
+        self.buckets = TTLCache(maxEntries=10000, ttl=max(self.burst / self.rate, 60), name=f"{name}Buckets")
+        self.workerBucket = TokenBucket(workerRatePerMinute / 60, workerRatePerMinute) if workerRatePerMinute else None
+        self.queues: "OrderedDict[Hashable, deque]" = OrderedDict()
+        self._dispatcher: Optional[asyncio.Task] = None
+
+    def _bucket(self, key: Hashable) -> TokenBucket:
+        bucket = self.buckets.get(key)
+        if bucket is None:
+            bucket = TokenBucket(self.rate, self.burst)
+        # Re-set on every use so active keys never expire
+        self.buckets.set(key, bucket)
+        return bucket
+
+    def _delay(self, key: Hashable) -> float:
+        delay = self._bucket(key).delay()
+        if self.workerBucket is not None:
+            delay = max(delay, self.workerBucket.delay())
+        return delay
+
+    def _take(self, key: Hashable):
+        self._bucket(key).take()
+        if self.workerBucket is not None:
+            self.workerBucket.take()
+
+    def _queued(self) -> int:
+        return sum(len(queue) for queue in self.queues.values())
+
+    def _expectedWait(self, key: Hashable) -> float:
+        """Rough wait for a new call: the key's own queue at its quota, everything queued at the worker's"""
+        wait = self._bucket(key).delay() + len(self.queues.get(key, ())) / self.rate
+        if self.workerBucket is not None:
+            wait = max(wait, self.workerBucket.delay() + self._queued() / self.workerBucket.rate)
+        return wait
+
+    async def acquire(self, key: Hashable):
+        """Waits until `key` may make one call"""
+        if not self.queues and self._delay(key) == 0:
+            self._take(key)
+            UPSTREAM_QUEUE_WAIT_SECONDS.labels(scheduler=self.name).observe(0)
+            return
+
+        expectedWait = self._expectedWait(key)
+        if expectedWait > self.maxWait:
+            UPSTREAM_RATE_LIMITED.labels(scheduler=self.name, reason="queueFull").inc()
+            raise RateLimitedError(self.name, expectedWait)
+
+        start = time.perf_counter()
+        future = asyncio.get_running_loop().create_future()
+        self.queues.setdefault(key, deque()).append(future)
+        UPSTREAM_QUEUE_DEPTH.labels(scheduler=self.name).inc()
+        if self._dispatcher is None or self._dispatcher.done():
+            self._dispatcher = asyncio.create_task(self._dispatch(), name=f"scheduler:{self.name}")
+        try:
+            await future
+        except asyncio.CancelledError:
+            if not future.done() or future.cancelled():
+                self._dequeue(key, future)
+            raise
+        finally:
+            UPSTREAM_QUEUE_WAIT_SECONDS.labels(scheduler=self.name).observe(time.perf_counter() - start)
+
+    def _dequeue(self, key: Hashable, future: asyncio.Future):
+        queue = self.queues.get(key)
+        if queue is not None and future in queue:
+            queue.remove(future)
+            UPSTREAM_QUEUE_DEPTH.labels(scheduler=self.name).dec()
+            if not queue:
+                del self.queues[key]
+
+    async def _dispatch(self):
+        while self.queues:
+            self._dropCancelled()
+            # The front key is the one served least recently
+            for key, queue in self.queues.items():
+                if self._delay(key) == 0:
+                    self._take(key)
+                    queue.popleft().set_result(None)
+                    UPSTREAM_QUEUE_DEPTH.labels(scheduler=self.name).dec()
+                    if queue:
+                        self.queues.move_to_end(key)
+                    else:
+                        del self.queues[key]
+                    break
+            else:
+                await asyncio.sleep(max(min(self._delay(key) for key in self.queues), MIN_DISPATCH_DELAY))
+
+    def _dropCancelled(self):
+        # Callers cancelled while queued, their own cleanup has not run yet
+        for key in list(self.queues):
+            queue = self.queues[key]
+            while queue and queue[0].done():
+                queue.popleft()
+                UPSTREAM_QUEUE_DEPTH.labels(scheduler=self.name).dec()
+            if not queue:
+                del self.queues[key]
+
+    def backoff(self, key: Hashable, seconds: float = RATE_LIMIT_BACKOFF_SECONDS):
+        """The provider rejected a call with 429 despite the bucket, hold the key's calls"""
+        UPSTREAM_RATE_LIMITED.labels(scheduler=self.name, reason="provider").inc()
+        self._bucket(key).pause(seconds)
+        logger.warning(f"[{self.name}] Provider rate limit for {key}, pausing {seconds:.1f}s")
+
+    def capacity(self) -> int:
+        """Calls an idle key can start at once without a refusal: its full bucket plus what refills within maxWait"""
+        return math.floor(self.burst + self.rate * self.maxWait)
+
+    def limiter(self, key: Hashable) -> "SchedulerRateLimiter":
+        return SchedulerRateLimiter(self, key)
+
+    def stats(self) -> dict:
+        return {
+            "name": self.name,
+            "queued": self._queued(),
+            "queuedKeys": len(self.queues),
+            "keys": len(self.buckets),
+        }
+
+
+class SchedulerRateLimiter(BaseRateLimiter):
+    """
+    LangChain rate limiter that admits one key's model calls through a
+    FairScheduler, so every call the chat model makes (structured, streamed)
+    is scheduled without touching the call sites.
+    """
+
+    def __init__(self, scheduler: FairScheduler, key: Hashable):
+        self.scheduler = scheduler
+        self.key = key
+
+    def acquire(self, *, blocking: bool = True) -> bool:
+        # Sync calls (ingest) block the thread anyway, they only honour the key's bucket
+        delay = self.scheduler._delay(self.key)
+        if delay > 0 and not blocking:
+            return False
+        while delay > 0:
+            time.sleep(delay)
+            delay = self.scheduler._delay(self.key)
+        self.scheduler._take(self.key)
+        return True
+
+    async def aacquire(self, *, blocking: bool = True) -> bool:
+        await self.scheduler.acquire(self.key)
+        return True
+
+
+def getScheduler(provider: str) -> FairScheduler:
+    """
+    Scheduler for a provider whose keys belong to users (see PROVIDER_QUOTAS).
+    <PROVIDER>_REQUESTS_PER_MINUTE sets the per-key quota,
+    <PROVIDER>_WORKER_REQUESTS_PER_MINUTE the share of this worker.
+    """
+    scheduler = _schedulers.get(provider)
+    if scheduler is None:
+        rateEnv, rateDefault = PROVIDER_QUOTAS[provider]
+        workerRate = float(os.getenv(f"{provider.upper()}_WORKER_REQUESTS_PER_MINUTE", "600"))
+        scheduler = FairScheduler(
+            provider,
+            ratePerMinute=float(os.getenv(rateEnv, rateDefault)),
+            workerRatePerMinute=workerRate or None,
+            maxWait=float(os.getenv("RATE_LIMIT_MAX_WAIT_SECONDS", "30")),
+        )
+        _schedulers[provider] = scheduler
+        logger.info(f"Rate limit scheduler initialized for {provider}")
+    return scheduler
@@ -0,0 +1,77 @@
+import os
+import re
+import logging
+import hashlib
+from collections import Counter
+from dotenv import load_dotenv
+from services.cache import AsyncTTLCache, RedisCache
+
+load_dotenv()
+
+logger = logging.getLogger(__name__)
+
+_researchCache = None
+
+# Legal suffixes that do not change which company is meant
+COMPANY_SUFFIXES = {"inc", "incorporated", "llc", "ltd", "limited", "corp", "corporation", "co", "company", "plc", "gmbh", "ag", "sa", "group", "holdings"}
+
+# Words that appear in most postings and say nothing about the company's focus
+FOCUS_STOPWORDS = {
+    "a", "about", "across", "all", "also", "an", "and", "any", "are", "as", "at", "be", "been", "both", "but", "by", "can", "do",
+    "each", "for", "from", "has", "have", "help", "if", "in", "including", "into", "is", "it", "its", "may", "more", "must",
+    "new", "not", "of", "on", "or", "other", "our", "out", "over", "own", "such", "that", "the", "their", "them", "they",
+    "this", "to", "up", "us", "we", "what", "when", "where", "which", "while", "who", "will", "with", "within", "work",
+    "working", "you", "your", "years", "year", "experience", "team", "teams", "role", "job", "skills", "strong", "ability",
+    "looking", "join", "responsibilities", "requirements", "qualifications", "preferred", "required", "plus", "etc",
+    "candidate", "candidates", "opportunity", "position", "company", "knowledge", "understanding", "excellent",
+    "benefits", "salary", "equal", "employer", "apply", "based", "using", "build", "building", "develop", "developing",
+}
+
+FOCUS_AREA_COUNT = 3
+
+
+def normalizeCompanyName(companyName: str) -> str:
+    words = re.findall(r"[a-z0-9]+", companyName.lower())
+    while len(words) > 1 and words[-1] in COMPANY_SUFFIXES:
+        words.pop()
+    return " ".join(words)
+
+
+def extractFocusAreas(jobTitle: str, jobDescription: str, count: int = FOCUS_AREA_COUNT) -> list[str]:
+    """
+    Most frequent meaningful terms in the posting. Cheap and deterministic so
+    the cache key can be built without an LLM call.
+    """
+    words = re.findall(r"[a-z][a-z0-9+#.\-]{2,}", f"{jobTitle} {jobDescription}".lower())
+    counts = Counter(word.strip(".-") for word in words if word.strip(".-") not in FOCUS_STOPWORDS)
+    ranked = sorted(counts.items(), key=lambda item: (-item[1], item[0]))
+    return sorted(word for word, _ in ranked[:count])
+
+
+def researchCacheKey(companyName: str, jobTitle: str, jobDescription: str) -> str:
+    focusAreas = extractFocusAreas(jobTitle, jobDescription)
+    raw = f"{normalizeCompanyName(companyName)}|{','.join(focusAreas)}"
+    return hashlib.sha256(raw.encode("utf-8")).hexdigest()
+
+
+def getResearchCache():
+    """
+    Returns the shared company research cache. In-process by default, set
+    RESEARCH_CACHE_BACKEND=redis (with REDIS_URL) to share it between workers.
+    """
+    global _researchCache
+    if _researchCache is None:
+        backend = os.getenv("RESEARCH_CACHE_BACKEND", "memory").lower()
+        ttl = float(os.getenv("RESEARCH_CACHE_TTL_SECONDS", "43200"))
+        if backend == "redis":
+            redisUrl = os.getenv("REDIS_URL")
+            if not redisUrl:
+                raise ValueError("Missing REDIS_URL in .env file")
+            _researchCache = RedisCache(redisUrl, ttl=ttl, name="companyResearch")
+        elif backend == "memory":
+            maxEntries = int(os.getenv("RESEARCH_CACHE_MAX_ENTRIES", "500"))
+            _researchCache = AsyncTTLCache(maxEntries=maxEntries, ttl=ttl, name="companyResearch")
+        else:
+            raise ValueError(f"Unknown RESEARCH_CACHE_BACKEND {backend}")
+        logger.info(f"Company research cache initialized ({backend})")
+    return _researchCache
@@ -0,0 +1,138 @@
+import os
+import re
+import logging
+from collections import Counter
+import numpy as np
+from dotenv import load_dotenv
+
+load_dotenv()
+
+logger = logging.getLogger(__name__)
+
+_researchClassifier = None
+
+# Phrasings that always need company research
+RESEARCH_PATTERNS = [
+    r"\bwhy (do|would) you want to (work|join)\b",
+    r"\bwhy (are you interested in|do you want to join) (us|our|this company|the company)\b",
+    r"\bwhat (interests|excites|attracts) you about (us|our|the company|this company)\b",
+    r"\b(our|the company'?s) (mission|values|culture|products?|vision|customers)\b",
+    r"\balign with (our|the company'?s)\b",
+    r"\bwhy (here|us)\b",
+]
+
+# Phrasings about the candidate's own history that never need it
+NO_RESEARCH_PATTERNS = [
+    r"\btell (me|us) about a time\b",
+    r"\bdescribe a (time|situation|project|challenge)\b",
+    r"\b(greatest|biggest) (strength|weakness|accomplishment|achievement)\b",
+    r"\bwhat is your experience with\b",
+    r"\bwalk (me|us) through\b",
+    r"\bhow do you (handle|approach|prioritize|deal with)\b",
+]
+
+# Labelled questions for nearest-neighbour classification (True = needs company research)
+LABELLED_QUESTIONS = [
+    ("Why do you want to work here?", True),
+    ("What interests you about our company?", True),
+    ("Why are you interested in joining our team?", True),
+    ("How do your values align with our mission?", True),
+    ("What do you know about our products?", True),
+    ("Which of our recent initiatives excites you the most?", True),
+    ("How would you contribute to our company goals?", True),
+    ("What attracts you to our culture?", True),
+    ("Why this company over our competitors?", True),
+    ("What do you think of our latest product launch?", True),
+    ("Tell me about a challenging project you worked on.", False),
+    ("Describe a time you resolved a conflict on your team.", False),
+    ("What is your greatest technical accomplishment?", False),
+    ("How do you prioritize competing deadlines?", False),
+    ("Describe your experience with distributed systems.", False),
+    ("Tell me about a time you failed and what you learned.", False),
+    ("What programming languages are you most comfortable with?", False),
+    ("Walk me through a system you designed end to end.", False),
+    ("How do you approach debugging a production issue?", False),
+    ("Describe a time you led a project without formal authority.", False),
+]
+
+
+class ResearchClassifier:
+    """
+    Local fast path for companyResearchDecision: keyword rules first, then a
+    similarity-weighted vote among the nearest labelled questions. Returns the
+    decision together with a confidence so callers can fall back to the LLM.
+    """
+
+    def __init__(self, neighbours: int = 5, confidenceThreshold: float = 0.8, minSimilarity: float = 0.6):
+        self.neighbours = neighbours
+        self.confidenceThreshold = confidenceThreshold
+        self.minSimilarity = minSimilarity
+        self.researchPatterns = [re.compile(pattern, re.IGNORECASE) for pattern in RESEARCH_PATTERNS]
+        self.noResearchPatterns = [re.compile(pattern, re.IGNORECASE) for pattern in NO_RESEARCH_PATTERNS]
+        self.bankMatrix = None
+        self.bankLabels = np.array([label for _, label in LABELLED_QUESTIONS], dtype=bool)
+        self.sources = Counter()
+
+    async def loadBank(self, embedder, batchEmbedder):
+        """Embeds the labelled bank once, in a single Voyage call"""
+        if self.bankMatrix is not None:
+            return
+        vectors = np.asarray(await batchEmbedder([question for question, _ in LABELLED_QUESTIONS], embedder), dtype=np.float32)
+        self.bankMatrix = vectors / np.linalg.norm(vectors, axis=1, keepdims=True)
+        logger.info(f"Research classifier bank loaded ({len(LABELLED_QUESTIONS)} questions)")
+
+    def classifyByRules(self, question: str):
+        research = any(pattern.search(question) for pattern in self.researchPatterns)
+        noResearch = any(pattern.search(question) for pattern in self.noResearchPatterns)
+        if research != noResearch:
+            return research, 1.0
+        return None, 0.0
+
+    def classifyByNeighbours(self, questionEmbedding):
+        if self.bankMatrix is None or questionEmbedding is None:
+            return None, 0.0
+        vector = np.asarray(questionEmbedding, dtype=np.float32)
+        similarities = self.bankMatrix @ (vector / np.linalg.norm(vector))
+        nearest = np.argsort(similarities)[::-1][:self.neighbours]
+        nearest = nearest[similarities[nearest] >= self.minSimilarity]
+        if nearest.size == 0:
+            return None, 0.0
+        weights = similarities[nearest]
+        researchWeight = float(weights[self.bankLabels[nearest]].sum())
+        confidence = max(researchWeight, float(weights.sum()) - researchWeight) / float(weights.sum())
+        return researchWeight * 2 >= float(weights.sum()), confidence
+
+    def classify(self, question: str, questionEmbedding=None):
+        """Returns (decision, confidence, source). decision is None when the LLM should decide"""
+        decision, confidence = self.classifyByRules(question)
+        if decision is not None:
+            return self._record(decision, confidence, "rules")
+        decision, confidence = self.classifyByNeighbours(questionEmbedding)
+        if decision is not None and confidence >= self.confidenceThreshold:
+            return self._record(decision, confidence, "neighbours")
+        return self._record(None, confidence, "llm")
+
+    def _record(self, decision, confidence: float, source: str):
+        self.sources[source] += 1
+        return decision, confidence, source
+
+    def stats(self) -> dict:
+        total = sum(self.sources.values())
+        return {
+            "sources": dict(self.sources),
+            "fallbackRate": self.sources["llm"] / total if total else 0.0,
+        }
+
+
+def researchClassifierEnabled() -> bool:
+    return os.getenv("RESEARCH_CLASSIFIER_ENABLED", "true").lower() == "true"
+
+
+def getResearchClassifier() -> ResearchClassifier:
+    global _researchClassifier
+    if _researchClassifier is None:
+        _researchClassifier = ResearchClassifier(
+            confidenceThreshold=float(os.getenv("RESEARCH_CLASSIFIER_CONFIDENCE", "0.8")),
+        )
+        logger.info("Research classifier initialized")
+    return _researchClassifier
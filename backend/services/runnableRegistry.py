@@ -0,0 +1,75 @@
+import os
+import logging
+import weakref
+from dotenv import load_dotenv
+from services.cache import TTLCache
+
+load_dotenv()
+
+logger = logging.getLogger(__name__)
+
+# Prompts are module-level constants next to the code that uses them, built
+# once at import. What depends on a model instance, the structured-output
+# runnables and the chunkers built around it, lives in that model's
+# RunnableRegistry. UserClients owns the registry of each user's LLM, so it
+# goes away, decrypted key included, when the user's clients are dropped.
+_registries = weakref.WeakValueDictionary()
+_sharedInstances = TTLCache(maxEntries=int(os.getenv("RUNNABLE_REGISTRY_MAX_ENTRIES", "256")), name="sharedInstances")
+
+
+class RunnableRegistry:
+    """
+    Runnables built once for one model. Held by the model's owner; while it
+    is alive structuredModel and sharedInstance reuse what it has built.
+    """
+
+    def __init__(self, model):
+        self.model = model
+        self.structuredModels = {}
+        self.instances = {}
+        # The registry holds the model, so the id cannot be reused while it is registered
+        _registries[id(model)] = self
+
+
+def registryFor(model):
+    registry = _registries.get(id(model))
+    if registry is not None and registry.model is model:
+        return registry
+    return None
+
+
+def structuredModel(model, schema, **kwargs):
+    """model.with_structured_output(schema, **kwargs), built once per schema while the model's registry lives"""
+    registry = registryFor(model)
+    if registry is None:
+        return model.with_structured_output(schema, **kwargs)
+    key = (schema, tuple(sorted(kwargs.items())))
+    runnable = registry.structuredModels.get(key)
+    if runnable is None:
+        runnable = model.with_structured_output(schema, **kwargs)
+        registry.structuredModels[key] = runnable
+        logger.info(f"Built structured runnable for {schema.__name__}")
+    return runnable
+
+
+def sharedInstance(cls, arg):
+    """
+    One cls(arg) per argument, e.g. a ResumeChunker per LLM or a TextExtractor
+    per model name. Their prompts and clients are built in __init__, so
+    reusing them keeps that work out of every ingest request. Instances built
+    around a model are kept in its registry, others in a shared LRU.
+    """
+    if isinstance(arg, str):
+        instance = _sharedInstances.get((cls, arg))
+        if instance is None:
+            instance = cls(arg)
+            _sharedInstances.set((cls, arg), instance)
+        return instance
+    registry = registryFor(arg)
+    if registry is None:
+        return cls(arg)
+    instance = registry.instances.get(cls)
+    if instance is None:
+        instance = cls(arg)
+        registry.instances[cls] = instance
+    return instance
@@ -0,0 +1,114 @@
+import os
+import time
+import logging
+import numpy as np
+from dotenv import load_dotenv
+from services.metrics import SEMANTIC_CACHE_LOOKUPS, SEMANTIC_CACHE_HIT_RATE
+
+load_dotenv()
+
+logger = logging.getLogger(__name__)
+
+_semanticCaches = {}
+
+
+class SemanticCache:
+    """
+    Reuses results for questions whose embeddings are close to one seen before.
+
+    Entries live in a fixed-size float32 matrix of unit vectors, so a lookup is
+    one matrix-vector product. When full, the least recently used entry is
+    replaced.
+    """
+
+    def __init__(self, name: str, threshold: float, maxEntries: int, ttl: float):
+        self.name = name
+        self.threshold = threshold
+        self.maxEntries = maxEntries
+        self.ttl = ttl
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+        self._matrix = None
+        self._values = [None] * maxEntries
+        self._texts = [None] * maxEntries
+        self._expiresAt = np.zeros(maxEntries, dtype=np.float64)
+        self._lastUsed = np.zeros(maxEntries, dtype=np.int64)
+        self._occupied = np.zeros(maxEntries, dtype=bool)
+        self._clock = 0
+
+    @staticmethod
+    def _normalize(embedding) -> np.ndarray:
+        vector = np.asarray(embedding, dtype=np.float32)
+        norm = np.linalg.norm(vector)
+        return vector / norm if norm else vector
+
+    def _live(self) -> np.ndarray:
+        return self._occupied & (self._expiresAt >= time.monotonic())
+
+    def lookup(self, embedding, text: str = ""):
+        """Returns the cached value for the closest question above the threshold, or None"""
+        live = self._live()
+        if self._matrix is None or not live.any():
+            self._record(hit=False)
+            return None
+
+        similarities = self._matrix @ self._normalize(embedding)
+        similarities[~live] = -np.inf
+        best = int(np.argmax(similarities))
+        if similarities[best] < self.threshold:
+            self._record(hit=False)
+            return None
+
+        self._clock += 1
+        self._lastUsed[best] = self._clock
+        self._record(hit=True)
+        logger.info(f"Semantic cache {self.name} hit ({similarities[best]:.3f}): '{text}' ~ '{self._texts[best]}'")
+        return self._values[best]
+
+    def _record(self, hit: bool):
+        if hit:
+            self.hits += 1
+        else:
+            self.misses += 1
+        SEMANTIC_CACHE_LOOKUPS.labels(cache=self.name, outcome="hit" if hit else "miss").inc()
+        SEMANTIC_CACHE_HIT_RATE.labels(cache=self.name).set(self.hits / (self.hits + self.misses))
+
+    def store(self, embedding, text: str, value):
+        vector = self._normalize(embedding)
+        if self._matrix is None:
+            self._matrix = np.zeros((self.maxEntries, vector.shape[0]), dtype=np.float32)
+
+        live = self._live()
+        free = np.flatnonzero(~live)
+        if free.size:
+            slot = int(free[0])
+        else:
+            slot = int(np.argmin(self._lastUsed))
+            self.evictions += 1
+
+        self._clock += 1
+        self._matrix[slot] = vector
+        self._values[slot] = value
+        self._texts[slot] = text
+        self._expiresAt[slot] = time.monotonic() + self.ttl
+        self._lastUsed[slot] = self._clock
+        self._occupied[slot] = True
+
+
+def semanticCacheEnabled() -> bool:
+    return os.getenv("SEMANTIC_CACHE_ENABLED", "true").lower() == "true"
+
+
+def getSemanticCache(name: str) -> SemanticCache:
+    """Returns the named semantic cache, creating it from the SEMANTIC_CACHE_* settings on first use"""
+    if name not in _semanticCaches:
+        _semanticCaches[name] = SemanticCache(
+            name,
+            threshold=float(os.getenv("SEMANTIC_CACHE_THRESHOLD", "0.93")),
+            maxEntries=int(os.getenv("SEMANTIC_CACHE_MAX_ENTRIES", "1000")),
+            ttl=float(os.getenv("SEMANTIC_CACHE_TTL_SECONDS", "604800")),
+        )
+        logger.info(f"Semantic cache {name} initialized")
+    return _semanticCaches[name]
@@ -0,0 +1,81 @@
+import os
+import asyncio
+import logging
+from typing import Any, Awaitable, Callable, Hashable
+from dotenv import load_dotenv
+from services.cache import TTLCache, MISSING
+
+load_dotenv()
+
+logger = logging.getLogger(__name__)
+
+_answerFlight = None
+
+
+class SingleFlight:
+    """
+    Runs at most one call per key at a time. Callers that arrive while it is
+    running await the same result instead of starting their own, and results
+    the `cacheable` check accepts are served for another `window` seconds so
+    retries fired just after completion are absorbed too.
+
+    The shared call is shielded: a caller that disconnects does not cancel it
+    for the others, and its result still lands in the window.
+    """
+
+    def __init__(self, name: str, window: float, maxEntries: int = 1000, cacheable: Callable[[Any], bool] = None):
+        self.name = name
+        self.window = window
+        self.cacheable = cacheable or (lambda result: True)
+        self.recent = TTLCache(maxEntries=maxEntries, ttl=window, name=name)
+        self._inFlight = {}
+        self.executions = 0
+        self.coalesced = 0
+
+    async def do(self, key: Hashable, call: Callable[[], Awaitable[Any]]) -> Any:
+        result = self.recent.get(key, MISSING)
+        if result is not MISSING:
+            logger.info(f"[{self.name}] Served {str(key)[:12]} from the completion window")
+            return result
+
+        task = self._inFlight.get(key)
+        if task is None:
+            self.executions += 1
+            task = asyncio.ensure_future(call())
+            self._inFlight[key] = task
+            task.add_done_callback(lambda done: self._finish(key, done))
+        else:
+            self.coalesced += 1
+            logger.info(f"[{self.name}] Joined in-flight call {str(key)[:12]}")
+        return await asyncio.shield(task)
+
+    def _finish(self, key: Hashable, task: asyncio.Future):
+        self._inFlight.pop(key, None)
+        if task.cancelled() or task.exception() is not None or self.window <= 0:
+            return
+        if self.cacheable(task.result()):
+            self.recent.set(key, task.result())
+
+    def stats(self) -> dict:
+        return {
+            "name": self.name,
+            "inFlight": len(self._inFlight),
+            "executions": self.executions,
+            "coalesced": self.coalesced,
+            "windowHits": self.recent.hits,
+        }
+
+
+def getAnswerFlight() -> SingleFlight:
+    """Coalesces identical /job/answer requests, successful answers are replayed for ANSWER_DEDUP_WINDOW_SECONDS"""
+    global _answerFlight
+    if _answerFlight is None:
+        _answerFlight = SingleFlight(
+            "answerRequests",
+            window=float(os.getenv("ANSWER_DEDUP_WINDOW_SECONDS", "30")),
+            maxEntries=int(os.getenv("ANSWER_DEDUP_MAX_ENTRIES", "1000")),
+            # (content, status) pairs, only successful answers are replayed
+            cacheable=lambda result: result[1] == 200,
+        )
+        logger.info("Answer request coalescing initialized")
+    return _answerFlight
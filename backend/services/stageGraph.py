@@ -0,0 +1,213 @@
+import asyncio
+import logging
+import time
+from typing import Any, Awaitable, Callable, Dict, List, Optional, Union
+from services.metrics import recordStage, outcomeOf
+
+logger = logging.getLogger(__name__)
+
+# Result stored for stages that were gated off or cancelled
+SKIPPED = None
+
+
+# Stage timeout in seconds, or a callable evaluated when the stage starts
+Timeout = Union[float, Callable[[], float], None]
+
+
+class Stage:
+    def __init__(self, name: str, run: Callable[[Dict[str, Any]], Awaitable[Any]], deps: List[str], gate: Optional[str], when: Optional[Callable[[Any], bool]], timeout: Timeout = None, fallback: Optional[Callable[[Dict[str, Any]], Any]] = None):
+        self.name = name
+        self.run = run
+        self.deps = deps
+        self.gate = gate
+        self.when = when
+        self.timeout = timeout
+        self.fallback = fallback
+
+
+class LatencyBudget:
+    """
+    Deadline for one request, split across stages. Optional stages get at
+    most their own cap and must leave `reserve` seconds for the stages after
+    them; required stages get whatever is left.
+    """
+
+    def __init__(self, seconds: float, reserve: float):
+        self.seconds = seconds
+        self.reserve = reserve
+        self.deadline = time.monotonic() + seconds
+
+    def remaining(self) -> float:
+        return max(0.0, self.deadline - time.monotonic())
+
+    def optional(self, cap: float) -> Callable[[], float]:
+        return lambda: min(cap, self.remaining() - self.reserve)
+
+    def required(self) -> Callable[[], float]:
+        return self.remaining
+
+
+class StageGraph:
+    """
+    Runs async pipeline stages as soon as their dependencies finish.
+
+    A stage can be gated on another stage's result: it starts speculatively
+    alongside the gate and is cancelled (its result becomes None) if `when`
+    returns False for the gate's result. Stages that depend on a skipped stage
+    still run and see None for it.
+
+    A stage with a `timeout` is cancelled when it runs over. If it also has a
+    `fallback`, the fallback's value becomes its result and the stage is
+    listed in `.degraded`; a stage whose timeout is already used up when it
+    starts goes straight to the fallback. Without a fallback the timeout
+    fails the graph with TimeoutError.
+
+    `onStageComplete(name, result, skipped)` is called as each stage settles,
+    which lets callers report progress before the whole graph is done.
+    """
+
+    def __init__(self, name: str = "pipeline", onStageComplete: Optional[Callable[[str, Any, bool], None]] = None):
+        self.name = name
+        self.onStageComplete = onStageComplete
+        self.stages: Dict[str, Stage] = {}
+        self.results: Dict[str, Any] = {}
+        self.skipped: List[str] = []
+        self.degraded: List[str] = []
+        self.durations: Dict[str, float] = {}
+        self._done: Dict[str, asyncio.Event] = {}
+
+    def addStage(self, name: str, run: Callable[[Dict[str, Any]], Awaitable[Any]], deps: Optional[List[str]] = None, gate: Optional[str] = None, when: Optional[Callable[[Any], bool]] = None, timeout: Timeout = None, fallback: Optional[Callable[[Dict[str, Any]], Any]] = None):
+        if name in self.stages:
+            raise ValueError(f"Stage {name} already registered")
+        if gate is not None and when is None:
+            raise ValueError(f"Stage {name} has a gate but no condition")
+        self.stages[name] = Stage(name, run, deps or [], gate, when, timeout, fallback)
+        return self
+
+    def _validate(self):
+        for stage in self.stages.values():
+            for dep in stage.deps + ([stage.gate] if stage.gate else []):
+                if dep not in self.stages:
+                    raise ValueError(f"Stage {stage.name} depends on unknown stage {dep}")
+
+    async def _waitFor(self, names: List[str]):
+        for name in names:
+            await self._done[name].wait()
+
+    async def _timed(self, stage: Stage):
+        start = time.perf_counter()
+        outcome = "success"
+        try:
+            timeout = stage.timeout() if callable(stage.timeout) else stage.timeout
+            if timeout is None:
+                return await stage.run(self.results)
+            if timeout <= 0 and stage.fallback is not None:
+                outcome = "degraded"
+                return self._degrade(stage, "no budget left")
+            try:
+                return await asyncio.wait_for(stage.run(self.results), max(timeout, 0))
+            except asyncio.TimeoutError:
+                if stage.fallback is None:
+                    raise asyncio.TimeoutError(f"Stage {stage.name} timed out after {timeout:.2f}s")
+                outcome = "degraded"
+                return self._degrade(stage, f"timed out after {timeout:.2f}s")
+        except BaseException as e:
+            outcome = outcomeOf(e)
+            raise
+        finally:
+            self.durations[stage.name] = time.perf_counter() - start
+            recordStage(f"graph.{self.name}.{stage.name}", self.durations[stage.name], outcome)
+
+    def _degrade(self, stage: Stage, reason: str):
+        self.degraded.append(stage.name)
+        logger.warning(f"[{self.name}] Stage {stage.name} degraded ({reason}), using fallback")
+        return stage.fallback(self.results)
+
+    def _skip(self, stage: Stage):
+        self.results[stage.name] = SKIPPED
+        self.skipped.append(stage.name)
+        if stage.name in self.degraded:
+            # A speculative stage that fell back but turned out not to be needed
+            self.degraded.remove(stage.name)
+        logger.info(f"[{self.name}] Skipped stage {stage.name}")
+
+    def _failed(self, names: List[str]) -> bool:
+        # A dependency that finished without a result raised; run() reports that error
+        return any(name not in self.results for name in names)
+
+    async def _runStage(self, stage: Stage):
+        await self._waitFor(stage.deps)
+        if self._failed(stage.deps):
+            return
+
+        if stage.gate is None:
+            self.results[stage.name] = await self._timed(stage)
+            return
+
+        gateEvent = self._done[stage.gate]
+        if gateEvent.is_set():
+            if self._failed([stage.gate]):
+                return
+            # Gate already decided, no speculation needed
+            if stage.when(self.results[stage.gate]):
+                self.results[stage.name] = await self._timed(stage)
+            else:
+                self._skip(stage)
+            return
+
+        work = asyncio.create_task(self._timed(stage))
+        gateWait = asyncio.create_task(gateEvent.wait())
+        try:
+            await asyncio.wait({work, gateWait}, return_when=asyncio.FIRST_COMPLETED)
+            if not gateWait.done():
+                # Finished before the gate: hold the result until we know it is wanted
+                await gateWait
+        except asyncio.CancelledError:
+            work.cancel()
+            gateWait.cancel()
+            raise
+
+        if self._failed([stage.gate]):
+            work.cancel()
+            return
+
+        if stage.when(self.results[stage.gate]):
+            self.results[stage.name] = await work
+        else:
+            if not work.done():
+                work.cancel()
+                logger.info(f"[{self.name}] Cancelled speculative stage {stage.name}")
+            elif not work.cancelled() and work.exception() is not None:
+                logger.info(f"[{self.name}] Discarded failed speculative stage {stage.name}: {work.exception()}")
+            self._skip(stage)
+
+    async def _runAndSignal(self, stage: Stage):
+        try:
+            await self._runStage(stage)
+        finally:
+            self._done[stage.name].set()
+        if self.onStageComplete is not None and stage.name in self.results:
+            self.onStageComplete(stage.name, self.results[stage.name], stage.name in self.skipped)
+
+    async def run(self) -> Dict[str, Any]:
+        """Run every stage and return the results keyed by stage name"""
+        self._validate()
+        self._done = {name: asyncio.Event() for name in self.stages}
+        start = time.perf_counter()
+
+        tasks = [asyncio.create_task(self._runAndSignal(stage), name=f"{self.name}:{stage.name}") for stage in self.stages.values()]
+        try:
+            # Fail fast: the first stage error cancels everything still running
+            done, pending = await asyncio.wait(tasks, return_when=asyncio.FIRST_EXCEPTION)
+            for task in done:
+                if task.exception() is not None:
+                    raise task.exception()
+        finally:
+            for task in tasks:
+                if not task.done():
+                    task.cancel()
+            await asyncio.gather(*tasks, return_exceptions=True)
+
+        timings = ", ".join(f"{name}={seconds:.2f}s" for name, seconds in self.durations.items())
+        logger.info(f"[{self.name}] Completed in {time.perf_counter() - start:.2f}s ({timings})")
+        return self.results
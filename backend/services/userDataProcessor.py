@@ -2,15 +2,124 @@ from .textExtractor import TextExtractor
 from .resumeChunker import ResumeChunker
 from .linkedinChunker import LinkedinChunker
 import json
+import hashlib
 from langchain_core.output_parsers import PydanticOutputParser
 from langchain_core.prompts import ChatPromptTemplate
 from .outputSchemas import UnifiedSemanticChunks, DeduplicationResult
 import logging
 from collections import defaultdict
-
-
-
-
+from .localVectorIndex import getLocalVectorStore, lexicalIndexPath
+from .lexicalIndex import LexicalIndex
+from .dependencies import uploadJson
+from .runnableRegistry import structuredModel, sharedInstance
+from .metrics import timed, PROFILE_CHUNKS
+from .embeddingStore import embedWithStore
+
+
+
+
+
+SORTING_PROMPT = ChatPromptTemplate.from_messages([
+    ("system", 
+            """You are an expert at analyzing professional experience data to identify duplicates and similar entries.
+
+Your task is to carefully review a list of experience/project entries and determine which ones describe the SAME experience (just worded differently) versus which ones are TRULY UNIQUE experiences.
+
+**Criteria for considering entries as SIMILAR/DUPLICATES:**
+Two entries are duplicates ONLY if ALL of these conditions are true:
+1. Same company/organization name (accounting for minor variations in naming)
+2. Overlapping or identical date ranges
+3. Same or equivalent job title/role describing the same position
+4. Same or equivalent location
+5. Describing the same core responsibilities and accomplishments (even if worded differently)
+
+**Criteria for considering entries as UNIQUE:**
+Entries are UNIQUE if ANY of these conditions are true:
+- Different companies/organizations
+- Non-overlapping time periods
+- Different job titles or roles at the SAME company (multiple positions at one organization are separate experiences)
+- Different locations for the same company
+- Different projects or initiatives
+- Different sets of responsibilities and accomplishments
+
+**IMPORTANT DISTINCTIONS:**
+- Multiple distinct roles at the SAME organization = SEPARATE experiences (not duplicates)
+- Different positions held simultaneously or sequentially at same org = NOT duplicates
+- Leadership role vs individual contributor role at same org = different experiences
+- Different departments/teams at same company = typically different experiences
+
+**CRITICAL OUTPUT RULES:**
+1. A group in "similar" MUST contain EXACTLY 2 or more entries describing the IDENTICAL experience
+2. If an entry has NO duplicates, it MUST go in "unsimilar"
+3. NEVER create single-item groups in "similar"
+4. Be conservative - when uncertain whether two entries represent the same experience, treat them as unique
+5. Focus on whether entries describe the same position/role, not just the same organization
+
+Return your analysis in JSON format with "similar" and "unsimilar" keys."""
+    ),
+    ("user", """Please analyze the following list of experience entries and identify which ones are duplicates/similar (describing the same experience) versus which are truly unique.
+
+**Entries to analyze:**
+{entries_json}
+
+Carefully compare each entry. Remember:
+- Same organization + different roles/titles = UNIQUE entries (not duplicates)
+- Only group entries if they describe the EXACT SAME position/role with different wording
+- Multiple positions at one company should remain separate
+
+Return the result with:
+- "similar": List of lists, where each inner list contains 2+ entries describing the IDENTICAL experience/position
+- "unsimilar": List of entries that have no duplicates and are truly unique experiences
+
+Be conservative - if there's any doubt whether two entries represent the same position, treat them as unique.""")
+])
+
+MERGE_PROMPT = ChatPromptTemplate.from_messages([
+    ("system" , 
+        """
+            You are a chunk consolidation assistant. 
+            - Your task is to merge groups of similar text chunks into one standardized chunk. 
+            - Each of the chunks you have merge are contained in list and these chunks that are about the same experience, skill, project or entity.
+            - Each group of similar chunks is seperated by lists.
+            Follow these rules strictly:
+
+                1. Combine the "embedding_text" values in each group summarizing it into a single coherent description.
+                    - Preserve all essential details such as responsibilities, impact, metrics, tools, and outcomes.
+                    - Eliminate redundancy but do not remove unique information.
+                    - Keep the summary professional, third-person, and concise do not change the tone or format of how the text is written.
+                    - Each summary should be between 100-250 words.
+                    - Do not include bullet points or markdown.
+                2. Merge the "metadata" dictionaries in each group:
+                    - "date_range": Use the most specific or precise date range available (prefer explicit months and years over broad ranges).
+                    - "company": Use the most complete and standardized company name available. If multiple companies are present, list them all.
+                    - "job_title": Use the most descriptive or senior-sounding title from the group.
+                    - "location": Use the most detailed form of the location.
+                    - "section_type": Keep consistent with the group (Experience, Education, Projects, Skills, etc).
+                    - "chunk_id": Omit this field in the final output.
+                3. Do not invent new details — only merge and rephrase information present in the group.
+                4. Ensure the final output is valid JSON with the structure:
+                {format_instructions}
+                5. Do not include any extra commentary or text outside the JSON object.
+    """
+    ),
+    ("user" ,"""
+        Here are groups of chunks that were validated as similar:
+
+        Groups:
+        {similar_chunks_json}
+
+    """)
+])
+DOCUMENT_EMBEDDING_MODEL = "voyage-3.5"
+DOCUMENT_EMBEDDING_DIMENSION = 1024
+
+MERGE_PARSER = PydanticOutputParser(pydantic_object=UnifiedSemanticChunks)
+MERGE_PROMPT = MERGE_PROMPT.partial(format_instructions=MERGE_PARSER.get_format_instructions())
+
+def chunkHash(chunk: dict) -> str:
+    """Identifies a profile chunk by its text and metadata, the two things stored with its embedding"""
+    content = json.dumps({"text": chunk['embedding_text'], "metadata": chunk.get('metadata')}, sort_keys=True, ensure_ascii=False)
+    return hashlib.sha256(content.encode('utf-8')).hexdigest()
 
 class ProcessUserData:
 
@@ -33,13 +142,14 @@ class ProcessUserData:
     @property
     def resumeExtractor(self):
         if self._resumeExtractor is None:
-            self._resumeExtractor = TextExtractor(self.modelName)
+            self._resumeExtractor = sharedInstance(TextExtractor, self.modelName)
         return self._resumeExtractor
 
     async def extractResume(self, uploadedPdf):
         try:
             self.logger.info(f"Starting resume extraction for: {uploadedPdf.filename}")
-            extracted_text = await self._resumeExtractor.extractFromPdf(uploadedPdf)
+            with timed("llm.extractResume"):
+                extracted_text = await self._resumeExtractor.extractFromPdf(uploadedPdf)
             self.logger.info(f"Resume extraction completed successfully for: {uploadedPdf.filename}")
             return extracted_text
             
@@ -59,21 +169,23 @@ class ProcessUserData:
     @property
     def resumeChunker(self):
         if self._resumeChunker is None:
-            self._resumeChunker = ResumeChunker(self.llm)
+            self._resumeChunker = sharedInstance(ResumeChunker, self.llm)
         return self._resumeChunker 
 
     async def chunkResume(self, resumeText):
-        return await self._resumeChunker.createResumeChunks(resumeText)
+        with timed("llm.chunkResume"):
+            return await self._resumeChunker.createResumeChunks(resumeText)
 
 
     @property
     def linkedinChunker(self):
         if self._linkedinChunker is None:
-            self._linkedinChunker = LinkedinChunker(self.llm)
+            self._linkedinChunker = sharedInstance(LinkedinChunker, self.llm)
         return self._linkedinChunker
     
     async def chunkLinkedin(self, linkedinText):
-        return await self._linkedinChunker.createLinkedinChunks(linkedinText)
+        with timed("llm.chunkLinkedin"):
+            return await self._linkedinChunker.createLinkedinChunks(linkedinText)
 
 
     def fuzzy_match(self, str1, str2, threshold=0.85):
@@ -265,175 +377,130 @@ class ProcessUserData:
 
     async def sortChunks(self, unsimilarChunks):
         self.logger.info(f"Starting LLM validation chunks {len(unsimilarChunks) }")
-        sortingPrompt = ChatPromptTemplate.from_messages([
-                ("system", 
-                    """You are an expert at analyzing professional experience data to identify duplicates and similar entries.
-
-        Your task is to carefully review a list of experience/project entries and determine which ones describe the SAME experience (just worded differently) versus which ones are TRULY UNIQUE experiences.
-
-        **Criteria for considering entries as SIMILAR/DUPLICATES:**
-        Two entries are duplicates ONLY if ALL of these conditions are true:
-        1. Same company/organization name (accounting for minor variations in naming)
-        2. Overlapping or identical date ranges
-        3. Same or equivalent job title/role describing the same position
-        4. Same or equivalent location
-        5. Describing the same core responsibilities and accomplishments (even if worded differently)
-
-        **Criteria for considering entries as UNIQUE:**
-        Entries are UNIQUE if ANY of these conditions are true:
-        - Different companies/organizations
-        - Non-overlapping time periods
-        - Different job titles or roles at the SAME company (multiple positions at one organization are separate experiences)
-        - Different locations for the same company
-        - Different projects or initiatives
-        - Different sets of responsibilities and accomplishments
-
-        **IMPORTANT DISTINCTIONS:**
-        - Multiple distinct roles at the SAME organization = SEPARATE experiences (not duplicates)
-        - Different positions held simultaneously or sequentially at same org = NOT duplicates
-        - Leadership role vs individual contributor role at same org = different experiences
-        - Different departments/teams at same company = typically different experiences
-
-        **CRITICAL OUTPUT RULES:**
-        1. A group in "similar" MUST contain EXACTLY 2 or more entries describing the IDENTICAL experience
-        2. If an entry has NO duplicates, it MUST go in "unsimilar"
-        3. NEVER create single-item groups in "similar"
-        4. Be conservative - when uncertain whether two entries represent the same experience, treat them as unique
-        5. Focus on whether entries describe the same position/role, not just the same organization
-
-        Return your analysis in JSON format with "similar" and "unsimilar" keys."""
-                ),
-                ("user", """Please analyze the following list of experience entries and identify which ones are duplicates/similar (describing the same experience) versus which are truly unique.
-
-        **Entries to analyze:**
-        {entries_json}
-
-        Carefully compare each entry. Remember:
-        - Same organization + different roles/titles = UNIQUE entries (not duplicates)
-        - Only group entries if they describe the EXACT SAME position/role with different wording
-        - Multiple positions at one company should remain separate
-
-        Return the result with:
-        - "similar": List of lists, where each inner list contains 2+ entries describing the IDENTICAL experience/position
-        - "unsimilar": List of entries that have no duplicates and are truly unique experiences
-
-        Be conservative - if there's any doubt whether two entries represent the same position, treat them as unique.""")
-            ])
-        structured_llm = self.llm.with_structured_output(DeduplicationResult)
-        chain = sortingPrompt | structured_llm
+        structured_llm = structuredModel(self.llm, DeduplicationResult)
+        chain = SORTING_PROMPT | structured_llm
         
-        result = chain.invoke({
-            "entries_json": json.dumps(unsimilarChunks, indent=2, ensure_ascii=False)
-        })
+        with timed("llm.sortChunks"):
+            result = chain.invoke({
+                "entries_json": json.dumps(unsimilarChunks, indent=2, ensure_ascii=False)
+            })
 
         sortedResponse = result.model_dump()
         self.logger.info(f"After LLM validation, {len(sortedResponse['similar'])} groups of similar chunks and {len(sortedResponse['unsimilar'])} unsimilar chunks remain.")
         return sortedResponse
 
     async def mergeChunks(self, similarChunks):
-        deDuplicateSchema = PydanticOutputParser(pydantic_object=UnifiedSemanticChunks)
-        deDuplicateSchemaInstructions = deDuplicateSchema.get_format_instructions()
-        deDuplicatePrompt = ChatPromptTemplate.from_messages([
-            ("system" , 
-                """
-                    You are a chunk consolidation assistant. 
-                    - Your task is to merge groups of similar text chunks into one standardized chunk. 
-                    - Each of the chunks you have merge are contained in list and these chunks that are about the same experience, skill, project or entity.
-                    - Each group of similar chunks is seperated by lists.
-                    Follow these rules strictly:
-
-                        1. Combine the "embedding_text" values in each group summarizing it into a single coherent description.
-                            - Preserve all essential details such as responsibilities, impact, metrics, tools, and outcomes.
-                            - Eliminate redundancy but do not remove unique information.
-                            - Keep the summary professional, third-person, and concise do not change the tone or format of how the text is written.
-                            - Each summary should be between 100-250 words.
-                            - Do not include bullet points or markdown.
-                        2. Merge the "metadata" dictionaries in each group:
-                            - "date_range": Use the most specific or precise date range available (prefer explicit months and years over broad ranges).
-                            - "company": Use the most complete and standardized company name available. If multiple companies are present, list them all.
-                            - "job_title": Use the most descriptive or senior-sounding title from the group.
-                            - "location": Use the most detailed form of the location.
-                            - "section_type": Keep consistent with the group (Experience, Education, Projects, Skills, etc).
-                            - "chunk_id": Omit this field in the final output.
-                        3. Do not invent new details — only merge and rephrase information present in the group.
-                        4. Ensure the final output is valid JSON with the structure:
-                        {format_instructions}
-                        5. Do not include any extra commentary or text outside the JSON object.
-            """
-            ),
-            ("user" ,"""
-                Here are groups of chunks that were validated as similar:
-
-                Groups:
-                {similar_chunks_json}
-
-            """)
-        ])
-        deDuplicateMessage = deDuplicatePrompt.format_messages(similar_chunks_json=similarChunks, format_instructions=deDuplicateSchemaInstructions)
-        deDuplicateLLMResponse = self.llm.invoke(
-            deDuplicateMessage)
-        deDuplicateResponse = deDuplicateSchema.parse(deDuplicateLLMResponse.content)
+        deDuplicateMessage = MERGE_PROMPT.format_messages(similar_chunks_json=similarChunks)
+        with timed("llm.mergeChunks"):
+            deDuplicateLLMResponse = self.llm.invoke(
+                deDuplicateMessage)
+        deDuplicateResponse = MERGE_PARSER.parse(deDuplicateLLMResponse.content)
         deDuplicateResponse = deDuplicateResponse.model_dump()
         self.logger.info(f"Merged into {len(deDuplicateResponse['chunks'])} unified chunks after de-duplication.")
         return deDuplicateResponse
     
     def DocsEmbedder(self, texts: list[str]):
-        self.logger.info(f"Generating {len(texts)} document embeddings")
-
-        result = self.embedder.embed(
-            texts=texts,
-            model="voyage-3.5",
-            input_type="document",      # Use "document" for chunks
-            output_dimension=1024,
-            output_dtype="float"
-        )
-        
-        # FIX: Use .embeddings (attribute) not ['embedding'] (dict key)
-        embeddings = result.embeddings  # Changed from result['embedding']
-        
-        return embeddings
+        def embed(misses: list[str]):
+            self.logger.info(f"Generating {len(misses)} document embeddings")
+            with timed("voyage.documentEmbed"):
+                result = self.embedder.embed(
+                    texts=misses,
+                    model=DOCUMENT_EMBEDDING_MODEL,
+                    input_type="document",      # Use "document" for chunks
+                    output_dimension=DOCUMENT_EMBEDDING_DIMENSION,
+                    output_dtype="float"
+                )
+            # FIX: Use .embeddings (attribute) not ['embedding'] (dict key)
+            return result.embeddings
+
+        # Texts embedded before (re-ingests, retries, chunks shared between users) come from the store
+        return embedWithStore(texts, DOCUMENT_EMBEDDING_MODEL, DOCUMENT_EMBEDDING_DIMENSION, "document", embed)
 
     async def generateEmbeddings(self, client, userEmail: str, userProfile: list) -> dict:
+        """
+        Brings user_profile_embeddings in line with `userProfile`. Rows carry
+        a content_hash of their chunk; chunks whose hash is already stored
+        keep their row, only new chunks are embedded and inserted, and rows
+        no longer in the profile are deleted after the insert, so the user
+        never has an empty profile in between. Rows stored without a hash
+        count as removed and are replaced on the next ingest.
+        """
         try:
-            self.logger.info(f"Starting to embed {len(userProfile)} chunks for {userEmail}")
-            
-            # Delete existing embeddings for this user (for updates)
-            client.table('user_profile_embeddings')\
-                .delete()\
-                .eq('user_email', userEmail)\
-                .execute()
-            
-            self.logger.info(f"Deleted existing embeddings for {userEmail}")
-            
-            # Extract all texts first for batch embedding
-            texts = [chunk['embedding_text'] for chunk in userProfile]
-            
-            # Generate ALL embeddings at once (much faster!)
-            self.logger.info(f"Generating {len(texts)} embeddings in batch...")
-            all_embeddings = self.DocsEmbedder(texts)  
-            
-            # Verify dimension
-            if all_embeddings and len(all_embeddings[0]) != 1024:
-                raise ValueError(f"Expected 1024 dimensions but got {len(all_embeddings[0])}")
-            
-            # Combine embeddings with metadata
-            embeddings_to_insert = []
-            for i, chunk in enumerate(userProfile):
-                embeddings_to_insert.append({
-                    'user_email': userEmail,
-                    'embedding_text': chunk['embedding_text'],
-                    'embedding': all_embeddings[i],  # Use pre-generated embedding
-                    'metadata': chunk['metadata']
-                })
-                self.logger.info(f"Prepared embedding {i+1}/{len(userProfile)}")
-            
-            # Batch insert all embeddings
-            response = client.table('user_profile_embeddings')\
-                .insert(embeddings_to_insert)\
-                .execute()
-            
-            self.logger.info(f"Successfully stored {len(embeddings_to_insert)} embeddings for {userEmail}")
-            return response
+            with timed("supabase.loadEmbeddingHashes"):
+                stored = client.table('user_profile_embeddings')\
+                    .select('id, content_hash')\
+                    .eq('user_email', userEmail)\
+                    .execute()
+
+            # Identical chunks can appear more than once, so each hash maps to all of its rows
+            storedIds = defaultdict(list)
+            for row in stored.data or []:
+                storedIds[row.get('content_hash')].append(row['id'])
+
+            newChunks = []
+            for chunk in userProfile:
+                contentHash = chunkHash(chunk)
+                if storedIds.get(contentHash):
+                    storedIds[contentHash].pop()
+                else:
+                    newChunks.append((contentHash, chunk))
+            removedIds = [rowId for ids in storedIds.values() for rowId in ids]
+            unchanged = len(userProfile) - len(newChunks)
+            self.logger.info(
+                f"Profile of {userEmail}: {len(newChunks)} new chunks, "
+                f"{len(removedIds)} removed, {unchanged} unchanged"
+            )
+
+            if newChunks:
+                # Generate ALL embeddings at once (much faster!)
+                texts = [chunk['embedding_text'] for _, chunk in newChunks]
+                self.logger.info(f"Generating {len(texts)} embeddings in batch...")
+                all_embeddings = self.DocsEmbedder(texts)
+
+                # Verify dimension
+                if all_embeddings and len(all_embeddings[0]) != DOCUMENT_EMBEDDING_DIMENSION:
+                    raise ValueError(f"Expected {DOCUMENT_EMBEDDING_DIMENSION} dimensions but got {len(all_embeddings[0])}")
+
+                embeddings_to_insert = [
+                    {
+                        'user_email': userEmail,
+                        'embedding_text': chunk['embedding_text'],
+                        'embedding': embedding,
+                        'metadata': chunk['metadata'],
+                        'content_hash': contentHash,
+                    }
+                    for (contentHash, chunk), embedding in zip(newChunks, all_embeddings)
+                ]
+
+                # Batch insert all embeddings
+                with timed("supabase.insertEmbeddings"):
+                    client.table('user_profile_embeddings')\
+                        .insert(embeddings_to_insert)\
+                        .execute()
+                self.logger.info(f"Successfully stored {len(embeddings_to_insert)} embeddings for {userEmail}")
+
+            if removedIds:
+                with timed("supabase.deleteEmbeddings"):
+                    client.table('user_profile_embeddings')\
+                        .delete()\
+                        .in_('id', removedIds)\
+                        .execute()
+                self.logger.info(f"Deleted {len(removedIds)} outdated embeddings for {userEmail}")
+
+            PROFILE_CHUNKS.labels(outcome="embedded").inc(len(newChunks))
+            PROFILE_CHUNKS.labels(outcome="deleted").inc(len(removedIds))
+            PROFILE_CHUNKS.labels(outcome="unchanged").inc(unchanged)
+            result = {"embedded": len(newChunks), "deleted": len(removedIds), "unchanged": unchanged}
+            if not newChunks and not removedIds:
+                return result
+
+            # BM25 index for hybrid retrieval, built once here rather than per query
+            lexicalIndex = LexicalIndex([chunk['embedding_text'] for chunk in userProfile])
+            await uploadJson(client, lexicalIndex.toJson(), lexicalIndexPath(userEmail))
+            self.logger.info(f"Stored lexical index for {userEmail} ({len(lexicalIndex.idf)} terms)")
+
+            getLocalVectorStore().invalidate(userEmail)
+            return result
             
         except Exception as e:
             self.logger.error(f"Error storing embeddings for {userEmail}: {e}", exc_info=True)
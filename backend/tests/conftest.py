@@ -0,0 +1,10 @@
+"""
+Tests run against the stubbed upstreams in benchmarks.stubs, no API keys
+or network needed. Run from the backend directory:
+    python -m pytest
+"""
+import os
+from cryptography.fernet import Fernet
+
+# services.encryption reads the key at import
+os.environ.setdefault("ENCRYPTION_KEY", Fernet.generate_key().decode())
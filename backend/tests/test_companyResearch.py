@@ -0,0 +1,47 @@
+import asyncio
+from controllers import jobController
+from services.researchCache import getResearchCache, researchCacheKey
+from benchmarks.stubs import StubLLM, StubTavily, stubJobRequest, resetCaches
+
+
+class ErrorTavily:
+    """TavilySearch hands request errors back as {"error": e} instead of raising"""
+    def __init__(self, error: Exception):
+        self.error = error
+        self.calls = 0
+
+    async def ainvoke(self, query):
+        self.calls += 1
+        return {"error": self.error}
+
+
+def cachedResearch(state):
+    return getResearchCache().get(researchCacheKey(state["companyName"], state["jobTitle"], state["jobdescriptionData"]))
+
+
+def test_failed_search_is_not_cached():
+    resetCaches()
+    state = jobController.newAnswerState(stubJobRequest())
+    tavily = ErrorTavily(Exception("Error 432: This request exceeds your plan's set usage limit"))
+
+    async def run():
+        return await jobController.companyResearch(state, tavily, StubLLM(latency=0)), await cachedResearch(state)
+
+    research, cached = asyncio.run(run())
+    assert tavily.calls == 1
+    assert research is None
+    assert cached is None
+    assert state["collectedCompanyData"] == ""
+
+
+def test_search_answer_is_cached():
+    resetCaches()
+    state = jobController.newAnswerState(stubJobRequest())
+
+    async def run():
+        return await jobController.companyResearch(state, StubTavily(latency=0), StubLLM(latency=0)), await cachedResearch(state)
+
+    research, cached = asyncio.run(run())
+    assert research.startswith("Stub research for")
+    assert cached == research
+    assert state["collectedCompanyData"] == research
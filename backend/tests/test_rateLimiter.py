@@ -0,0 +1,31 @@
+import asyncio
+import json
+from controllers import jobController
+from services import rateLimiter
+from services.rateLimiter import FairScheduler, RateLimitedError, isRateLimitError
+from benchmarks.stubs import StubLLM, StubTavily, StubEmbedder, StubSupabase, stubJobRequest, patchAnswerClients, resetCaches
+
+
+def test_rate_limit_errors():
+    assert isRateLimitError(RateLimitedError("tavily", 30))
+    assert isRateLimitError(Exception("Error 429: Too Many Requests"))
+    assert not isRateLimitError(ValueError("Acme has 429 employees and a rate limit policy"))
+
+
+def test_queue_full_refusal_answers_429(monkeypatch):
+    resetCaches()
+    request = stubJobRequest()
+    # One search per minute and no queueing, already used up by this user
+    tavilyScheduler = FairScheduler("tavily", ratePerMinute=1, maxWait=0)
+    tavilyScheduler._take(request["email"])
+    monkeypatch.setitem(rateLimiter._schedulers, "tavily", tavilyScheduler)
+    tavily = StubTavily(latency=0)
+    patchAnswerClients(jobController, StubLLM(latency=0, researchDecision=True), tavily, StubEmbedder(latency=0), StubSupabase(latency=0))
+
+    response = asyncio.run(jobController.generateAnswer(request))
+
+    assert response.status_code == 429
+    assert tavily.calls == 0
+    retryAfter = json.loads(response.body)["retryAfter"]
+    assert retryAfter > 0
+    assert response.headers["Retry-After"] == str(retryAfter)
@@ -3,6 +3,7 @@ import { toast } from "react-toastify"
 import { useAuth } from "../context/AuthContext"
 import { useState, useRef } from "react"
 import { supabase } from '../context/supabaseClient'
+import { waitForIngestJob } from '../context/ingestJobs'
 import CircularProgress from '@mui/material/CircularProgress';     
 
 const ExperienceForm = () => {
@@ -95,7 +96,14 @@ const ExperienceForm = () => {
         return;
       }
 
-      console.log("Success: ",respData.message)
+      console.log("Accepted: ",respData.message)
+      const job = await waitForIngestJob(respData.jobId, session);
+      if (job.status === "failed") {
+        console.error("Processing user data failed: ", job.error);
+        toast.error(job.error || "Failed to save user data");
+        setLoading(false);
+        return;
+      }
       const { data, error } = await supabase.auth.updateUser({
       data: { experienceData: true },
       });
@@ -112,6 +120,7 @@ const ExperienceForm = () => {
     catch(error){
       console.error('Error:', error);
       toast.error("Failed to save user data");
+      setLoading(false);
       return
     }
   };
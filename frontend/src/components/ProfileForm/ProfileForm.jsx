@@ -4,6 +4,7 @@ import { useEffect, useState, useRef } from 'react'
 import { useAuth } from "../context/AuthContext"
 import { toast } from 'react-toastify'
 import CircularProgress from '@mui/material/CircularProgress'
+import { waitForIngestJob } from '../context/ingestJobs'
 
 const ProfileForm = () => {
     const { session } = useAuth();
@@ -203,6 +204,13 @@ const ProfileForm = () => {
                 toast.error("Failed to update profile");
                 return;
             }
+            const job = await waitForIngestJob(data.jobId, session);
+            if (job.status === "failed") {
+                console.error("Profile update failed: ", job.error);
+                toast.error(job.error || "Failed to update profile");
+                setLoading(false);
+                return;
+            }
             console.log("Profile updated successfully");
             toast.success("Profile updated successfully");
             setOriginalData(profileData);
@@ -212,6 +220,7 @@ const ProfileForm = () => {
         catch(err){
             console.error("Failed to update profile: ",err);
             toast.error("Failed to update profile");
+            setLoading(false);
             
         }
     };
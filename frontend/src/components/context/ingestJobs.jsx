@@ -0,0 +1,21 @@
+const POLL_INTERVAL_MS = 2000;
+
+// /user/userdata and /user/update answer 202 with a jobId, the profile is only
+// saved once that job succeeds. Resolves with the job when it has finished.
+export const waitForIngestJob = async (jobId, session) => {
+  while (true) {
+    await new Promise((resolve) => setTimeout(resolve, POLL_INTERVAL_MS));
+    const response = await fetch(`/api/user/jobs/${jobId}?email=${encodeURIComponent(session?.user?.email)}`, {
+      headers: {
+        'Authorization': `Bearer ${session?.access_token}`
+      }
+    });
+    const job = await response.json();
+    if (!response.ok) {
+      throw new Error(job.error || "Could not check the profile job");
+    }
+    if (job.status === "succeeded" || job.status === "failed") {
+      return job;
+    }
+  }
+};